@@ -0,0 +1,405 @@
+# backend/pdf_reader/checking.py
+import asyncio
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+from .extraction import ExtractionError, SUPPORTED_FILE_KINDS, document_kind, iter_page_texts
+from .matching import DocumentCheck, RuleSet, VerdictCheck
+from .metrics import StageTimer, record_file_check
+from .page_store import load_page_texts, page_store_mode, save_page_texts
+from .result_cache import file_content_hash, result_cache_key
+
+def _read_keywords(file_path):
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+def load_keywords(file_path=None):
+    if file_path is None:
+        file_path = settings.KEYWORDS_FILE
+    try:
+        return _read_keywords(file_path)
+    except FileNotFoundError:
+        print(f"ERROR: keywords.json not found at {file_path}")
+        return {}
+    except json.JSONDecodeError:
+        print(f"ERROR: Could not decode keywords.json at {file_path}")
+        return {}
+
+
+_rule_set = None
+_rule_set_file_state = None
+_rule_set_lock = threading.Lock()
+
+
+def _keywords_file_state(file_path):
+    # What the current RuleSet was compiled from; any change means keywords.json was edited or replaced
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return (str(file_path), None, None)
+    return (str(file_path), stat.st_mtime_ns, stat.st_size)
+
+
+def _reload_marker_state():
+    # reload_rule_set() replaces the marker file, so its inode changes even where timestamps are coarse
+    try:
+        stat = os.stat(settings.KEYWORDS_RELOAD_MARKER)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def _rule_set_is_current(file_path):
+    file_state, marker_state = _rule_set_file_state
+    if _reload_marker_state() != marker_state:
+        return False
+    return not settings.KEYWORDS_AUTO_RELOAD or _keywords_file_state(file_path) == file_state
+
+
+def _compile_rule_set(file_path):
+    global _rule_set, _rule_set_file_state
+    file_state = (_keywords_file_state(file_path), _reload_marker_state())
+    try:
+        words_to_check = _read_keywords(file_path)
+    except (OSError, ValueError) as e:
+        if _rule_set is not None:
+            # A half-written or broken file must not take the rules away from running requests
+            print(f"ERROR: Could not reload keywords from {file_path}, keeping version {_rule_set.version}: {e}")
+            _rule_set_file_state = file_state
+            return _rule_set
+        words_to_check = load_keywords(file_path)
+    # Requests that already hold the previous RuleSet keep using it; new ones get this one
+    _rule_set = RuleSet(words_to_check, source=str(file_path))
+    _rule_set_file_state = file_state
+    return _rule_set
+
+
+def get_rule_set():
+    """
+    The RuleSet compiled from settings.KEYWORDS_FILE. With KEYWORDS_AUTO_RELOAD
+    the file is compiled again as soon as its mtime or size changes; in any
+    case it is compiled again after reload_rule_set() ran in any process.
+    Callers should fetch it once per request (or file) so that one result
+    never mixes two versions.
+    """
+    rule_set = _rule_set
+    file_path = settings.KEYWORDS_FILE
+    if rule_set is not None and _rule_set_is_current(file_path):
+        return rule_set
+    with _rule_set_lock:
+        if _rule_set is not None and _rule_set_is_current(file_path):
+            return _rule_set
+        return _compile_rule_set(file_path)
+
+
+def _signal_reload():
+    marker_path = str(settings.KEYWORDS_RELOAD_MARKER)
+    temp_path = f"{marker_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w') as marker_file:
+            marker_file.write(f"{time.time()}\n")
+        os.replace(temp_path, marker_path)
+    except OSError as e:
+        print(f"WARNING: could not write {marker_path}, other worker processes keep their rules: {e}")
+
+
+def reload_rule_set():
+    """
+    Compiles settings.KEYWORDS_FILE again now, whether or not it changed, and
+    returns the new current RuleSet. It also replaces
+    settings.KEYWORDS_RELOAD_MARKER, so that the other worker processes
+    recompile the file on their next request, even if it was replaced without
+    changing its mtime or size.
+    """
+    with _rule_set_lock:
+        _signal_reload()
+        return _compile_rule_set(settings.KEYWORDS_FILE)
+
+
+def describe_rule_set(rule_set, include_source=False):
+    description = {
+        "version": rule_set.version,
+        "keywords": len(rule_set.words_to_check),
+    }
+    if include_source:
+        # A server path; only for staff
+        description["source"] = rule_set.source
+    return description
+
+
+# 'full' reports every hit with its context phrase; 'compact' groups the hits by word and page, with
+# shared, merged context phrases (see matching.DocumentCheck); 'verdict' stops at the first fail_if_found hit
+CHECK_MODES = ('full', 'compact', 'verdict')
+
+
+def _page_scope(pages, max_hits):
+    # What a check of only part of a document was limited to: reported in its result, and part of its cache key
+    if pages is None and max_hits is None:
+        return None
+    return {"pages": str(pages) if pages is not None else None, "max_hits": max_hits}
+
+
+def _content_hash_and_cache_key(uploaded_file, file_kind, extractor_mode, result_cache, check_mode, rule_set,
+                                page_scope, page_store):
+    # The content hash is only computed when the result cache or the page store can use it
+    content_hash = None
+    if file_kind in SUPPORTED_FILE_KINDS and (result_cache is not None or page_store):
+        content_hash = file_content_hash(uploaded_file)
+    cache_key = None
+    if result_cache is not None and content_hash is not None:
+        cache_key = result_cache_key(
+            content_hash, rule_set.version, file_kind, page_store_mode(file_kind, extractor_mode), check_mode,
+            ";".join(f"{name}={value}" for name, value in page_scope.items()) if page_scope else '',
+        )
+    return content_hash, cache_key
+
+
+def _timed_pages(page_texts, timer):
+    # Yields from page_texts, adding the time spent producing each page to the 'extraction' stage
+    while True:
+        started = time.perf_counter()
+        page = next(page_texts, None)
+        timer.add('extraction', time.perf_counter() - started)
+        if page is None:
+            return
+        yield page
+
+
+def _new_file_result(filename, check_mode, rules_version):
+    # A file's result before any page is checked, in the shape of check_mode
+    if check_mode == 'verdict':
+        hits = {"first_hit": None}
+    elif check_mode == 'compact':
+        hits = {"fail_summary": [], "hits": [], "contexts": []}
+    else:
+        hits = {"fail_summary": [], "found_instances": []}
+    return {"filename": filename, "status": "pass", **hits, "error_message": None, "rules_version": rules_version}
+
+
+def error_file_result(filename, check_mode, error_message, rules_version=None):
+    """The result of a file that could not be checked, in the same shape as check_mode's other results."""
+    file_result = _new_file_result(filename, check_mode, rules_version)
+    file_result.update({"status": "error", "error_message": error_message})
+    return file_result
+
+
+def _cached_page_events(cached_file_result):
+    # The page events of a cached result, for the pages that have hits
+    if "hits" in cached_file_result:
+        for page_num, page_hit_groups in groupby(cached_file_result["hits"], key=itemgetter("page")):
+            page_hit_groups = list(page_hit_groups)
+            # The page's own contexts, renumbered from the file's
+            page_context_indexes = list(dict.fromkeys(
+                context_index for hit_group in page_hit_groups for context_index in hit_group["contexts"]
+            ))
+            yield ("page", page_num, {
+                "hits": [
+                    {**hit_group, "contexts": [page_context_indexes.index(index) for index in hit_group["contexts"]]}
+                    for hit_group in page_hit_groups
+                ],
+                "contexts": [cached_file_result["contexts"][index] for index in page_context_indexes],
+            })
+    else:
+        for page_num, page_instances in groupby(cached_file_result.get("found_instances", ()), key=itemgetter("page")):
+            yield ("page", page_num, list(page_instances))
+
+
+def _new_check(rule_set, check_mode, report_locations):
+    # The matching stage for check_mode: both kinds are fed pages with add_page() and give result()
+    if check_mode == 'verdict':
+        return VerdictCheck(rule_set, report_locations)
+    return DocumentCheck(rule_set, report_locations, compact=(check_mode == 'compact'))
+
+
+def iter_document_check(uploaded_file, extractor_mode, result_cache, rule_set=None, timer=None, pages=None,
+                        max_hits=None, check_mode='full', page_store=True, parallel_extraction=True):
+    """
+    Checks one uploaded file (anything with .name, .seek() and .chunks(), like
+    Django's UploadedFile) page by page. Yields ("page", page_number,
+    page_hits) as each page is checked, then ("file", result) once.
+    Never raises: problems are reported in the result's "status" and
+    "error_message". A result served from the cache only yields the pages
+    that have hits. rule_set defaults to get_rule_set(); the time spent in
+    each stage is added to timer (a metrics.StageTimer) and to the metrics.
+
+    pages (an extraction.PageSelection) only checks those pages of a PDF or
+    DOCX, and max_hits stops extracting after the page (for a DOCX, the
+    paragraph or cell) that brings the hits to at least max_hits. Either one
+    adds "page_scope" to the result: {"pages", "max_hits", "pages_checked",
+    "stopped_at_page"}, where pages_checked counts distinct pages, not DOCX
+    chunks. Page numbers are always those of the whole document.
+
+    check_mode 'compact' gives the result "hits" and "contexts" instead of
+    "found_instances", and each page event has the page's hits grouped the
+    same way, as {"hits", "contexts"} with indexes into that "contexts".
+    check_mode 'verdict' stops at the first fail_if_found hit and gives the
+    result "first_hit" ({"page", "word", "original_match"}, without a
+    context phrase, or None) instead; its page events have at most that hit.
+
+    page_store=False neither reads nor fills the page text store, even if
+    PAGE_TEXT_STORE_ENABLED, and parallel_extraction=False extracts PDFs in
+    this process only (see extraction.iter_pdf_pages).
+    """
+    page_store = page_store and settings.PAGE_TEXT_STORE_ENABLED
+    if rule_set is None:
+        rule_set = get_rule_set()
+    if timer is None:
+        timer = StageTimer()
+    file_name_original = uploaded_file.name
+    file_kind = document_kind(file_name_original)
+    current_file_result = _new_file_result(file_name_original, check_mode, rule_set.version)
+    page_scope = _page_scope(pages, max_hits)
+    if page_scope is not None:
+        current_file_result["page_scope"] = {**page_scope, "pages_checked": 0, "stopped_at_page": None}
+
+    # Distinct page numbers checked: DOCX chunks share the number of the page they are on
+    pages_checked = set()
+    cache_key = None
+    try:
+        # Reading the upload to hash it can fail like extracting it: that is this file's error, not the request's
+        with timer.stage('hash'):
+            content_hash, cache_key = _content_hash_and_cache_key(
+                uploaded_file, file_kind, extractor_mode, result_cache, check_mode, rule_set, page_scope, page_store
+            )
+
+        # Re-uploads of the same bytes are answered from the result cache without opening the file
+        if cache_key is not None:
+            with timer.stage('cache'):
+                cached_file_result = result_cache.get(cache_key)
+            if cached_file_result is not None:
+                cached_file_result["filename"] = file_name_original
+                yield from _cached_page_events(cached_file_result)
+                record_file_check(timer, file_kind, check_mode, cached_file_result["status"], 0)
+                yield ("file", cached_file_result)
+                return
+
+        # The store holds whole documents: a check of only part of one neither reads nor fills it
+        use_page_store = page_store and content_hash is not None and page_scope is None
+        # Text extracted earlier (e.g. before a keywords.json change) only needs matching again
+        stored_page_texts = None
+        if use_page_store:
+            with timer.stage('page_store'):
+                stored_page_texts = load_page_texts(content_hash, file_kind, extractor_mode)
+        # Pages extracted now are collected for the store, if it is on; they are only stored if the
+        # check went through to the last page (a verdict check usually stops well before it)
+        store_extracted_pages = stored_page_texts is None and use_page_store
+        extracted_page_texts = []
+
+        document_check = _new_check(rule_set, check_mode, report_locations=(file_kind == '.docx'))
+        if stored_page_texts is not None:
+            page_texts_to_process = iter(stored_page_texts)
+        else:
+            page_texts_to_process = iter_page_texts(
+                uploaded_file, file_kind, extractor_mode, pages, parallel_extraction
+            )
+        stopped_early = False
+        try:
+            for page_label, text_content, page_num in _timed_pages(page_texts_to_process, timer):
+                if store_extracted_pages:
+                    extracted_page_texts.append((page_label, text_content, page_num))
+                pages_checked.add(page_num)
+                page_hits = document_check.add_page(page_label, text_content, page_num, timer)
+                yield ("page", page_num, page_hits)
+                if document_check.finished:
+                    stopped_early = True
+                    break
+                if max_hits is not None and document_check.hit_count >= max_hits:
+                    current_file_result["page_scope"]["stopped_at_page"] = page_num
+                    stopped_early = True
+                    break
+        finally:
+            if stored_page_texts is None:
+                # Stops the extraction of the remaining pages
+                page_texts_to_process.close()
+
+        if store_extracted_pages and not stopped_early:
+            with timer.stage('page_store'):
+                save_page_texts(content_hash, file_kind, extractor_mode, file_name_original, extracted_page_texts)
+        current_file_result.update(document_check.result())
+        if page_scope is not None:
+            current_file_result["page_scope"]["pages_checked"] = len(pages_checked)
+    except ExtractionError as extraction_err:
+        current_file_result.update({"status": "error", "error_message": str(extraction_err)})
+    except Exception as e:
+        print(f"  Overall error processing file {file_name_original}: {e}")
+        print(traceback.format_exc())
+        current_file_result.update({"status": "error", "error_message": f"An unexpected error: {str(e)}"})
+
+    if cache_key is not None and current_file_result["status"] != "error":
+        with timer.stage('cache'):
+            result_cache.set(cache_key, current_file_result)
+    record_file_check(timer, file_kind, check_mode, current_file_result["status"], len(pages_checked))
+    yield ("file", current_file_result)
+
+
+def check_document_file(uploaded_file, extractor_mode, result_cache, check_mode='full', rule_set=None, timer=None,
+                        pages=None, max_hits=None, page_store=True, parallel_extraction=True):
+    """Checks one uploaded file and returns its result dict (see iter_document_check)."""
+    for event in iter_document_check(
+        uploaded_file, extractor_mode, result_cache, rule_set, timer, pages, max_hits, check_mode,
+        page_store, parallel_extraction,
+    ):
+        if event[0] == "file":
+            return event[1]
+
+
+_check_executor = None
+_check_executor_lock = threading.Lock()
+
+
+def get_check_executor():
+    """
+    The thread pool that checks the files of async requests in this worker,
+    created on first use. Its CHECK_ASYNC_WORKERS threads are the limit on
+    files checked at once across all those requests. They overlap I/O and
+    waits on the extraction process pool, not CPU work: extraction and
+    matching in these threads run one at a time under the GIL (and PDFium's
+    lock), so only PDFs large enough for the process pool use more CPUs.
+    """
+    global _check_executor
+    with _check_executor_lock:
+        if _check_executor is None:
+            _check_executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.CHECK_ASYNC_WORKERS), thread_name_prefix='check-file'
+            )
+        return _check_executor
+
+
+@receiver(setting_changed)
+def _reset_check_executor(setting, **kwargs):
+    global _check_executor
+    if setting == 'CHECK_ASYNC_WORKERS':
+        with _check_executor_lock:
+            if _check_executor is not None:
+                # Files already queued on the old pool still finish there
+                _check_executor.shutdown(wait=False)
+            _check_executor = None
+
+
+def _check_in_pool_thread(*args):
+    try:
+        return check_document_file(*args)
+    finally:
+        # The page store and the 'django' cache backend use this thread's connections
+        close_old_connections()
+
+
+async def check_document_file_async(uploaded_file, extractor_mode, result_cache, check_mode='full', rule_set=None,
+                                    timer=None, pages=None, max_hits=None):
+    """check_document_file on the shared check pool, awaited without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_check_executor(), _check_in_pool_thread,
+        uploaded_file, extractor_mode, result_cache, check_mode, rule_set, timer, pages, max_hits,
+    )
@@ -0,0 +1,247 @@
+# backend/pdf_reader/docx_text.py
+# Reads the text of a DOCX in one streaming pass over word/document.xml with
+# lxml (which python-docx is built on), instead of loading the whole document
+# into python-docx objects. Body paragraphs, table cells and the headers and
+# footers of each section come out as separate, labelled chunks.
+import posixpath
+import zipfile
+
+from lxml import etree
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+R_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+RELATIONSHIP = '{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+OFFICE_DOCUMENT_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+
+W_BODY, W_P, W_TBL, W_TR, W_TC = W + 'body', W + 'p', W + 'tbl', W + 'tr', W + 'tc'
+W_PPR, W_SECT_PR, W_TXBX_CONTENT = W + 'pPr', W + 'sectPr', W + 'txbxContent'
+W_T, W_TAB, W_PTAB, W_BR, W_CR = W + 't', W + 'tab', W + 'ptab', W + 'br', W + 'cr'
+W_NO_BREAK_HYPHEN, W_LAST_RENDERED_PAGE_BREAK = W + 'noBreakHyphen', W + 'lastRenderedPageBreak'
+W_PAGE_BREAK_BEFORE, W_TYPE, W_VAL = W + 'pageBreakBefore', W + 'type', W + 'val'
+W_HEADER_REFERENCE, W_FOOTER_REFERENCE = W + 'headerReference', W + 'footerReference'
+
+# Elements of a paragraph whose runs are part of its text: python-docx only reads
+# w:r and w:hyperlink, which misses tracked insertions, fields and content controls
+RUN_CONTAINERS = frozenset(W + tag for tag in (
+    'r', 'hyperlink', 'ins', 'moveTo', 'smartTag', 'customXml', 'fldSimple', 'sdt', 'sdtContent', 'dir', 'bdo',
+))
+HEADER_FOOTER_NAMES = {
+    (W_HEADER_REFERENCE, 'default'): "header", (W_HEADER_REFERENCE, 'first'): "first-page header",
+    (W_HEADER_REFERENCE, 'even'): "even-page header", (W_FOOTER_REFERENCE, 'default'): "footer",
+    (W_FOOTER_REFERENCE, 'first'): "first-page footer", (W_FOOTER_REFERENCE, 'even'): "even-page footer",
+}
+
+
+def _is_on(element):
+    # w:pageBreakBefore and friends: present and not switched off with w:val
+    return element is not None and element.get(W_VAL, 'true') not in ('false', '0', 'off')
+
+
+def _relationship_targets(docx_zip, part_name):
+    # rId -> part name, from the part's _rels file
+    rels_name = posixpath.join(posixpath.dirname(part_name), '_rels', posixpath.basename(part_name) + '.rels')
+    try:
+        rels = etree.fromstring(docx_zip.read(rels_name))
+    except KeyError:
+        return {}
+    targets = {}
+    for rel in rels.iter(RELATIONSHIP):
+        if rel.get('TargetMode') == 'External':
+            continue
+        target = rel.get('Target')
+        # Targets starting with "/" are relative to the package root, the rest to the part's folder
+        if target.startswith('/'):
+            targets[rel.get('Id')] = posixpath.normpath(target.lstrip('/'))
+        else:
+            targets[rel.get('Id')] = posixpath.normpath(posixpath.join(posixpath.dirname(part_name), target))
+    return targets
+
+
+def _main_document_part(docx_zip):
+    package_rels = etree.fromstring(docx_zip.read('_rels/.rels'))
+    for rel in package_rels.iter(RELATIONSHIP):
+        if rel.get('Type') == OFFICE_DOCUMENT_TYPE:
+            return rel.get('Target').lstrip('/')
+    return 'word/document.xml'
+
+
+class _DocxWalker:
+    """
+    State of one pass over a document. Page numbers are estimated from the
+    page breaks in the XML: explicit ones, section breaks, pageBreakBefore
+    and the w:lastRenderedPageBreak markers Word leaves where it last laid
+    out a new page. Breaks with no text between them count as one.
+    """
+
+    def __init__(self, docx_zip):
+        self.docx_zip = docx_zip
+        self.document_part = _main_document_part(docx_zip)
+        self.relationships = _relationship_targets(docx_zip, self.document_part)
+        self.page = 1
+        self.at_page_start = True
+        self.chunk_page = None # Page of the first text of the chunk being read
+        self.section = 1
+        self.section_first_page = 1
+        self.header_footer_parts_seen = set()
+
+    def page_break(self):
+        if not self.at_page_start:
+            self.page += 1
+            self.at_page_start = True
+
+    def add_text(self, parts, text):
+        parts.append(text)
+        if self.at_page_start and text.strip():
+            self.at_page_start = False
+        if self.chunk_page is None and text.strip():
+            self.chunk_page = self.page
+
+    def collect_run_text(self, element, parts):
+        # Same text as python-docx's Paragraph.text for what it reads; drawings and text boxes are skipped
+        for child in element:
+            tag = child.tag
+            if tag == W_T:
+                if child.text:
+                    self.add_text(parts, child.text)
+            elif tag == W_TAB or tag == W_PTAB:
+                parts.append("\t")
+            elif tag == W_BR:
+                br_type = child.get(W_TYPE, 'textWrapping')
+                if br_type == 'textWrapping':
+                    parts.append("\n")
+                elif br_type == 'page':
+                    self.page_break()
+            elif tag == W_CR:
+                parts.append("\n")
+            elif tag == W_NO_BREAK_HYPHEN:
+                self.add_text(parts, "-")
+            elif tag == W_LAST_RENDERED_PAGE_BREAK:
+                self.page_break()
+            elif tag in RUN_CONTAINERS:
+                self.collect_run_text(child, parts)
+
+    def paragraph_text(self, paragraph):
+        """The paragraph's text; page breaks in it move the walker on to the next page."""
+        paragraph_properties = paragraph.find(W_PPR)
+        if paragraph_properties is not None and _is_on(paragraph_properties.find(W_PAGE_BREAK_BEFORE)):
+            self.page_break()
+        parts = []
+        self.collect_run_text(paragraph, parts)
+        return "".join(parts)
+
+    def section_break(self, section_properties):
+        """Yields the chunks of the headers and footers of the section that ends here."""
+        for reference in section_properties:
+            name = HEADER_FOOTER_NAMES.get((reference.tag, reference.get(W_TYPE, 'default')))
+            part_name = self.relationships.get(reference.get(R_ID)) if name else None
+            # A header shared by several sections is reported once, for the first of them
+            if part_name is None or part_name in self.header_footer_parts_seen:
+                continue
+            self.header_footer_parts_seen.add(part_name)
+            try:
+                part = etree.fromstring(self.docx_zip.read(part_name))
+            except KeyError:
+                continue
+            part_text = "\n".join(self.header_footer_paragraph_texts(part))
+            if part_text.strip():
+                yield (f"Section {self.section} {name}", part_text, self.section_first_page)
+
+        section_type = section_properties.find(W_TYPE)
+        if section_type is None or section_type.get(W_VAL, 'nextPage') != 'continuous':
+            self.page_break()
+        self.section += 1
+        self.section_first_page = self.page
+
+    def header_footer_paragraph_texts(self, part):
+        # Page breaks don't mean anything in a header: the body's page state is put back afterwards
+        page_state = (self.page, self.at_page_start, self.chunk_page)
+        for paragraph in part.iter(W_P):
+            if any(ancestor.tag == W_TXBX_CONTENT for ancestor in paragraph.iterancestors()):
+                continue
+            yield self.paragraph_text(paragraph)
+        self.page, self.at_page_start, self.chunk_page = page_state
+
+    def iter_chunks(self):
+        paragraph_number = table_number = row_number = cell_number = 0
+        table_depth = text_box_depth = 0
+        body = None
+        cell_texts = []
+        cell_page = None
+
+        with self.docx_zip.open(self.document_part) as document_xml:
+            events = etree.iterparse(
+                document_xml, events=('start', 'end'), resolve_entities=False,
+                tag=(W_BODY, W_P, W_TBL, W_TR, W_TC, W_SECT_PR, W_TXBX_CONTENT),
+            )
+            for event, element in events:
+                tag = element.tag
+                if event == 'start':
+                    if tag == W_TXBX_CONTENT:
+                        text_box_depth += 1
+                    elif text_box_depth:
+                        continue
+                    elif tag == W_TBL:
+                        table_depth += 1
+                        if table_depth == 1:
+                            table_number += 1
+                            row_number = 0
+                    elif tag == W_TR and table_depth == 1:
+                        row_number += 1
+                        cell_number = 0
+                    elif tag == W_TC and table_depth == 1:
+                        cell_number += 1
+                        cell_texts = []
+                        cell_page = None
+                    elif tag == W_BODY:
+                        body = element
+                    continue
+
+                if tag == W_TXBX_CONTENT:
+                    text_box_depth -= 1
+                    continue
+                if text_box_depth:
+                    continue
+                if tag == W_P:
+                    self.chunk_page = None
+                    text = self.paragraph_text(element)
+                    if table_depth:
+                        cell_texts.append(text)
+                        if cell_page is None:
+                            cell_page = self.chunk_page
+                    else:
+                        paragraph_number += 1
+                        if text.strip():
+                            yield (f"Paragraph {paragraph_number}", text, self.chunk_page)
+                    paragraph_properties = element.find(W_PPR)
+                    section_properties = paragraph_properties.find(W_SECT_PR) if paragraph_properties is not None else None
+                    if section_properties is not None:
+                        yield from self.section_break(section_properties)
+                elif tag == W_TC:
+                    cell_text = "\n".join(cell_texts)
+                    if table_depth == 1 and cell_text.strip():
+                        yield (f"Table {table_number}, row {row_number}, cell {cell_number}", cell_text, cell_page)
+                    continue
+                elif tag == W_TBL:
+                    table_depth -= 1
+                elif tag == W_SECT_PR and element.getparent() is body:
+                    # The last section's properties close the body
+                    yield from self.section_break(element)
+                else:
+                    continue
+
+                # Everything up to the end of a top-level element has been read: free it
+                if body is not None and element.getparent() is body:
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del body[0]
+
+
+def iter_docx_chunks(source):
+    """
+    Yields (location, text, page_number) for the non-empty body paragraphs
+    ("Paragraph 12"), table cells ("Table 2, row 3, cell 1", including any
+    tables nested in the cell) and headers and footers ("Section 1 footer")
+    of a DOCX, in document order. source is a path or a seekable file object.
+    """
+    with zipfile.ZipFile(source) as docx_zip:
+        yield from _DocxWalker(docx_zip).iter_chunks()
@@ -0,0 +1,346 @@
+# backend/pdf_reader/extraction.py
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pdfplumber
+import pypdfium2 as pdfium
+from django.conf import settings
+from pdfminer.pdftypes import resolve1
+
+from .docx_text import iter_docx_chunks
+
+
+class ExtractionError(Exception):
+    """A document that cannot be checked; the message is reported as the file's error_message."""
+
+
+class PdfTextExtractor:
+    """
+    One way of turning PDF pages into text. Subclasses are registered in
+    PDF_EXTRACTORS under their `mode`, which is what requests and settings
+    refer to.
+    """
+    mode = None
+    # Whether open(page_numbers=...) leaves the other pages unparsed, which makes reopening worth it
+    limits_open_pages = False
+
+    def open(self, source, page_numbers=None):
+        """
+        Opens a path or file-like object as a context manager. page_numbers
+        (1-based) limits the document to those pages where the backend allows it.
+        """
+        raise NotImplementedError
+
+    def page_count(self, document):
+        raise NotImplementedError
+
+    def page_texts(self, document, page_numbers=None):
+        """Yields (page_number, page_text) for page_numbers, or every page, in order."""
+        raise NotImplementedError
+
+
+class PdfplumberExtractor(PdfTextExtractor):
+    """Layout-aware extraction with pdfplumber's extract_text(); slow but the historical behaviour."""
+    mode = 'layout'
+    limits_open_pages = True
+
+    def open(self, source, page_numbers=None):
+        return pdfplumber.open(source, pages=page_numbers)
+
+    def page_count(self, document):
+        # The page tree's /Count: document.pages would build a Page object for every page just to count them
+        try:
+            return int(resolve1(resolve1(document.doc.catalog['Pages'])['Count']))
+        except Exception:
+            return len(document.pages)
+
+    def page_texts(self, document, page_numbers=None):
+        wanted = set(page_numbers) if page_numbers is not None else None
+        for page_obj in document.pages:
+            if wanted is None or page_obj.page_number in wanted:
+                yield page_obj.page_number, page_obj.extract_text()
+
+
+# PDFium keeps global state and is not thread-safe: every call into it goes through this lock
+_pdfium_lock = threading.Lock()
+
+
+class PdfiumExtractor(PdfTextExtractor):
+    """
+    PDFium's native text extraction: no layout analysis, many times faster
+    than pdfplumber. PDFium must never be entered from two threads at once
+    (threaded WSGI servers, the job pool and the async check pool all
+    extract in threads, and concurrent calls crash the whole process), so
+    opening, reading and closing a document all hold _pdfium_lock. The lock
+    is taken per page and released before each page is yielded; extraction
+    in parallel happens in the process pool instead.
+    """
+    mode = 'fast'
+
+    def open(self, source, page_numbers=None):
+        return _PdfiumDocument(source)
+
+    def page_count(self, document):
+        with _pdfium_lock:
+            return len(document.pdf)
+
+    def page_texts(self, document, page_numbers=None):
+        if page_numbers is None:
+            page_numbers = range(1, self.page_count(document) + 1)
+        for page_number in page_numbers:
+            with _pdfium_lock:
+                page = document.pdf[page_number - 1]
+                textpage = page.get_textpage()
+                try:
+                    # PDFium separates lines with \r\n; pdfplumber (and the matcher's context phrases) use \n
+                    page_text = textpage.get_text_bounded().replace('\r\n', '\n').replace('\r', '\n')
+                finally:
+                    textpage.close()
+                    page.close()
+            yield page_number, page_text
+
+
+class _PdfiumDocument:
+    # Gives PdfDocument the same `with` usage as pdfplumber.open()
+    def __init__(self, source):
+        with _pdfium_lock:
+            self.pdf = pdfium.PdfDocument(source)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        with _pdfium_lock:
+            self.pdf.close()
+
+
+PDF_EXTRACTORS = {extractor.mode: extractor for extractor in (PdfplumberExtractor(), PdfiumExtractor())}
+
+
+def get_pdf_extractor(mode=None):
+    """The extractor for `mode`, or for settings.PDF_EXTRACTION_MODE when no mode is given."""
+    return PDF_EXTRACTORS[mode or settings.PDF_EXTRACTION_MODE]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_extraction_executor():
+    """The process pool shared by all requests of this worker, created on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Not forked: this process already runs request, job and check threads, and a fork would copy
+            # whatever locks they hold (_pdfium_lock among them) into the pool processes for good
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PDF_EXTRACTION_WORKERS, mp_context=multiprocessing.get_context('forkserver')
+            )
+        return _executor
+
+
+def _discard_extraction_executor(broken_executor):
+    global _executor
+    with _executor_lock:
+        if _executor is broken_executor:
+            _executor = None
+    broken_executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PageSelection:
+    """
+    The pages of a document to check, from a request's 'pages' field: comma-separated
+    page numbers ("7"), ranges ("1-20", or "40-" up to the last page),
+    "first-N" and "last-N". Pages are numbered from 1 as in the document, and
+    ranges past the last page are cut short. Raises ValueError for anything else.
+    """
+
+    def __init__(self, spec):
+        self.spec = ",".join(part.strip().lower() for part in str(spec).split(','))
+        self.ranges = [] # (first_page, last_page or None for the last page); a negative first_page counts from the end
+        for part in self.spec.split(','):
+            start, dash, end = part.partition('-')
+            if start in ('first', 'last') and dash and end.isdigit() and int(end) > 0:
+                self.ranges.append((1, int(end)) if start == 'first' else (-int(end), None))
+            elif start.isdigit() and int(start) > 0 and not dash:
+                self.ranges.append((int(start), int(start)))
+            elif start.isdigit() and int(start) > 0 and dash and (not end or (end.isdigit() and int(end) >= int(start))):
+                self.ranges.append((int(start), int(end) if end else None))
+            else:
+                raise ValueError(f"Invalid page range {part!r}: use e.g. 7, 1-20, 40-, first-5 or last-5.")
+
+    def __str__(self):
+        return self.spec
+
+    def page_numbers(self, page_count):
+        """The selected pages of a document with page_count pages, in page order."""
+        selected = set()
+        for first_page, last_page in self.ranges:
+            if first_page < 0:
+                first_page = max(1, page_count + first_page + 1)
+            last_page = page_count if last_page is None else min(last_page, page_count)
+            selected.update(range(first_page, last_page + 1))
+        return sorted(selected)
+
+
+def _file_source(uploaded_file):
+    # A path for uploads that are already on disk, otherwise the seekable file object itself
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        return uploaded_file.temporary_file_path()
+    return uploaded_file
+
+
+def _extract_page_batch(mode, pdf_path, page_numbers):
+    # Runs in a pool process: opens only the requested (1-based) pages
+    extractor = PDF_EXTRACTORS[mode]
+    with extractor.open(pdf_path, page_numbers=page_numbers) as document:
+        return list(extractor.page_texts(document, page_numbers))
+
+
+def _iter_pages_in_pool(extractor, pdf_path, page_numbers):
+    batch_size = max(1, settings.PDF_EXTRACTION_BATCH_PAGES)
+    batches = [page_numbers[i:i + batch_size] for i in range(0, len(page_numbers), batch_size)]
+    executor = get_extraction_executor()
+    pages_done = 0
+    batch_results = None
+    try:
+        # map() yields the batches in submission order, so pages stay in document order. It submits them
+        # all at once, which already fails for a pool whose processes died while it was idle.
+        batch_results = executor.map(
+            _extract_page_batch, [extractor.mode] * len(batches), [pdf_path] * len(batches), batches
+        )
+        for batch in batch_results:
+            for page_number, page_text in batch:
+                yield page_number, page_text
+                pages_done += 1
+    except BrokenProcessPool:
+        _discard_extraction_executor(executor)
+        print(f"WARNING: PDF extraction pool died, extracting {pdf_path} in-process instead")
+        with extractor.open(pdf_path) as document:
+            yield from extractor.page_texts(document, page_numbers[pages_done:])
+    finally:
+        # A caller that stops early (e.g. a verdict check) cancels the batches not started yet
+        if batch_results is not None:
+            batch_results.close()
+
+
+def iter_pdf_pages(uploaded_file, mode=None, pages=None, parallel=True):
+    """
+    Yields (page_number, page_text) for an uploaded PDF in page order, as the
+    pages are extracted, using the extractor for `mode` (see get_pdf_extractor).
+    With a PageSelection in `pages` only those pages are extracted. Documents
+    with at least PDF_EXTRACTION_PARALLEL_MIN_PAGES pages to extract are split
+    into batches of PDF_EXTRACTION_BATCH_PAGES pages and extracted across the
+    process pool; smaller ones are extracted in-process, and so is every
+    document if `parallel` is false (e.g. in a process that is itself one of
+    a pool's workers).
+    """
+    extractor = get_pdf_extractor(mode)
+    # With a page selection this first pass only counts the pages, so a backend that can is given none
+    # to parse (pdfplumber builds every page it was given, if only to close them)
+    count_only = pages is not None and extractor.limits_open_pages
+    uploaded_file.seek(0)
+    # Uploads spooled to disk are opened by path; the others are read from their in-memory buffer
+    with extractor.open(_file_source(uploaded_file), page_numbers=[] if count_only else None) as document:
+        page_count = extractor.page_count(document)
+        if not page_count:
+            raise ExtractionError("PDF has no pages or could not be read.")
+        page_numbers = pages.page_numbers(page_count) if pages is not None else list(range(1, page_count + 1))
+        if not page_numbers:
+            raise ExtractionError(f"No page of this {page_count}-page PDF is in the page selection {pages}.")
+        in_process = (not parallel or settings.PDF_EXTRACTION_WORKERS <= 1
+                      or len(page_numbers) < settings.PDF_EXTRACTION_PARALLEL_MIN_PAGES)
+        if in_process and not count_only:
+            yield from extractor.page_texts(document, page_numbers if pages is not None else None)
+            return
+
+    if in_process:
+        # Opened again with only the selected pages, like a pool batch: the rest of the document is never parsed
+        uploaded_file.seek(0)
+        with extractor.open(_file_source(uploaded_file), page_numbers=page_numbers) as document:
+            yield from extractor.page_texts(document, page_numbers)
+        return
+
+    # Pool processes open the document by path, so it is never pickled
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        yield from _iter_pages_in_pool(extractor, uploaded_file.temporary_file_path(), page_numbers)
+        return
+
+    uploaded_file.seek(0)
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as spooled_pdf:
+        shutil.copyfileobj(uploaded_file, spooled_pdf)
+    try:
+        yield from _iter_pages_in_pool(extractor, spooled_pdf.name, page_numbers)
+    finally:
+        os.remove(spooled_pdf.name)
+
+
+# Recorded instead of a PDF extractor mode for DOCX text in the page store and result cache keys,
+# so that text and results from the earlier whole-document DOCX reader are not reused
+DOCX_READER_MODE = 'xml-chunks'
+
+
+def iter_docx_page_texts(uploaded_file, pages=None):
+    """
+    Yields the body paragraphs, table cells, headers and footers of an
+    uploaded DOCX as (location, text, page_number), e.g. ("Table 2, row 3,
+    cell 1", text, 4), reading the document XML in a single streaming pass
+    (see docx_text.iter_docx_chunks). Page numbers follow the page breaks
+    saved in the file, so they are only as good as Word's last layout. With
+    a PageSelection in `pages` only the chunks on those pages are yielded.
+    """
+    uploaded_file.seek(0)
+    try:
+        # The zip archive is read in place, without copying the upload
+        docx_chunks = iter_docx_chunks(_file_source(uploaded_file))
+        if pages is None:
+            yield from docx_chunks
+            return
+        # "last-5" or "40-" need the page count, which is only known once the whole document is read
+        docx_chunks = list(docx_chunks)
+    except Exception as docx_err:
+        raise ExtractionError(f"Could not read DOCX content: {str(docx_err)}")
+    page_count = max((page_number for _location, _text, page_number in docx_chunks), default=0)
+    selected_pages = set(pages.page_numbers(page_count))
+    if docx_chunks and not selected_pages:
+        raise ExtractionError(f"No page of this {page_count}-page DOCX is in the page selection {pages}.")
+    for docx_chunk in docx_chunks:
+        if docx_chunk[2] in selected_pages:
+            yield docx_chunk
+
+
+SUPPORTED_FILE_KINDS = ('.pdf', '.docx')
+
+
+def document_kind(file_name):
+    """The lowercased extension that decides how a file is read, e.g. '.pdf'."""
+    file_name_lower = file_name.lower()
+    for file_kind in SUPPORTED_FILE_KINDS:
+        if file_name_lower.endswith(file_kind):
+            return file_kind
+    return os.path.splitext(file_name_lower)[1]
+
+
+def iter_page_texts(uploaded_file, file_kind, extractor_mode=None, pages=None, parallel=True):
+    """
+    The extraction stage of a document check: yields the non-empty pages of
+    an uploaded file as (page_label, page_text, page_number) tuples, each one
+    as soon as it has been extracted. file_kind comes from document_kind().
+    DOCX files are yielded a paragraph, table cell, header or footer at a
+    time, so several tuples can share a page number. A PageSelection in
+    `pages` limits either kind to those pages; `parallel` is passed on to
+    iter_pdf_pages.
+    """
+    if file_kind == '.pdf':
+        for page_num, page_text in iter_pdf_pages(uploaded_file, extractor_mode, pages, parallel):
+            if page_text:
+                yield (f"Page {page_num}", page_text, page_num)
+    elif file_kind == '.docx':
+        yield from iter_docx_page_texts(uploaded_file, pages)
+    else:
+        raise ExtractionError("Unsupported file type.")
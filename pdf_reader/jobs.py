@@ -0,0 +1,184 @@
+# backend/pdf_reader/jobs.py
+import os
+import shutil
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .checking import check_document_file, error_file_result
+from .extraction import PageSelection
+from .models import CheckJob, CheckJobFile
+from .result_cache import get_result_cache
+
+
+class SpooledJobFile(File):
+    # Spooled uploads are already on disk, so PDF extraction can hand their path to the process pool
+    def temporary_file_path(self):
+        return self.file.name
+
+
+_job_executor = None
+_job_executor_lock = threading.Lock()
+
+
+def get_job_executor():
+    """The thread pool that checks job files in this worker, created on first use."""
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(max_workers=settings.CHECK_JOB_WORKERS, thread_name_prefix='check-job')
+        return _job_executor
+
+
+def submit_check_job(uploaded_files, extractor_mode, check_mode='full', pages=None, max_hits=None):
+    """
+    Spools the uploads to CHECK_JOB_SPOOL_DIR, records a CheckJob and queues
+    its files on the job pool. Returns the job without waiting for any result.
+    """
+    job_id = uuid.uuid4()
+    job_dir = os.path.join(settings.CHECK_JOB_SPOOL_DIR, str(job_id))
+    # Spooled before the transaction: with transaction_mode IMMEDIATE it holds the SQLite write
+    # lock, which job results and the page store would otherwise wait on during all this disk I/O
+    os.makedirs(job_dir, exist_ok=True)
+    spooled_files = []
+    try:
+        for position, uploaded_file in enumerate(uploaded_files):
+            spool_path = os.path.join(job_dir, f"{position:02d}{os.path.splitext(uploaded_file.name)[1].lower()}")
+            with open(spool_path, 'wb') as spooled:
+                for chunk in uploaded_file.chunks():
+                    spooled.write(chunk)
+            spooled_files.append((position, uploaded_file.name, spool_path))
+    except Exception:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+
+    with transaction.atomic():
+        job = CheckJob.objects.create(
+            id=job_id, extractor_mode=extractor_mode, check_mode=check_mode,
+            page_selection=str(pages) if pages is not None else '', max_hits=max_hits,
+        )
+        CheckJobFile.objects.bulk_create([
+            CheckJobFile(job=job, position=position, filename=filename, spool_path=spool_path)
+            for position, filename, spool_path in spooled_files
+        ])
+        job_file_ids = list(job.files.values_list('id', flat=True))
+        # Workers must not look for the rows before they are committed
+        transaction.on_commit(lambda: _enqueue_job_files(job_file_ids))
+    return job
+
+
+def _enqueue_job_files(job_file_ids):
+    if settings.CHECK_JOB_WORKERS <= 0:
+        # No pool: check the files right away in this thread (tests, debugging)
+        for job_file_id in job_file_ids:
+            run_check_job_file(job_file_id)
+        return
+    executor = get_job_executor()
+    for job_file_id in job_file_ids:
+        executor.submit(_run_in_pool_thread, job_file_id)
+
+
+def _run_in_pool_thread(job_file_id):
+    try:
+        run_check_job_file(job_file_id)
+    finally:
+        # Pool threads outlive the job; don't leave their database connections open
+        connections.close_all()
+
+
+def run_check_job_file(job_file_id):
+    """Checks one queued job file and stores its result, so the job reports it straight away."""
+    job_file = CheckJobFile.objects.select_related('job').get(id=job_file_id)
+    CheckJobFile.objects.filter(id=job_file_id).update(state=CheckJobFile.RUNNING)
+    job = job_file.job
+    try:
+        pages = PageSelection(job.page_selection) if job.page_selection else None
+        with open(job_file.spool_path, 'rb') as spooled:
+            result = check_document_file(
+                SpooledJobFile(spooled, name=job_file.filename), job.extractor_mode, get_result_cache(),
+                job.check_mode, pages=pages, max_hits=job.max_hits,
+            )
+    except Exception as e:
+        print(f"  Job {job_file.job_id}: could not check {job_file.filename}: {e}")
+        print(traceback.format_exc())
+        result = error_file_result(job_file.filename, job.check_mode, f"An unexpected error: {str(e)}")
+    CheckJobFile.objects.filter(id=job_file_id).update(state=CheckJobFile.DONE, result=result)
+    try:
+        os.remove(job_file.spool_path)
+    except FileNotFoundError:
+        pass
+
+    _finish_job_if_done(job)
+
+
+def _finish_job_if_done(job):
+    if not job.files.exclude(state=CheckJobFile.DONE).exists():
+        CheckJob.objects.filter(id=job.id, finished_at__isnull=True).update(finished_at=timezone.now())
+        shutil.rmtree(os.path.join(settings.CHECK_JOB_SPOOL_DIR, str(job.id)), ignore_errors=True)
+
+
+def recover_interrupted_jobs(recheck=False):
+    """
+    Deals with the files left pending or running by web workers that stopped
+    (a restart or a crash loses the job pool's queue). They are marked done
+    with an error result, or with recheck checked again here when their
+    spooled copy is still there. Spool directories that belong to no
+    unfinished job are removed. Returns (files rechecked, files failed).
+    Only safe while no web worker is running jobs: it can't tell a file that
+    is being checked right now from one that never will be.
+    """
+    rechecked = failed = 0
+    interrupted_files = CheckJobFile.objects.exclude(state=CheckJobFile.DONE).select_related('job')
+    for job_file in interrupted_files:
+        if recheck and os.path.exists(job_file.spool_path):
+            run_check_job_file(job_file.id)
+            rechecked += 1
+            continue
+        CheckJobFile.objects.filter(id=job_file.id).update(state=CheckJobFile.DONE, result=error_file_result(
+            job_file.filename, job_file.job.check_mode,
+            "The check was interrupted by a server restart; submit the file again.",
+        ))
+        failed += 1
+        _finish_job_if_done(job_file.job)
+
+    if os.path.isdir(settings.CHECK_JOB_SPOOL_DIR):
+        unfinished_job_ids = {
+            str(job_id) for job_id in CheckJob.objects.filter(finished_at__isnull=True).values_list('id', flat=True)
+        }
+        for entry in os.listdir(settings.CHECK_JOB_SPOOL_DIR):
+            if entry not in unfinished_job_ids:
+                shutil.rmtree(os.path.join(settings.CHECK_JOB_SPOOL_DIR, entry), ignore_errors=True)
+    return rechecked, failed
+
+
+def describe_check_job(job):
+    """Progress of a job, with the result of every file finished so far."""
+    job_files = list(job.files.all())
+    files_done = sum(job_file.state == CheckJobFile.DONE for job_file in job_files)
+    if files_done == len(job_files):
+        job_status = "done"
+    elif all(job_file.state == CheckJobFile.PENDING for job_file in job_files):
+        job_status = "queued"
+    else:
+        job_status = "running"
+    return {
+        "job_id": str(job.id),
+        "status": job_status,
+        "mode": job.check_mode,
+        "pages": job.page_selection or None,
+        "max_hits": job.max_hits,
+        "files_total": len(job_files),
+        "files_done": files_done,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "files": [
+            {"filename": job_file.filename, "state": job_file.state, "result": job_file.result}
+            for job_file in job_files
+        ],
+    }
@@ -0,0 +1,152 @@
+# backend/pdf_reader/management/commands/benchmark_concurrency.py
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+
+from pdf_reader.checking import get_rule_set
+from pdf_reader.extraction import PDF_EXTRACTORS
+from pdf_reader.management.commands.benchmark_pipeline import _comma_list
+from pdf_reader.synthetic import build_pdf, synthetic_pages
+from pdf_reader.views import AsyncCheckDocumentView, CheckDocumentView
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures /check-document/ throughput under concurrent requests: the WSGI view on a thread per "
+        "client (like a threaded WSGI server) against the async view on one event loop, at each "
+        "concurrency level. Writes requests/sec, pages/sec and latency percentiles as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', default='1,4,16', help="Comma-separated numbers of concurrent clients")
+        parser.add_argument('--requests', type=int, default=32, help="Requests per concurrency level and setup")
+        parser.add_argument('--files', type=int, default=3, help="PDF files per request")
+        parser.add_argument('--pages', type=int, default=10, help="Pages per PDF file")
+        parser.add_argument('--density', type=float, default=0.005, help="Fraction of words that are rule hits")
+        parser.add_argument('--extractor', default=settings.PDF_EXTRACTION_MODE, choices=sorted(PDF_EXTRACTORS))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="JSON file to write (default: stdout)")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['files'] < 1:
+            raise CommandError("--requests and --files must be at least 1.")
+        rng = random.Random(options['seed'])
+
+        # Every request has to do the full work: no result cache, no stored page text
+        with override_settings(RESULT_CACHE={'BACKEND': ''}, PAGE_TEXT_STORE_ENABLED=False):
+            rule_set = get_rule_set()
+            # Distinct files, so that nothing a request does can be reused by the next one
+            self.files = [
+                (f"doc-{n}.pdf", build_pdf(synthetic_pages(options['pages'], rule_set.words_to_check,
+                                                           options['density'], rng)))
+                for n in range(options['files'])
+            ]
+            self.extractor_mode = options['extractor']
+            runs = []
+            for clients in _comma_list(options['clients'], int):
+                for setup, run in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                    started = time.perf_counter()
+                    latencies = run(clients, options['requests'])
+                    runs.append(self.summarize(setup, clients, latencies, time.perf_counter() - started, options))
+                    self.stderr.write(self.format_run(runs[-1]))
+
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "check_async_workers": settings.CHECK_ASYNC_WORKERS,
+            "extractor": options['extractor'],
+            "files_per_request": options['files'],
+            "pages_per_file": options['pages'],
+            "runs": runs,
+        }
+        report_json = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report_json + "\n")
+            self.stderr.write(f"Wrote {len(runs)} runs to {options['output']}")
+        else:
+            self.stdout.write(report_json)
+
+    def form_data(self):
+        return {
+            'files': [SimpleUploadedFile(name, file_bytes) for name, file_bytes in self.files],
+            'extractor': self.extractor_mode,
+        }
+
+    def run_wsgi(self, clients, request_count):
+        # One thread per client, each handling one request at a time through the synchronous view
+        view = CheckDocumentView.as_view()
+
+        def one_request(_n):
+            request = RequestFactory().post('/api/v1/check-document/', self.form_data())
+            started = time.perf_counter()
+            response = view(request)
+            response.render()
+            self.check_response(response)
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=clients) as client_threads:
+            return list(client_threads.map(one_request, range(request_count)))
+
+    def run_asgi(self, clients, request_count):
+        # All clients on one event loop, like an ASGI worker; the view hands the files to the check pool
+        view = AsyncCheckDocumentView.as_view()
+
+        async def one_client(request_numbers):
+            latencies = []
+            for _n in request_numbers:
+                request = AsyncRequestFactory().post('/api/v1/check-document/async/', self.form_data())
+                started = time.perf_counter()
+                response = await view(request)
+                self.check_response(response)
+                latencies.append(time.perf_counter() - started)
+            return latencies
+
+        async def all_clients():
+            request_numbers = list(range(request_count))
+            per_client = await asyncio.gather(*(one_client(request_numbers[i::clients]) for i in range(clients)))
+            return [latency for client_latencies in per_client for latency in client_latencies]
+
+        return asyncio.run(all_clients())
+
+    def check_response(self, response):
+        if response.status_code != 200:
+            raise CommandError(f"/check-document/ answered {response.status_code}: {response.content[:200]!r}")
+
+    def summarize(self, setup, clients, latencies, wall_seconds, options):
+        pages = len(latencies) * options['files'] * options['pages']
+        return {
+            "setup": setup,
+            "clients": clients,
+            "requests": len(latencies),
+            "wall_s": wall_seconds,
+            "requests_per_s": len(latencies) / wall_seconds,
+            "pages_per_s": pages / wall_seconds,
+            "latency_p50_s": statistics.median(latencies),
+            "latency_p95_s": _percentile(latencies, 0.95),
+        }
+
+    def format_run(self, run):
+        return (
+            f"{run['setup']:<5} {run['clients']:>3} clients  {run['requests_per_s']:7.2f} req/s  "
+            f"{run['pages_per_s']:8.1f} pages/s  p50 {run['latency_p50_s'] * 1000:8.1f} ms  "
+            f"p95 {run['latency_p95_s'] * 1000:8.1f} ms"
+        )
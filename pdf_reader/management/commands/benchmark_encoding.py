@@ -0,0 +1,116 @@
+# backend/pdf_reader/management/commands/benchmark_encoding.py
+import json
+import os
+import platform
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from pdf_reader.checking import check_document_file, get_rule_set
+from pdf_reader.management.commands.benchmark_pipeline import _comma_list
+from pdf_reader.renderers import MessagePackRenderer
+from pdf_reader.synthetic import build_pdf, synthetic_pages
+
+
+def encoders():
+    """(name, function from results to bytes) for every response encoding this server can send."""
+    json_renderer = JSONRenderer()
+    msgpack_renderer = MessagePackRenderer()
+    return [
+        ("json", json_renderer.render),
+        ("json+gzip", lambda data: compress_string(json_renderer.render(data))),
+        ("msgpack", msgpack_renderer.render),
+        ("msgpack+gzip", lambda data: compress_string(msgpack_renderer.render(data))),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the size and encoding time of /check-document/ responses: full and compact results, "
+        "as JSON (like Response(results_for_all_files)), gzip-compressed JSON and MessagePack, on "
+        "synthetic PDFs of varying page counts and keyword density. Writes the cases as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', default='10,100', help="Comma-separated page counts")
+        parser.add_argument('--densities', default='0.005,0.05',
+                            help="Comma-separated fractions of words that are rule hits")
+        parser.add_argument('--document-keywords', default='0,20',
+                            help="Comma-separated numbers of distinct keywords a document's hits use (0: any keyword)")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed encodings per case; the median is reported")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="JSON file to write (default: stdout)")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        cases = []
+        # Only the response is measured: the results are computed once per shape, without the caches
+        with override_settings(RESULT_CACHE={'BACKEND': ''}, PAGE_TEXT_STORE_ENABLED=False):
+            rule_set = get_rule_set()
+            for page_count in _comma_list(options['pages'], int):
+                for density in _comma_list(options['densities'], float):
+                    for keyword_count in _comma_list(options['document_keywords'], int):
+                        # Real documents tend to repeat a few keywords, which is where grouping hits pays off
+                        document_words = dict(rng.sample(
+                            sorted(rule_set.words_to_check.items()), min(keyword_count, len(rule_set.words_to_check))
+                        )) if keyword_count else rule_set.words_to_check
+                        file_bytes = build_pdf(synthetic_pages(page_count, document_words, density, rng))
+                        name = f"pdf-{page_count}p-d{density:g}" + (f"-k{keyword_count}" if keyword_count else "")
+                        cases.extend(self.run_case(name, file_bytes, rule_set, options))
+
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "rules_version": rule_set.version,
+            "repeat": options['repeat'],
+            "seed": options['seed'],
+            "cases": cases,
+        }
+        report_json = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report_json + "\n")
+            self.stderr.write(f"Wrote {len(cases)} cases to {options['output']}")
+        else:
+            self.stdout.write(report_json)
+
+    def run_case(self, name, file_bytes, rule_set, options):
+        cases = []
+        baseline = None
+        for check_mode in ('full', 'compact'):
+            results_for_all_files = [check_document_file(
+                SimpleUploadedFile(f"{name}.pdf", file_bytes), 'fast', None, check_mode, rule_set
+            )]
+            for encoding, encode in encoders():
+                encode_runs = []
+                for _ in range(max(1, options['repeat'])):
+                    started = time.perf_counter()
+                    encoded = encode(results_for_all_files)
+                    encode_runs.append(time.perf_counter() - started)
+                case = {
+                    "name": name,
+                    "shape": check_mode,
+                    "encoding": encoding,
+                    "bytes": len(encoded),
+                    "encode_s": statistics.median(encode_runs),
+                }
+                # Against what /check-document/ sends today: full results as plain JSON
+                if baseline is None:
+                    baseline = case
+                case["size_ratio"] = case["bytes"] / baseline["bytes"]
+                case["encode_ratio"] = case["encode_s"] / baseline["encode_s"] if baseline["encode_s"] else None
+                cases.append(case)
+                self.stderr.write(
+                    f"{name:<20} {check_mode:<8} {encoding:<13} {case['bytes']:>10} bytes ({case['size_ratio']:6.1%})  "
+                    f"{case['encode_s'] * 1000:8.2f} ms ({case['encode_ratio']:6.1%})"
+                )
+        return cases
@@ -0,0 +1,214 @@
+# backend/pdf_reader/management/commands/benchmark_pipeline.py
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from pdf_reader.checking import get_rule_set
+from pdf_reader.extraction import PDF_EXTRACTORS, document_kind, iter_page_texts
+from pdf_reader.matching import DocumentCheck
+from pdf_reader.synthetic import build_docx, build_pdf, synthetic_keywords, synthetic_pages
+from pdf_reader.views import CheckDocumentView
+
+
+def _comma_list(value, item_type=str):
+    return [item_type(item) for item in value.split(',') if item.strip()]
+
+
+def time_check_stages(uploaded_file, extractor_mode, rule_set):
+    """
+    Runs the stages of a document check (the same ones iter_document_check
+    uses, without the result cache or page store) and times each of them.
+    Returns (timings in seconds, page count, file result).
+    """
+    timings = {"extraction": 0.0, "matching": 0.0, "serialization": 0.0}
+    document_check = DocumentCheck(rule_set)
+    page_texts = iter_page_texts(uploaded_file, document_kind(uploaded_file.name), extractor_mode)
+    page_count = 0
+    while True:
+        started = time.perf_counter()
+        page = next(page_texts, None)
+        extracted = time.perf_counter()
+        timings["extraction"] += extracted - started
+        if page is None:
+            break
+        document_check.add_page(*page)
+        timings["matching"] += time.perf_counter() - extracted
+        page_count += 1
+
+    started = time.perf_counter()
+    file_result = {"filename": uploaded_file.name, **document_check.result(), "error_message": None}
+    timings["matching"] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    JSONRenderer().render([file_result])
+    timings["serialization"] += time.perf_counter() - started
+    return timings, page_count, file_result
+
+
+def post_to_view(file_name, file_bytes, extractor_mode):
+    """One /check-document/ request for the file through CheckDocumentView; returns the rendered response."""
+    request = RequestFactory().post(
+        '/api/v1/check-document/', {'files': [SimpleUploadedFile(file_name, file_bytes)], 'extractor': extractor_mode}
+    )
+    response = CheckDocumentView.as_view()(request)
+    response.render()
+    if response.status_code != 200:
+        raise CommandError(f"{file_name}: /check-document/ answered {response.status_code}: {response.content[:200]!r}")
+    return response
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the check-document pipeline on a synthetic corpus (PDF and DOCX files of varying "
+        "page counts and keyword density) and writes extraction, matching and serialization times, "
+        "pages/sec and peak memory per case as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', default='1,10,50', help="Comma-separated page counts")
+        parser.add_argument('--densities', default='0.001,0.02',
+                            help="Comma-separated fractions of words that are rule hits")
+        parser.add_argument('--kinds', default='pdf,docx', help="Comma-separated file kinds: pdf, docx")
+        parser.add_argument('--extractors', default=','.join(sorted(PDF_EXTRACTORS)),
+                            help="Comma-separated PDF extractor modes")
+        parser.add_argument('--direct-rules', type=int, default=0,
+                            help="Synthetic direct keywords (with --vicinity-rules; both 0 uses the app's keywords.json)")
+        parser.add_argument('--vicinity-rules', type=int, default=0, help="Synthetic check_vicinity rules")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per case; the median is reported")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="JSON file to write (default: stdout)")
+        parser.add_argument('--compare', help="JSON file of an earlier run to compare end-to-end times with")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        kinds = _comma_list(options['kinds'])
+        unknown_kinds = set(kinds) - {'pdf', 'docx'}
+        if unknown_kinds:
+            raise CommandError(f"Unknown file kinds: {', '.join(sorted(unknown_kinds))}")
+        extractors = _comma_list(options['extractors'])
+        unknown_extractors = set(extractors) - set(PDF_EXTRACTORS)
+        if unknown_extractors:
+            raise CommandError(f"Unknown extractor modes: {', '.join(sorted(unknown_extractors))}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            keywords_settings = {}
+            if options['direct_rules'] or options['vicinity_rules']:
+                keywords_path = os.path.join(directory, 'keywords.json')
+                with open(keywords_path, 'w') as keywords_file:
+                    json.dump(synthetic_keywords(options['direct_rules'], options['vicinity_rules'], rng), keywords_file)
+                keywords_settings['KEYWORDS_FILE'] = keywords_path
+            # Every run has to do the full work: no result cache, no stored page text
+            with override_settings(RESULT_CACHE={'BACKEND': ''}, PAGE_TEXT_STORE_ENABLED=False, **keywords_settings):
+                rule_set = get_rule_set()
+                cases = self.run_cases(rule_set, kinds, extractors, rng, options)
+
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "rules_version": rule_set.version,
+            "rules": len(rule_set.words_to_check),
+            "repeat": options['repeat'],
+            "seed": options['seed'],
+            "cases": cases,
+        }
+        if options['compare']:
+            self.compare(report, options['compare'])
+
+        report_json = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report_json + "\n")
+            self.stderr.write(f"Wrote {len(cases)} cases to {options['output']}")
+        else:
+            self.stdout.write(report_json)
+
+    def run_cases(self, rule_set, kinds, extractors, rng, options):
+        cases = []
+        for page_count in _comma_list(options['pages'], int):
+            for density in _comma_list(options['densities'], float):
+                pages = synthetic_pages(page_count, rule_set.words_to_check, density, rng)
+                for kind in kinds:
+                    if kind == 'pdf':
+                        file_bytes = build_pdf(pages)
+                        modes = extractors
+                    else:
+                        file_bytes = build_docx(pages)
+                        modes = [extractors[0]] # DOCX text does not depend on the PDF extractor
+                    for extractor_mode in modes:
+                        name = f"{kind}-{page_count}p-d{density:g}" + (f"-{extractor_mode}" if kind == 'pdf' else '')
+                        cases.append(self.run_case(
+                            name, f"{name}.{kind}", file_bytes, extractor_mode, rule_set, page_count, density, options['repeat']
+                        ))
+                        self.stderr.write(self.format_case(cases[-1]))
+        return cases
+
+    def run_case(self, name, file_name, file_bytes, extractor_mode, rule_set, page_count, density, repeat):
+        stage_runs = []
+        end_to_end_runs = []
+        for _ in range(max(1, repeat)):
+            timings, pages_checked, file_result = time_check_stages(
+                SimpleUploadedFile(file_name, file_bytes), extractor_mode, rule_set
+            )
+            stage_runs.append(timings)
+            started = time.perf_counter()
+            post_to_view(file_name, file_bytes, extractor_mode)
+            end_to_end_runs.append(time.perf_counter() - started)
+
+        # A separate run for memory: tracing allocations slows everything down
+        tracemalloc.start()
+        try:
+            post_to_view(file_name, file_bytes, extractor_mode)
+            peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        end_to_end = statistics.median(end_to_end_runs)
+        return {
+            "name": name,
+            "file_kind": file_name.rsplit('.', 1)[1],
+            "extractor": extractor_mode if file_name.endswith('.pdf') else None,
+            "pages": page_count,
+            "pages_checked": pages_checked,
+            "keyword_density": density,
+            "file_bytes": len(file_bytes),
+            "found_instances": len(file_result["found_instances"]),
+            "status": file_result["status"],
+            "extraction_s": statistics.median(run["extraction"] for run in stage_runs),
+            "matching_s": statistics.median(run["matching"] for run in stage_runs),
+            "serialization_s": statistics.median(run["serialization"] for run in stage_runs),
+            "end_to_end_s": end_to_end,
+            "pages_per_s": page_count / end_to_end if end_to_end else None,
+            "peak_memory_bytes": peak_memory_bytes,
+        }
+
+    def format_case(self, case):
+        return (
+            f"{case['name']:<28} extract {case['extraction_s'] * 1000:9.1f} ms  match {case['matching_s'] * 1000:8.1f} ms  "
+            f"serialize {case['serialization_s'] * 1000:7.1f} ms  total {case['end_to_end_s'] * 1000:9.1f} ms  "
+            f"{case['pages_per_s'] or 0:8.1f} pages/s  peak {case['peak_memory_bytes'] / 1024 / 1024:6.1f} MiB"
+        )
+
+    def compare(self, report, previous_path):
+        with open(previous_path) as previous_file:
+            previous_cases = {case['name']: case for case in json.load(previous_file)['cases']}
+        for case in report['cases']:
+            previous = previous_cases.get(case['name'])
+            if previous is None or not case['end_to_end_s']:
+                continue
+            ratio = previous['end_to_end_s'] / case['end_to_end_s']
+            case['speedup_vs_previous'] = ratio
+            style = self.style.SUCCESS if ratio >= 1 else self.style.WARNING
+            self.stderr.write(style(f"{case['name']:<28} {ratio:5.2f}x vs {previous_path}"))
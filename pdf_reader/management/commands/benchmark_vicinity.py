@@ -0,0 +1,83 @@
+# backend/pdf_reader/management/commands/benchmark_vicinity.py
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pdf_reader.matching import TokenStream, VicinityMatcher, WORD_TOKENIZER_REGEX
+from pdf_reader.checking import get_rule_set
+
+
+def linear_vicinity_scan(words_to_check, page_word_objects):
+    # The per-rule token walk the view used before VicinityMatcher, kept as the baseline
+    hits = {}
+    for keyword, properties in words_to_check.items():
+        vicinity_config = properties.get("check_vicinity")
+        if not vicinity_config:
+            continue
+        trigger_keyword_lower = keyword.lower()
+        proximity_terms_lower = [term.lower() for term in vicinity_config["terms"]]
+        window = vicinity_config["window"]
+        for idx, word_obj in enumerate(page_word_objects):
+            if word_obj['lower'] == trigger_keyword_lower:
+                scan_start_idx = max(0, idx - window)
+                scan_end_idx = min(len(page_word_objects), idx + 1 + window)
+                for k in range(scan_start_idx, scan_end_idx):
+                    if k == idx: continue
+                    if page_word_objects[k]['lower'] in proximity_terms_lower:
+                        hits.setdefault(keyword, []).append((idx, k))
+                        break
+    return hits
+
+
+class Command(BaseCommand):
+    help = "Times the indexed vicinity engine against the linear per-rule scan on synthetic pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=500)
+        parser.add_argument('--words-per-page', type=int, default=600)
+        parser.add_argument('--extra-rules', type=int, default=200,
+                            help="Synthetic check_vicinity rules added to the ones in keywords.json")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words_to_check = {kw: props for kw, props in get_rule_set().words_to_check.items() if props.get("check_vicinity")}
+        for n in range(options['extra_rules']):
+            words_to_check[f"trigger{n}"] = {
+                "fail_if_found": True,
+                "check_vicinity": {"terms": [f"term{n}a", f"term{n}b", "people"], "window": rng.randint(2, 8)},
+            }
+
+        vocabulary = [f"filler{n}" for n in range(2000)]
+        special_words = list(words_to_check) + [t for p in words_to_check.values() for t in p["check_vicinity"]["terms"]]
+        pages = []
+        for _ in range(options['pages']):
+            words = [rng.choice(special_words) if rng.random() < 0.02 else rng.choice(vocabulary)
+                     for _ in range(options['words_per_page'])]
+            pages.append(" ".join(words))
+
+        # Both timings include tokenizing the pages the way each engine needs them
+        started = time.perf_counter()
+        linear_hits = []
+        for text in pages:
+            page_word_objects = [
+                {'text': m.group(0), 'lower': m.group(0).lower(), 'start': m.start(), 'end': m.end()}
+                for m in WORD_TOKENIZER_REGEX.finditer(text)
+            ]
+            linear_hits.append(linear_vicinity_scan(words_to_check, page_word_objects))
+        linear_seconds = time.perf_counter() - started
+
+        matcher = VicinityMatcher(words_to_check)
+        started = time.perf_counter()
+        indexed_hits = [dict(matcher.find_all(matcher.index_positions(TokenStream(text)))) for text in pages]
+        indexed_seconds = time.perf_counter() - started
+
+        if linear_hits != indexed_hits:
+            raise CommandError("Indexed engine returned different hits than the linear scan")
+
+        total_hits = sum(len(h) for page_hits in indexed_hits for h in page_hits.values())
+        self.stdout.write(f"{options['pages']} pages, {len(words_to_check)} vicinity rules, {total_hits} hits")
+        self.stdout.write(f"linear scan:    {linear_seconds:.3f}s")
+        self.stdout.write(f"indexed engine: {indexed_seconds:.3f}s")
+        self.stdout.write(self.style.SUCCESS(f"speedup: {linear_seconds / indexed_seconds:.1f}x"))
@@ -0,0 +1,62 @@
+# backend/pdf_reader/management/commands/recheck_documents.py
+import json
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pdf_reader.extraction import DOCX_READER_MODE
+from pdf_reader.matching import RuleSet, check_page_texts
+from pdf_reader.models import ExtractedDocument
+from pdf_reader.page_store import decode_page_texts
+from pdf_reader.checking import load_keywords
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-evaluates every document in the page text store against a keyword list, "
+        "running only the matching stage. Writes one JSON result per line."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keywords', help="keywords.json to check against (default: the app's keywords.json)")
+        parser.add_argument('--extractor', help="Only documents extracted with this PDF extractor mode")
+        parser.add_argument('--output', help="NDJSON file to write (default: stdout)")
+        parser.add_argument('--summary-only', action='store_true',
+                            help="Leave found_instances out of each line")
+
+    def handle(self, *args, **options):
+        words_to_check = load_keywords(options['keywords'])
+        if not words_to_check:
+            raise CommandError("No keywords loaded, nothing to check against.")
+        rule_set = RuleSet(words_to_check, source=options['keywords'])
+
+        documents = ExtractedDocument.objects.order_by('id')
+        if options['extractor']:
+            # DOCX text does not depend on the PDF extractor and always applies
+            documents = documents.filter(extractor_mode__in=[options['extractor'], DOCX_READER_MODE])
+
+        output = open(options['output'], 'w') if options['output'] else self.stdout
+        status_counts = Counter()
+        try:
+            for document in documents.iterator():
+                file_check_result = check_page_texts(
+                    decode_page_texts(document.compressed_page_texts), rule_set,
+                    report_locations=(document.file_kind == '.docx'),
+                )
+                status_counts[file_check_result["status"]] += 1
+                if options['summary_only']:
+                    del file_check_result["found_instances"]
+                output.write(json.dumps({
+                    "filename": document.filename,
+                    "content_hash": document.content_hash,
+                    "file_kind": document.file_kind,
+                    "extractor_mode": document.extractor_mode,
+                    **file_check_result,
+                    "rules_version": rule_set.version,
+                }) + "\n")
+        finally:
+            if output is not self.stdout:
+                output.close()
+
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(status_counts.items()))
+        self.stderr.write(f"Re-checked {sum(status_counts.values())} documents: {summary or 'none stored'}")
@@ -0,0 +1,20 @@
+# backend/pdf_reader/management/commands/recover_check_jobs.py
+from django.core.management.base import BaseCommand
+
+from pdf_reader.jobs import recover_interrupted_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Finishes the background check jobs that were queued or running when the web workers stopped: "
+        "their files get an error result (or, with --recheck, are checked now), and leftover spool "
+        "files are removed. Run it before the web workers start, e.g. in the deploy or start script."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recheck', action='store_true',
+                            help="Check the interrupted files again in this process instead of failing them")
+
+    def handle(self, *args, **options):
+        rechecked, failed = recover_interrupted_jobs(recheck=options['recheck'])
+        self.stderr.write(f"Recovered interrupted job files: {rechecked} re-checked, {failed} marked as errors")
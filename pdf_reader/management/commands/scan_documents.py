@@ -0,0 +1,283 @@
+# backend/pdf_reader/management/commands/scan_documents.py
+import csv
+import json
+import multiprocessing
+import os
+import tarfile
+import zipfile
+from collections import Counter
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from pdf_reader.checking import CHECK_MODES, check_document_file, error_file_result, get_rule_set, load_keywords
+from pdf_reader.extraction import PDF_EXTRACTORS, SUPPORTED_FILE_KINDS, PageSelection, document_kind
+from pdf_reader.jobs import SpooledJobFile
+from pdf_reader.matching import RuleSet
+
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+CSV_COLUMNS = ('filename', 'status', 'hits', 'fail_summary', 'error_message', 'rules_version')
+
+
+def iter_documents(input_path):
+    """
+    Yields (name, source) for every PDF and DOCX under a directory or in a
+    ZIP or TAR archive, in a stable order. name is the path relative to the
+    directory or inside the archive; source is a file path for directories
+    and the document's bytes for archives.
+    """
+    if os.path.isdir(input_path):
+        for directory, subdirectories, file_names in os.walk(input_path):
+            subdirectories.sort()
+            for file_name in sorted(file_names):
+                if document_kind(file_name) in SUPPORTED_FILE_KINDS:
+                    path = os.path.join(directory, file_name)
+                    yield os.path.relpath(path, input_path), path
+    elif input_path.lower().endswith(TAR_SUFFIXES):
+        # Read in member order: compressed tar archives can't be read out of order
+        with tarfile.open(input_path, 'r:*') as archive:
+            for member in archive:
+                if member.isfile() and document_kind(member.name) in SUPPORTED_FILE_KINDS:
+                    yield member.name, archive.extractfile(member).read()
+    elif input_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(input_path) as archive:
+            for member in archive.infolist():
+                if not member.is_dir() and document_kind(member.filename) in SUPPORTED_FILE_KINDS:
+                    yield member.filename, archive.read(member)
+    else:
+        raise CommandError(f"{input_path} is not a directory, a .zip archive or a tar archive ({', '.join(TAR_SUFFIXES)})")
+
+
+_worker_rule_set = None
+_worker_parallel_extraction = True
+
+
+def _init_worker(keywords_path, in_pool=True):
+    # Runs once in every pool process (and once for an in-process scan)
+    global _worker_rule_set, _worker_parallel_extraction
+    # The pool already keeps every CPU busy with whole files: no extraction pool inside a worker
+    _worker_parallel_extraction = not in_pool
+    if keywords_path:
+        _worker_rule_set = RuleSet(load_keywords(keywords_path), source=keywords_path)
+    else:
+        _worker_rule_set = get_rule_set()
+
+
+def scan_document(name, source, extractor_mode, check_mode, pages, max_hits):
+    """Checks one document exactly like /check-document/ does, without the result cache or page store; returns its result."""
+    # A scan's documents are read once: storing their page text (and hashing them for it) is wasted work
+    check_options = dict(page_store=False, parallel_extraction=_worker_parallel_extraction)
+    try:
+        if isinstance(source, bytes):
+            return check_document_file(
+                ContentFile(source, name=name), extractor_mode, None, check_mode, _worker_rule_set, None, pages,
+                max_hits, **check_options,
+            )
+        try:
+            document_file = open(source, 'rb')
+        except OSError as e:
+            return error_file_result(name, check_mode, f"Could not open file: {e}", _worker_rule_set.version)
+        with document_file:
+            return check_document_file(
+                SpooledJobFile(document_file, name=name), extractor_mode, None, check_mode, _worker_rule_set, None,
+                pages, max_hits, **check_options,
+            )
+    finally:
+        # Pool processes outlive the document; don't leave their database connections open
+        connections.close_all()
+
+
+def csv_row(file_result):
+    """The CSV columns of a result: hits and failing keywords are summarised, the hits themselves are left out."""
+    if "first_hit" in file_result:
+        # A verdict result: at most the first hit
+        first_hit = file_result["first_hit"]
+        hits = 1 if first_hit else 0
+        fail_summary = f"{first_hit['word']} (page {first_hit['page']})" if first_hit else ""
+    else:
+        if "hits" in file_result:
+            # A compact result: hit groups with a count each
+            hits = sum(hit_group["count"] for hit_group in file_result["hits"])
+        else:
+            hits = len(file_result["found_instances"])
+        fail_summary = "; ".join(f"{item['keyword']} ({item['count']})" for item in file_result["fail_summary"])
+    return {
+        "filename": file_result["filename"], "status": file_result["status"], "hits": hits,
+        "fail_summary": fail_summary, "error_message": file_result["error_message"] or "",
+        "rules_version": file_result.get("rules_version", ""),
+    }
+
+
+def _read_done_names(output_path, output_format):
+    # Names already in an interrupted scan's output. A line cut off by the interruption is removed.
+    with open(output_path, 'rb') as output:
+        content = output.read()
+    complete_length = content.rfind(b"\n") + 1
+    if complete_length < len(content):
+        with open(output_path, 'r+b') as output:
+            output.truncate(complete_length)
+    lines = content[:complete_length].decode().splitlines()
+    if output_format == 'csv':
+        return {row['filename'] for row in csv.DictReader(lines)}
+    return {json.loads(line)['filename'] for line in lines if line.strip()}
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks every PDF and DOCX in a directory or a ZIP/TAR archive with the same extraction and "
+        "matching as /check-document/, on a process pool. Results are written as they finish, one "
+        "NDJSON line or CSV row per document, and --resume skips the documents already written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="Directory, .zip or tar archive to scan")
+        parser.add_argument('--output', help="File to write (default: stdout); required with --resume")
+        parser.add_argument('--format', choices=('ndjson', 'csv'),
+                            help="Output format (default: csv for a .csv --output, otherwise ndjson)")
+        parser.add_argument('--resume', action='store_true',
+                            help="Append to --output, skipping the documents it already has")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Pool processes; 0 checks the documents in this process")
+        parser.add_argument('--extractor', default=settings.PDF_EXTRACTION_MODE, choices=sorted(PDF_EXTRACTORS))
+        parser.add_argument('--mode', default='full', choices=CHECK_MODES)
+        parser.add_argument('--pages', help="Only check these pages of each document, e.g. 1-20,last-5")
+        parser.add_argument('--max-hits', type=int, help="Stop checking a document after this many hits")
+        parser.add_argument('--keywords', help="keywords.json to check against (default: the app's keywords.json)")
+        parser.add_argument('--summary-only', action='store_true',
+                            help="Leave found_instances (or the hits and contexts of --mode compact) out of each NDJSON line")
+
+    def handle(self, *args, **options):
+        output_format = options['format'] or (
+            'csv' if (options['output'] or '').lower().endswith('.csv') else 'ndjson'
+        )
+        try:
+            pages = PageSelection(options['pages']) if options['pages'] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['max_hits'] is not None and options['max_hits'] < 1:
+            raise CommandError("--max-hits must be at least 1.")
+        if options['max_hits'] is not None and options['mode'] == 'verdict':
+            raise CommandError("--max-hits does not apply to --mode verdict, which stops at the first failing hit.")
+        if options['resume'] and not options['output']:
+            raise CommandError("--resume needs --output.")
+
+        done_names = set()
+        if options['resume'] and os.path.exists(options['output']):
+            done_names = _read_done_names(options['output'], output_format)
+        # Resumed output keeps the header it has; one is only written to a new or empty file
+        write_header = not (
+            options['resume'] and os.path.exists(options['output']) and os.path.getsize(options['output']) > 0
+        )
+        if options['output']:
+            output = open(options['output'], 'a' if options['resume'] else 'w', newline='')
+        else:
+            output = self.stdout
+        csv_writer = csv.DictWriter(output, fieldnames=CSV_COLUMNS) if output_format == 'csv' else None
+        if csv_writer is not None and write_header:
+            csv_writer.writeheader()
+
+        self.status_counts = Counter()
+        try:
+            documents = (
+                (name, source) for name, source in iter_documents(options['input']) if name not in done_names
+            )
+            task_options = (options['extractor'], options['mode'], pages, options['max_hits'])
+            if options['workers'] <= 0:
+                _init_worker(options['keywords'], in_pool=False)
+                for name, source in documents:
+                    self.write_result(output, csv_writer, scan_document(name, source, *task_options), options)
+            else:
+                self.scan_on_pool(documents, task_options, output, csv_writer, options)
+        finally:
+            if output is not self.stdout:
+                output.close()
+
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(self.status_counts.items()))
+        skipped = f" ({len(done_names)} already done)" if done_names else ""
+        self.stderr.write(f"Scanned {sum(self.status_counts.values())} documents{skipped}: {summary or 'none found'}")
+
+    def scan_on_pool(self, documents, task_options, output, csv_writer, options):
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        # At most two documents per worker are read and waiting at any time
+        max_pending = options['workers'] * 2
+        # The (name, source) of every pending future, to check the document again if its process dies
+        pending = {}
+        pool = self.start_pool(options)
+        try:
+            for name, source in documents:
+                pending[pool.submit(scan_document, name, source, *task_options)] = (name, source)
+                if len(pending) >= max_pending:
+                    pool = self.write_finished(pool, pending, FIRST_COMPLETED, task_options, output, csv_writer, options)
+            pool = self.write_finished(pool, pending, ALL_COMPLETED, task_options, output, csv_writer, options)
+        except BaseException:
+            # Interrupted: what was written so far stays valid for --resume
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+
+    def start_pool(self, options):
+        # Workers are forked so that they start with Django (and any settings changes) already set up
+        mp_context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        return ProcessPoolExecutor(
+            max_workers=options['workers'], mp_context=mp_context,
+            initializer=_init_worker, initargs=(options['keywords'],),
+        )
+
+    def write_finished(self, pool, pending, return_when, task_options, output, csv_writer, options):
+        """
+        Writes the results of the pending documents that are done, taking them
+        out of pending, and returns the pool to submit to next. That is a new
+        one if a worker process died: the documents the old pool still had are
+        then checked again one at a time, and the one whose process dies again
+        is written as an error.
+        """
+        finished = wait(pending, return_when=return_when).done
+        broken_documents = []
+        while finished:
+            for future in finished:
+                document = pending.pop(future)
+                try:
+                    file_result = future.result()
+                except BrokenProcessPool:
+                    broken_documents.append(document)
+                    continue
+                self.write_result(output, csv_writer, file_result, options)
+            # A dead process (a crash in a PDF library, or the OOM killer) breaks the whole pool, which then
+            # fails every document it still had
+            finished = wait(pending).done if broken_documents else set()
+        if not broken_documents:
+            return pool
+
+        pool.shutdown(wait=False, cancel_futures=True)
+        pool = self.start_pool(options)
+        for name, source in broken_documents:
+            try:
+                file_result = pool.submit(scan_document, name, source, *task_options).result()
+            except BrokenProcessPool:
+                file_result = error_file_result(
+                    name, task_options[1], "The process checking this document stopped unexpectedly."
+                )
+                pool.shutdown(wait=False)
+                pool = self.start_pool(options)
+            self.write_result(output, csv_writer, file_result, options)
+        return pool
+
+    def write_result(self, output, csv_writer, file_result, options):
+        self.status_counts[file_result["status"]] += 1
+        if csv_writer is not None:
+            csv_writer.writerow(csv_row(file_result))
+        else:
+            if options['summary_only']:
+                file_result = {
+                    key: value for key, value in file_result.items() if key not in ("found_instances", "hits", "contexts")
+                }
+            output.write(json.dumps(file_result) + "\n")
+        # Every finished document is on disk before the next one, so an interrupted scan can resume
+        output.flush()
+        if sum(self.status_counts.values()) % 100 == 0:
+            self.stderr.write(f"{sum(self.status_counts.values())} documents scanned...")
@@ -0,0 +1,637 @@
+# backend/pdf_reader/matching.py
+import hashlib
+import json
+import re
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+# Characters before and after match for context phrase
+CONTEXT_WINDOW_CHARS = 60
+
+# Tokenizes the words on a page for vicinity checks
+WORD_TOKENIZER_REGEX = re.compile(r"[\w'-]+")
+
+# A keyword can only start where a word starts, so the leading run of word
+# characters of every keyword is what the combined scan looks for.
+LEADING_WORD_REGEX = re.compile(r"\w+")
+
+# The only non-ASCII characters that re.IGNORECASE treats as equal to an ASCII
+# word character. Folding them lets a case-insensitive hit be looked up by
+# its plain lowercase ASCII spelling.
+IGNORECASE_ASCII_FOLD = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's', '\u212a': 'k'})
+
+
+def keywords_version(words_to_check):
+    """Short content hash of a keywords.json mapping; changes whenever any rule changes."""
+    canonical = json.dumps(words_to_check, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def _trie_pattern(node):
+    # node maps a character to its child node; the '' key marks a word end
+    alternatives = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not alternatives:
+        return ''
+    if len(alternatives) == 1 and '' not in node:
+        return alternatives[0]
+    pattern = '(?:' + '|'.join(alternatives) + ')'
+    if '' in node:
+        pattern += '?'
+    return pattern
+
+
+def build_word_trie_regex(words, before=r'\b', after=r'\b'):
+    """
+    Compiles words into one case-insensitive regex matching any of them
+    between the `before` and `after` boundary assertions. The alternation is factored into a prefix trie so the regex
+    engine rejects most positions on their first character.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return re.compile(before + _trie_pattern(trie) + after, re.IGNORECASE)
+
+
+class KeywordMatcher:
+    """
+    Finds every direct (non-vicinity) keyword of a keywords.json mapping in a
+    single pass over the page text.
+
+    One combined, case-insensitive regex of the keywords' first words locates
+    candidate positions; each candidate is then confirmed with the
+    keyword's own anchored pattern. The hits are the same as running
+    re.finditer(r'\\b' + re.escape(keyword) + r'\\b', text, re.IGNORECASE)
+    for every keyword separately.
+    """
+
+    def __init__(self, words_to_check):
+        self.keywords = []
+        # Keywords whose first word is not plain ASCII (or that do not start
+        # with a word character) keep the old per-keyword scan, so that
+        # unusual case-folding rules can never hide a hit.
+        self.fallback_patterns = []
+        candidates_by_first_word = defaultdict(list)
+
+        for keyword, properties in words_to_check.items():
+            if properties.get("check_vicinity"):
+                continue
+            self.keywords.append(keyword)
+            leading = LEADING_WORD_REGEX.match(keyword)
+            if leading is None or not leading.group(0).isascii():
+                self.fallback_patterns.append(
+                    (keyword, re.compile(r'\b' + re.escape(keyword) + r'\b', re.IGNORECASE))
+                )
+                continue
+            # The combined scan already guarantees the leading word boundary
+            confirm_pattern = re.compile(re.escape(keyword) + r'\b', re.IGNORECASE)
+            candidates_by_first_word[leading.group(0).lower()].append((keyword, confirm_pattern))
+
+        self.candidates_by_first_word = dict(candidates_by_first_word)
+        if self.candidates_by_first_word:
+            self.combined_regex = build_word_trie_regex(self.candidates_by_first_word)
+        else:
+            self.combined_regex = None
+
+    def find_all(self, text):
+        """
+        Returns {keyword: [(start, end), ...]} for every keyword found in text.
+        Matches of one keyword never overlap each other, just like re.finditer.
+        """
+        hits = defaultdict(list)
+        if self.combined_regex is not None:
+            last_end_by_keyword = {}
+            for candidate in self.combined_regex.finditer(text):
+                start = candidate.start()
+                first_word = candidate.group(0).translate(IGNORECASE_ASCII_FOLD).lower()
+                for keyword, confirm_pattern in self.candidates_by_first_word[first_word]:
+                    if start < last_end_by_keyword.get(keyword, 0):
+                        continue
+                    match = confirm_pattern.match(text, start)
+                    if match:
+                        hits[keyword].append((start, match.end()))
+                        last_end_by_keyword[keyword] = match.end()
+
+        for keyword, pattern in self.fallback_patterns:
+            for match in pattern.finditer(text):
+                hits[keyword].append((match.start(), match.end()))
+        return hits
+
+    def find_first(self, text):
+        """
+        Returns the (keyword, start, end) hit that starts first in text, or
+        None. The combined scan stops at its first confirmed candidate.
+        """
+        first_hit = None
+        if self.combined_regex is not None:
+            for candidate in self.combined_regex.finditer(text):
+                start = candidate.start()
+                first_word = candidate.group(0).translate(IGNORECASE_ASCII_FOLD).lower()
+                for keyword, confirm_pattern in self.candidates_by_first_word[first_word]:
+                    match = confirm_pattern.match(text, start)
+                    if match:
+                        first_hit = (keyword, start, match.end())
+                        break
+                if first_hit is not None:
+                    break
+
+        for keyword, pattern in self.fallback_patterns:
+            match = pattern.search(text)
+            if match and (first_hit is None or match.start() < first_hit[1]):
+                first_hit = (keyword, match.start(), match.end())
+        return first_hit
+
+
+class TokenStream:
+    """
+    The word tokens of one page as parallel array('I') start/end offsets into
+    the page text, instead of one dict per token. Offsets are only computed
+    the first time they are needed, and token text (or its lowercase form) is
+    sliced out of the page on demand.
+    """
+
+    __slots__ = ('text', '_starts', '_ends')
+
+    def __init__(self, text):
+        self.text = text
+        self._starts = None
+        self._ends = None
+
+    def _tokenize(self):
+        starts = array('I')
+        ends = array('I')
+        for match_obj in WORD_TOKENIZER_REGEX.finditer(self.text):
+            start, end = match_obj.span()
+            starts.append(start)
+            ends.append(end)
+        self._starts = starts
+        self._ends = ends
+
+    @property
+    def starts(self):
+        if self._starts is None:
+            self._tokenize()
+        return self._starts
+
+    @property
+    def ends(self):
+        if self._ends is None:
+            self._tokenize()
+        return self._ends
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __bool__(self):
+        if self._starts is None:
+            return WORD_TOKENIZER_REGEX.search(self.text) is not None
+        return len(self._starts) > 0
+
+    def position_at(self, char_index):
+        """Index of the token starting at char_index, or None if no token starts there."""
+        position = bisect_left(self.starts, char_index)
+        if position < len(self.starts) and self.starts[position] == char_index:
+            return position
+        return None
+
+    def token_text(self, position):
+        return self.text[self.starts[position]:self.ends[position]]
+
+    def token_lower(self, position):
+        return self.token_text(position).lower()
+
+
+class VicinityRule:
+    """A check_vicinity entry of keywords.json, with its terms lowercased into a set."""
+
+    def __init__(self, keyword, vicinity_config):
+        self.keyword = keyword
+        self.trigger_lower = keyword.lower()
+        self.terms_lower = frozenset(term.lower() for term in vicinity_config["terms"])
+        self.window = vicinity_config["window"]
+        self.report_as = vicinity_config.get("report_as_concept", keyword)
+
+
+class VicinityMatcher:
+    """
+    Evaluates every check_vicinity rule of a keywords.json mapping against an
+    index of token positions, instead of walking all tokens once per rule.
+
+    A hit is a (trigger_position, proximity_position) pair of token indices:
+    for each occurrence of the trigger, the first proximity term within
+    `window` tokens on either side, exactly like the linear window scan.
+    """
+
+    def __init__(self, words_to_check):
+        self.rules = [
+            VicinityRule(keyword, properties["check_vicinity"])
+            for keyword, properties in words_to_check.items()
+            if properties.get("check_vicinity")
+        ]
+        self.rules_by_keyword = {rule.keyword: rule for rule in self.rules}
+        # Only these lowercased tokens can take part in a vicinity hit
+        self.vocabulary = frozenset(
+            word for rule in self.rules for word in (rule.trigger_lower, *rule.terms_lower)
+        )
+        # Finds whole tokens that may lowercase to a vocabulary word, so the
+        # rest of the page never has to be lowercased
+        if self.vocabulary:
+            self.vocabulary_regex = build_word_trie_regex(self.vocabulary, r"(?<![\w'-])", r"(?![\w'-])")
+        else:
+            self.vocabulary_regex = None
+
+    def index_positions(self, page_tokens):
+        """Maps each vocabulary word to the sorted token positions where it occurs in a TokenStream."""
+        positions_by_word = defaultdict(list)
+        if self.vocabulary_regex is None:
+            return positions_by_word
+        for candidate in self.vocabulary_regex.finditer(page_tokens.text):
+            token_lower = candidate.group(0).lower()
+            if token_lower not in self.vocabulary:
+                continue
+            position = page_tokens.position_at(candidate.start())
+            if position is not None and page_tokens.ends[position] == candidate.end():
+                positions_by_word[token_lower].append(position)
+        return positions_by_word
+
+    def find_all(self, positions_by_word):
+        """Returns {keyword: [(trigger_position, proximity_position), ...]}."""
+        hits = defaultdict(list)
+        for rule in self.rules:
+            trigger_positions = positions_by_word.get(rule.trigger_lower)
+            if not trigger_positions:
+                continue
+            term_positions = [positions_by_word[term] for term in rule.terms_lower if term in positions_by_word]
+            if not term_positions:
+                continue
+            for trigger_position in trigger_positions:
+                closest = _closest_term_position(term_positions, trigger_position, rule.window)
+                if closest is not None:
+                    hits[rule.keyword].append((trigger_position, closest))
+        return hits
+
+    def find_first(self, positions_by_word):
+        """
+        Returns the (keyword, trigger_position, proximity_position) hit whose
+        first token comes first on the page, or None.
+        """
+        first_hit = None
+        for rule in self.rules:
+            trigger_positions = positions_by_word.get(rule.trigger_lower)
+            if not trigger_positions:
+                continue
+            term_positions = [positions_by_word[term] for term in rule.terms_lower if term in positions_by_word]
+            if not term_positions:
+                continue
+            # Later triggers of the same rule cannot start a hit any earlier
+            for trigger_position in trigger_positions:
+                closest = _closest_term_position(term_positions, trigger_position, rule.window)
+                if closest is not None:
+                    if first_hit is None or min(trigger_position, closest) < min(first_hit[1], first_hit[2]):
+                        first_hit = (rule.keyword, trigger_position, closest)
+                    break
+        return first_hit
+
+
+def _closest_term_position(term_positions, trigger_position, window):
+    # The first position of any proximity term within `window` tokens of the trigger, or None
+    scan_start = trigger_position - window
+    scan_end = trigger_position + 1 + window
+    closest = None
+    for positions in term_positions:
+        i = bisect_left(positions, scan_start)
+        if i < len(positions) and positions[i] == trigger_position:
+            i += 1 # Skip the trigger word itself
+        if i < len(positions) and positions[i] < scan_end and (closest is None or positions[i] < closest):
+            closest = positions[i]
+    return closest
+
+
+def _context_phrase(text_content, context_start, context_end):
+    # The page text around a hit, with "..." where it is cut off
+    context_phrase = text_content[context_start:context_end]
+    if context_start > 0: context_phrase = "... " + context_phrase
+    if context_end < len(text_content): context_phrase += " ..."
+    return context_phrase.strip()
+
+
+class DocumentCheck:
+    """
+    The matching stage of a document check, fed one page at a time: runs
+    every keyword and vicinity rule over each page and builds the "status",
+    "fail_summary" and "found_instances" of the file result.
+
+    With compact, result() has "hits" and "contexts" instead of
+    "found_instances": one hit group per word and page, with the distinct
+    matches and the indexes in "contexts" of its context phrases. Context
+    windows that overlap on a page are merged into one phrase, and a phrase
+    is listed once however many groups share it.
+    """
+
+    def __init__(self, rule_set, report_locations=False, compact=False):
+        self.rule_set = rule_set
+        # DOCX chunks are labelled with where they are in the document; each of their hits gets that "location"
+        self.report_locations = report_locations
+        self.compact = compact
+        self.hit_groups = {} # (word, page) -> hit group, for compact results
+        self.contexts = []
+        self.context_indexes = {} # phrase -> index in self.contexts
+        self.keyword_matcher = rule_set.keyword_matcher
+        self.vicinity_matcher = rule_set.vicinity_matcher
+        self.keyword_tracking = defaultdict(lambda: {'count': 0, 'pages': set(), 'fail_if_found': False})
+        for kw, _report_as, fail_if_found in rule_set.report_order: # Initialize all, including trigger words by their name
+            self.keyword_tracking[kw]['fail_if_found'] = fail_if_found
+            # If vicinity config exists, it will also get its fail_if_found from its own entry.
+        self.failed = False
+        self.found_instances = []
+        self.hit_count = 0 # Hits on the pages checked so far
+        self.finished = False # Every page is checked; only a VerdictCheck stops on its own
+
+    def add_page(self, page_label, text_content, page_num, timer=None):
+        """
+        Checks one page and returns the found instances on it (also kept for
+        result()); with compact, the page's own hit groups instead, as
+        {"hits", "contexts"} with indexes into that "contexts". A
+        metrics.StageTimer passed as timer gets the time spent in
+        direct_match, vicinity_match (which includes tokenizing) and report.
+        """
+        page_instances = []
+        # Tokens of the current page's text_content for vicinity checks, kept as offsets
+        page_tokens = TokenStream(text_content)
+
+        if not page_tokens: return self._page_hits(page_instances)
+
+        started = time.perf_counter()
+        direct_hits_on_page = self.keyword_matcher.find_all(text_content)
+        direct_done = time.perf_counter()
+        vicinity_hits_on_page = self.vicinity_matcher.find_all(self.vicinity_matcher.index_positions(page_tokens))
+        vicinity_done = time.perf_counter()
+
+        # Most DOCX chunks (paragraphs, cells) have no hits at all: skip the walk over every rule
+        if not direct_hits_on_page and not vicinity_hits_on_page:
+            if timer is not None:
+                timer.add('direct_match', direct_done - started)
+                timer.add('vicinity_match', vicinity_done - direct_done)
+            return self._page_hits(page_instances)
+
+        # (start, end) in text_content of each hit's context phrase, for compact results
+        context_windows = []
+        for keyword_from_json, report_as, fail_if_found in self.rule_set.report_order:
+            if report_as is not None:
+                # --- Logic for Trigger Keywords with Vicinity Check ---
+                for idx, prox_idx in vicinity_hits_on_page.get(keyword_from_json, ()):
+                    # Trigger word with a proximity term inside its window
+                    trigger_start, trigger_end = page_tokens.starts[idx], page_tokens.ends[idx]
+                    prox_start, prox_end = page_tokens.starts[prox_idx], page_tokens.ends[prox_idx]
+
+                    # Conceptual match found!
+                    keyword_to_report = report_as # Use the concept name for tracking if available
+
+                    # Update tracking using the main trigger keyword_from_json or report_as
+                    # For simplicity in self.keyword_tracking, let's use keyword_from_json
+                    # The fail_summary will then show "breastfeed" (for example)
+                    self.keyword_tracking[keyword_from_json]['count'] += 1
+                    self.keyword_tracking[keyword_from_json]['pages'].add(page_num)
+
+                    if fail_if_found:
+                        self.failed = True
+
+                    # Construct original_match string
+                    # Order them by appearance in text
+                    first_idx, second_idx = (idx, prox_idx) if trigger_start < prox_start else (prox_idx, idx)
+                    original_match_text = f"{page_tokens.token_text(first_idx)} ... {page_tokens.token_text(second_idx)}"
+
+                    # Determine character span of the conceptual match for context
+                    match_span_start_char = min(trigger_start, prox_start)
+                    match_span_end_char = max(trigger_end, prox_end)
+
+                    context_start = max(0, match_span_start_char - CONTEXT_WINDOW_CHARS)
+                    context_end = min(len(text_content), match_span_end_char + CONTEXT_WINDOW_CHARS)
+                    context_windows.append((context_start, context_end))
+
+                    page_instances.append({
+                        "page": page_num,
+                        "word": keyword_to_report, # "breastfeed people/person" or just "breastfeed"
+                        "phrase": _context_phrase(text_content, context_start, context_end),
+                        "original_match": original_match_text
+                    })
+                    if self.report_locations:
+                        page_instances[-1]["location"] = page_label
+            else:
+                # --- Logic for Direct Keyword/Phrase Matching (No Vicinity Check) ---
+                for start_char_index, end_char_index in direct_hits_on_page.get(keyword_from_json, ()):
+                    original_match_text = text_content[start_char_index:end_char_index]
+
+                    self.keyword_tracking[keyword_from_json]['count'] += 1
+                    self.keyword_tracking[keyword_from_json]['pages'].add(page_num)
+
+                    if fail_if_found:
+                        self.failed = True
+
+                    context_start = max(0, start_char_index - CONTEXT_WINDOW_CHARS)
+                    context_end = min(len(text_content), end_char_index + CONTEXT_WINDOW_CHARS)
+                    context_windows.append((context_start, context_end))
+
+                    page_instances.append({
+                        "page": page_num,
+                        "word": keyword_from_json,
+                        "phrase": _context_phrase(text_content, context_start, context_end),
+                        "original_match": original_match_text
+                    })
+                    if self.report_locations:
+                        page_instances[-1]["location"] = page_label
+
+        self.hit_count += len(page_instances)
+        if self.compact:
+            page_hits = self.add_hit_groups(page_label, text_content, page_instances, context_windows)
+        else:
+            self.found_instances.extend(page_instances)
+            page_hits = page_instances
+        if timer is not None:
+            timer.add('direct_match', direct_done - started)
+            timer.add('vicinity_match', vicinity_done - direct_done)
+            timer.add('report', time.perf_counter() - vicinity_done)
+        return page_hits
+
+    def _page_hits(self, page_instances):
+        # What add_page returns for a page without hits
+        return {"hits": [], "contexts": []} if self.compact else page_instances
+
+    def _add_to_hit_group(self, hit_groups, instance, context_index, page_label):
+        hit_group = hit_groups.get((instance["word"], instance["page"]))
+        if hit_group is None:
+            hit_group = {"page": instance["page"], "word": instance["word"], "count": 0, "matches": [], "contexts": []}
+            if self.report_locations:
+                hit_group["locations"] = []
+            hit_groups[(instance["word"], instance["page"])] = hit_group
+        hit_group["count"] += 1
+        if instance["original_match"] not in hit_group["matches"]:
+            hit_group["matches"].append(instance["original_match"])
+        if context_index not in hit_group["contexts"]:
+            hit_group["contexts"].append(context_index)
+        if self.report_locations and page_label not in hit_group["locations"]:
+            hit_group["locations"].append(page_label)
+
+    def add_hit_groups(self, page_label, text_content, page_instances, context_windows):
+        """
+        Merges the overlapping context windows of the page, then adds each hit
+        to its (word, page) group. Returns the page's hits grouped the same
+        way on their own, as {"hits", "contexts"}.
+        """
+        merged_windows = []
+        window_of_hit = [None] * len(context_windows)
+        for hit_index in sorted(range(len(context_windows)), key=context_windows.__getitem__):
+            context_start, context_end = context_windows[hit_index]
+            if merged_windows and context_start <= merged_windows[-1][1]:
+                merged_windows[-1][1] = max(merged_windows[-1][1], context_end)
+            else:
+                merged_windows.append([context_start, context_end])
+            window_of_hit[hit_index] = len(merged_windows) - 1
+
+        # Index of each merged window's phrase in self.contexts, and in the page's own contexts
+        window_contexts = []
+        page_contexts = []
+        for context_start, context_end in merged_windows:
+            context_phrase = _context_phrase(text_content, context_start, context_end)
+            if context_phrase not in self.context_indexes:
+                self.context_indexes[context_phrase] = len(self.contexts)
+                self.contexts.append(context_phrase)
+            if context_phrase not in page_contexts:
+                page_contexts.append(context_phrase)
+            window_contexts.append((self.context_indexes[context_phrase], page_contexts.index(context_phrase)))
+
+        page_hit_groups = {}
+        for instance, window_index in zip(page_instances, window_of_hit):
+            document_context_index, page_context_index = window_contexts[window_index]
+            self._add_to_hit_group(self.hit_groups, instance, document_context_index, page_label)
+            self._add_to_hit_group(page_hit_groups, instance, page_context_index, page_label)
+        return {"hits": list(page_hit_groups.values()), "contexts": page_contexts}
+
+    def result(self):
+        if self.compact:
+            file_check_result = {
+                "status": "pass", "fail_summary": [], "hits": list(self.hit_groups.values()), "contexts": self.contexts
+            }
+        else:
+            file_check_result = {"status": "pass", "fail_summary": [], "found_instances": self.found_instances}
+        if self.failed:
+            file_check_result["status"] = "fail"
+            fail_summary_list = []
+            for kw, data in self.keyword_tracking.items():
+                if data['fail_if_found'] and data['count'] > 0:
+                    fail_summary_list.append({
+                        "keyword": kw, # This will be the main trigger keyword (e.g., "breastfeed")
+                        "count": data['count'],
+                        "pages": sorted(list(data['pages']))
+                    })
+            file_check_result["fail_summary"] = fail_summary_list
+        return file_check_result
+
+
+class VerdictMatcher:
+    """
+    Pass/fail only: finds the first fail_if_found hit on a page and builds no
+    context phrases. Only the fail_if_found rules of keywords.json are compiled.
+    """
+
+    def __init__(self, words_to_check):
+        failing_words = {
+            kw: props for kw, props in words_to_check.items() if props.get('fail_if_found', False)
+        }
+        self.keyword_matcher = KeywordMatcher(failing_words)
+        self.vicinity_matcher = VicinityMatcher(failing_words)
+
+    def first_hit(self, text_content, page_num):
+        """The hit that starts first on the page as {"page", "word", "original_match"}, or None."""
+        direct_hit = self.keyword_matcher.find_first(text_content)
+        vicinity_hit = None
+        if self.vicinity_matcher.rules:
+            page_tokens = TokenStream(text_content)
+            if page_tokens:
+                vicinity_hit = self.vicinity_matcher.find_first(self.vicinity_matcher.index_positions(page_tokens))
+
+        if vicinity_hit is not None:
+            keyword, idx, prox_idx = vicinity_hit
+            first_idx, second_idx = (idx, prox_idx) if idx < prox_idx else (prox_idx, idx)
+            if direct_hit is None or page_tokens.starts[first_idx] < direct_hit[1]:
+                report_as = self.vicinity_matcher.rules_by_keyword[keyword].report_as
+                return {
+                    "page": page_num,
+                    "word": report_as,
+                    "original_match": f"{page_tokens.token_text(first_idx)} ... {page_tokens.token_text(second_idx)}"
+                }
+        if direct_hit is not None:
+            keyword, start_char_index, end_char_index = direct_hit
+            return {"page": page_num, "word": keyword, "original_match": text_content[start_char_index:end_char_index]}
+        return None
+
+
+class VerdictCheck:
+    """
+    The matching stage of a verdict check, fed one page at a time like
+    DocumentCheck: stops (sets `finished`) at the first fail_if_found hit and
+    builds the "status" and "first_hit" of the file result.
+    """
+
+    def __init__(self, rule_set, report_locations=False):
+        self.verdict_matcher = rule_set.verdict_matcher
+        self.report_locations = report_locations
+        self.first_hit = None
+        self.hit_count = 0
+        self.finished = False
+
+    def add_page(self, page_label, text_content, page_num, timer=None):
+        """Returns [first_hit] for the page with the first fail_if_found hit, or []; timed as verdict_match."""
+        started = time.perf_counter()
+        first_hit = self.verdict_matcher.first_hit(text_content, page_num)
+        if timer is not None:
+            timer.add('verdict_match', time.perf_counter() - started)
+        if first_hit is None:
+            return []
+        if self.report_locations:
+            first_hit["location"] = page_label
+        self.first_hit = first_hit
+        self.hit_count = 1
+        self.finished = True
+        return [first_hit]
+
+    def result(self):
+        return {"status": "fail" if self.first_hit is not None else "pass", "first_hit": self.first_hit}
+
+
+class RuleSet:
+    """
+    Everything compiled from one keywords.json mapping: the matchers, the
+    order in which keywords are reported and a content-hash `version`.
+    A RuleSet is never changed after it is built, so a new one can replace
+    it while requests are still using the old one.
+    """
+
+    def __init__(self, words_to_check, source=None):
+        self.words_to_check = words_to_check
+        self.source = source # Path the rules were read from, for reports
+        self.version = keywords_version(words_to_check)
+        self.keyword_matcher = KeywordMatcher(words_to_check)
+        self.vicinity_matcher = VicinityMatcher(words_to_check)
+        self.verdict_matcher = VerdictMatcher(words_to_check)
+        # (keyword, report_as, fail_if_found) in keywords.json order; report_as is None for direct keywords
+        self.report_order = []
+        for keyword, properties in words_to_check.items():
+            vicinity_config = properties.get("check_vicinity")
+            report_as = vicinity_config.get("report_as_concept", keyword) if vicinity_config else None
+            self.report_order.append((keyword, report_as, properties.get("fail_if_found", False)))
+
+
+def check_page_texts(page_texts_to_process, rule_set, report_locations=False):
+    """
+    Runs DocumentCheck over (page_label, page_text, page_number) tuples and
+    returns the "status", "fail_summary" and "found_instances" of the file result.
+    """
+    document_check = DocumentCheck(rule_set, report_locations)
+    for page_label, text_content, page_num in page_texts_to_process:
+        document_check.add_page(page_label, text_content, page_num)
+    return document_check.result()
@@ -0,0 +1,164 @@
+# backend/pdf_reader/metrics.py
+# Per-stage timers for document checks, and the per-process histograms and
+# counters served in Prometheus' text format at /metrics. Each web worker
+# keeps its own numbers; Prometheus adds them up across the scraped workers.
+import threading
+import time
+from contextlib import contextmanager
+
+from .result_cache import get_result_cache
+
+# Upper bounds, in seconds, of the duration histogram buckets
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Upper bounds of the pages/sec histogram buckets
+THROUGHPUT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class StageTimer:
+    """Wall-clock seconds spent in each named stage of a file check or request, in the order the stages first ran."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    def add(self, stage, seconds):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def merge(self, other):
+        for stage, seconds in other.seconds.items():
+            self.add(stage, seconds)
+
+    def as_milliseconds(self):
+        """The "timings" of a file result: {"<stage>_ms": milliseconds}."""
+        return {f"{stage}_ms": round(seconds * 1000, 3) for stage, seconds in self.seconds.items()}
+
+    def server_timing(self):
+        """The value of a Server-Timing header listing every stage."""
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.seconds.items())
+
+
+def _label_text(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + '}'
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    """A Prometheus counter, optionally split by labels."""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """A Prometheus histogram with fixed buckets, optionally split by labels."""
+
+    def __init__(self, name, help_text, label_names=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {} # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for upper_bound, bucket_count in zip(self.buckets, series):
+                    labels = _label_text(self.label_names, key, [('le', f"{upper_bound:g}")])
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_label_text(self.label_names, key, [('le', '+Inf')])} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.label_names, key)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_label_text(self.label_names, key)} {series[-1]:.6f}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    'pdf_check_stage_seconds', "Time spent in one stage of checking one file.", ('stage',)
+)
+FILE_SECONDS = Histogram(
+    'pdf_check_file_seconds', "Time to check one file, all stages together.", ('file_kind', 'mode')
+)
+FILE_PAGES_PER_SECOND = Histogram(
+    'pdf_check_file_pages_per_second', "Pages checked per second, per file that was extracted.",
+    ('file_kind',), buckets=THROUGHPUT_BUCKETS,
+)
+FILES_CHECKED = Counter('pdf_check_files_total', "Files checked, by result status.", ('status',))
+PAGES_CHECKED = Counter('pdf_check_pages_total', "Non-empty pages checked.", ('file_kind',))
+REQUEST_SECONDS = Histogram(
+    'pdf_check_request_seconds', "Time to answer one /check-document/ request, without streaming.", ('mode',)
+)
+
+METRICS = (STAGE_SECONDS, FILE_SECONDS, FILE_PAGES_PER_SECOND, FILES_CHECKED, PAGES_CHECKED, REQUEST_SECONDS)
+
+
+def record_file_check(timer, file_kind, check_mode, status, pages_checked):
+    """Adds one checked file's stage times, duration and page count to the metrics."""
+    for stage, seconds in timer.seconds.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    total_seconds = sum(timer.seconds.values())
+    FILE_SECONDS.observe(total_seconds, file_kind=file_kind or 'unknown', mode=check_mode)
+    FILES_CHECKED.inc(status=status)
+    if pages_checked:
+        PAGES_CHECKED.inc(pages_checked, file_kind=file_kind)
+        if total_seconds > 0:
+            FILE_PAGES_PER_SECOND.observe(pages_checked / total_seconds, file_kind=file_kind)
+
+
+def render_metrics():
+    """Every metric of this process, plus the result cache counters, in Prometheus' text format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    result_cache = get_result_cache()
+    if result_cache is not None:
+        cache_stats = result_cache.stats()
+        for outcome in ('hits', 'misses'):
+            name = f"pdf_result_cache_{outcome}_total"
+            lines.extend([
+                f"# HELP {name} Result cache {outcome} since the cache was created.",
+                f"# TYPE {name} counter",
+                f"{name} {cache_stats[outcome]}",
+            ])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-16 22:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('file_kind', models.CharField(max_length=10)),
+                ('extractor_mode', models.CharField(max_length=20)),
+                ('filename', models.CharField(max_length=255)),
+                ('compressed_page_texts', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('content_hash', 'file_kind', 'extractor_mode'), name='unique_extracted_document')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-16 22:38
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_reader', '0001_extracted_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('extractor_mode', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CheckJobFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('filename', models.CharField(max_length=255)),
+                ('spool_path', models.CharField(max_length=1024)),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done')], default='pending', max_length=10)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='pdf_reader.checkjob')),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-16 22:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_reader', '0002_check_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkjob',
+            name='check_mode',
+            field=models.CharField(default='full', max_length=10),
+        ),
+    ]
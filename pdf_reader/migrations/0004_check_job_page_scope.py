@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-16 23:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_reader', '0003_check_job_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkjob',
+            name='max_hits',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkjob',
+            name='page_selection',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+    ]
@@ -1,3 +1,62 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class ExtractedDocument(models.Model):
+    """
+    Page text extracted from an uploaded document, kept so that a change to
+    keywords.json only needs the matching stage to run again.
+    """
+    content_hash = models.CharField(max_length=64) # SHA-256 of the uploaded bytes
+    file_kind = models.CharField(max_length=10) # '.pdf' or '.docx'
+    extractor_mode = models.CharField(max_length=20) # PDF_EXTRACTORS mode, or extraction.DOCX_READER_MODE
+    filename = models.CharField(max_length=255) # Name of the latest upload, for reports
+    # zlib-compressed JSON list of the non-empty pages as [page_label, page_text, page_number]
+    compressed_page_texts = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['content_hash', 'file_kind', 'extractor_mode'], name='unique_extracted_document'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.extractor_mode or self.file_kind})"
+
+
+class CheckJob(models.Model):
+    """A batch of files submitted to /api/v1/jobs/ and checked in the background."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    extractor_mode = models.CharField(max_length=20)
+    check_mode = models.CharField(max_length=10, default='full') # checking.CHECK_MODES
+    page_selection = models.CharField(max_length=200, blank=True, default='') # 'pages' field, '' for every page
+    max_hits = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Check job {self.id}"
+
+
+class CheckJobFile(models.Model):
+    """One file of a CheckJob, with its result once it has been checked."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    STATE_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done')]
+
+    job = models.ForeignKey(CheckJob, related_name='files', on_delete=models.CASCADE)
+    position = models.PositiveIntegerField() # Order of the file in the submission
+    filename = models.CharField(max_length=255)
+    spool_path = models.CharField(max_length=1024) # Copy of the upload until it has been checked
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=PENDING)
+    result = models.JSONField(null=True, blank=True) # Same shape as one /check-document/ result
+
+    class Meta:
+        ordering = ['position']
+
+    def __str__(self):
+        return f"{self.filename} ({self.state})"
@@ -0,0 +1,70 @@
+# backend/pdf_reader/page_store.py
+import json
+import zlib
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .extraction import DOCX_READER_MODE
+from .models import ExtractedDocument
+
+
+def page_store_mode(file_kind, extractor_mode):
+    # DOCX text does not depend on the PDF extractor
+    return extractor_mode if file_kind == '.pdf' else DOCX_READER_MODE
+
+
+def encode_page_texts(page_texts_to_process):
+    return zlib.compress(json.dumps(page_texts_to_process).encode())
+
+
+def decode_page_texts(compressed_page_texts):
+    return [tuple(page) for page in json.loads(zlib.decompress(compressed_page_texts))]
+
+
+def load_page_texts(content_hash, file_kind, extractor_mode):
+    """Stored (page_label, page_text, page_number) tuples for a document, or None if it was never extracted."""
+    if not settings.PAGE_TEXT_STORE_ENABLED:
+        return None
+    try:
+        document = ExtractedDocument.objects.only('compressed_page_texts').get(
+            content_hash=content_hash, file_kind=file_kind,
+            extractor_mode=page_store_mode(file_kind, extractor_mode),
+        )
+    except ExtractedDocument.DoesNotExist:
+        return None
+    except DatabaseError as db_err:
+        print(f"WARNING: page text store unavailable: {db_err}")
+        return None
+    return decode_page_texts(document.compressed_page_texts)
+
+
+def save_page_texts(content_hash, file_kind, extractor_mode, filename, page_texts_to_process):
+    if not settings.PAGE_TEXT_STORE_ENABLED:
+        return
+    try:
+        ExtractedDocument.objects.update_or_create(
+            content_hash=content_hash, file_kind=file_kind,
+            extractor_mode=page_store_mode(file_kind, extractor_mode),
+            # A re-upload counts as new, so the documents still being sent are the last to be pruned
+            defaults={
+                'filename': filename, 'compressed_page_texts': encode_page_texts(page_texts_to_process),
+                'created_at': timezone.now(),
+            },
+        )
+        prune_page_texts(settings.PAGE_TEXT_STORE_MAX_DOCUMENTS)
+    except DatabaseError as db_err:
+        print(f"WARNING: could not store page text for {filename}: {db_err}")
+
+
+def prune_page_texts(max_documents):
+    """Deletes all but the max_documents most recently stored documents (no limit if max_documents is 0)."""
+    if not max_documents:
+        return 0
+    stale_ids = list(
+        ExtractedDocument.objects.order_by('-created_at', '-id').values_list('id', flat=True)[max_documents:]
+    )
+    if stale_ids:
+        ExtractedDocument.objects.filter(id__in=stale_ids).delete()
+    return len(stale_ids)
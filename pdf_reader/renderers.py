@@ -0,0 +1,38 @@
+# backend/pdf_reader/renderers.py
+import json
+
+import msgpack
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Lets clients ask for newline-delimited JSON (Accept: application/x-ndjson or
+    ?format=ndjson). Streaming views write their own lines; this only renders
+    ordinary responses, such as validation errors, as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data) + "\n").encode(self.charset)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Check results as MessagePack (Accept: application/msgpack or
+    ?format=msgpack): the same data as the JSON response, smaller and faster
+    to encode and decode.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data)
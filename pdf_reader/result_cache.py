@@ -0,0 +1,206 @@
+# backend/pdf_reader/result_cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+def file_content_hash(uploaded_file):
+    """SHA-256 of an uploaded file's bytes, read chunk by chunk."""
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def result_cache_key(content_hash, keywords_version, file_kind, extractor_mode, check_mode='full', page_scope=''):
+    # Anything that can change the result for the same bytes is part of the key
+    prefix = 'check-document' if check_mode == 'full' else f'check-document-{check_mode}'
+    key = f"{prefix}:{keywords_version}:{file_kind}:{extractor_mode}:{content_hash}"
+    # Checks of only some pages (or up to some number of hits) are cached apart from whole-document ones
+    return f"{key}:{page_scope}" if page_scope else key
+
+
+class InMemoryResultCacheBackend:
+    """Per-process LRU cache, bounded by entry count and total encoded size."""
+
+    def __init__(self, max_entries, max_bytes, **options):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= len(previous)
+            self._entries[key] = payload
+            self._total_bytes += len(payload)
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                _evicted_key, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+
+class FileResultCacheBackend:
+    """
+    One file per entry in a directory shared by all workers on the host.
+    Reads refresh the file's mtime, and eviction removes the oldest files.
+    """
+
+    def __init__(self, max_entries, max_bytes, location, **options):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.location = Path(location)
+        self.location.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.location / (hashlib.sha256(key.encode()).hexdigest() + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            payload = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return payload
+
+    def set(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+        path = self._path(key)
+        temp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        temp_path.write_bytes(payload)
+        os.replace(temp_path, path)
+        self._evict(keep=path)
+
+    def _evict(self, keep):
+        entries = []
+        for path in self.location.glob('*.json'):
+            if path == keep:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total_bytes = keep.stat().st_size + sum(size for _mtime, size, _path in entries)
+        while entries and (len(entries) + 1 > self.max_entries or total_bytes > self.max_bytes):
+            _mtime, size, path = entries.pop(0)
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+
+class DjangoResultCacheBackend:
+    """Stores entries in one of settings.CACHES; eviction is left to that cache's own limits."""
+
+    def __init__(self, cache_alias='default', timeout=None, **options):
+        from django.core.cache import caches
+        self.cache = caches[cache_alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, payload):
+        self.cache.set(key, payload, self.timeout)
+
+
+RESULT_CACHE_BACKENDS = {
+    'memory': InMemoryResultCacheBackend,
+    'file': FileResultCacheBackend,
+    'django': DjangoResultCacheBackend,
+}
+
+
+class ResultCache:
+    """
+    Stores per-file check results as JSON and counts hits and misses. A
+    backend that fails (a full or unwritable LOCATION, an unreachable cache
+    server) never fails a check: its errors are logged, a failed read counts
+    as a miss and a failed write is skipped.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        try:
+            payload = self.backend.get(key)
+            file_result = json.loads(payload) if payload is not None else None
+        except Exception as cache_err:
+            print(f"WARNING: result cache unavailable, checking the file again: {cache_err}")
+            file_result = None
+        with self._lock:
+            if file_result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return file_result
+
+    def set(self, key, file_result):
+        try:
+            self.backend.set(key, json.dumps(file_result).encode())
+        except Exception as cache_err:
+            print(f"WARNING: could not store the result of {file_result.get('filename')} in the result cache: {cache_err}")
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """The ResultCache configured by settings.RESULT_CACHE, or None when caching is off."""
+    global _result_cache
+    config = settings.RESULT_CACHE
+    if not config.get('BACKEND'):
+        return None
+    with _result_cache_lock:
+        if _result_cache is None:
+            backend_class = RESULT_CACHE_BACKENDS[config['BACKEND']]
+            _result_cache = ResultCache(backend_class(
+                max_entries=config.get('MAX_ENTRIES', 1000),
+                max_bytes=config.get('MAX_BYTES', 64 * 1024 * 1024),
+                location=config.get('LOCATION'),
+                cache_alias=config.get('CACHE_ALIAS', 'default'),
+                timeout=config.get('TIMEOUT'),
+            ))
+        return _result_cache
+
+
+@receiver(setting_changed)
+def _reset_result_cache(setting, **kwargs):
+    global _result_cache
+    if setting == 'RESULT_CACHE':
+        with _result_cache_lock:
+            _result_cache = None
@@ -1,5 +1,7 @@
 # backend/pdf_reader/serializers.py
 from rest_framework import serializers
+from .checking import CHECK_MODES
+from .extraction import PDF_EXTRACTORS, PageSelection
 
 class FileUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
@@ -10,4 +12,27 @@ class MultiFileUploadSerializer(serializers.Serializer):
         child=serializers.FileField(allow_empty_file=False, use_url=False),
         allow_empty=False,
         max_length=25  # Optional: Limit the number of files per request
-    )
\ No newline at end of file
+    )
+    # Optional: PDF text extractor for this request, defaults to settings.PDF_EXTRACTION_MODE
+    extractor = serializers.ChoiceField(choices=sorted(PDF_EXTRACTORS), required=False)
+    # Optional: 'verdict' only reports pass/fail and the first fail_if_found hit, defaults to 'full'
+    mode = serializers.ChoiceField(choices=CHECK_MODES, required=False)
+    # Optional: adds per-stage "timings" (milliseconds) to every file result
+    timings = serializers.BooleanField(required=False, default=False)
+    # Optional: only check these pages of each PDF or DOCX, e.g. "1-20,last-5" (see extraction.PageSelection)
+    pages = serializers.CharField(required=False, max_length=200)
+    # Optional: stop checking a file after the page where its hits reach this number
+    max_hits = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        if attrs.get('mode') == 'verdict' and attrs.get('max_hits') is not None:
+            raise serializers.ValidationError(
+                {"max_hits": ["Not available with mode 'verdict', which already stops at the first failing hit."]}
+            )
+        return attrs
+
+    def validate_pages(self, value):
+        try:
+            return PageSelection(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
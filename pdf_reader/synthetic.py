@@ -0,0 +1,125 @@
+# backend/pdf_reader/synthetic.py
+# Generates small, valid documents from plain text for tests and benchmarks,
+# without needing a PDF library that can write files.
+import io
+
+from docx import Document
+
+STANDARD_FONTS = ('Helvetica', 'Times-Roman', 'Courier')
+
+
+def _pdf_string(text):
+    # Literal string for a content stream; the standard fonts use WinAnsi/Latin-1
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return '(' + escaped + ')'
+
+
+def build_pdf(pages, font='Helvetica', font_size=10):
+    """
+    Returns the bytes of a PDF with one page per entry of `pages`, each entry
+    being the list of text lines on that page (top to bottom).
+    """
+    objects = []
+
+    def add_object(body):
+        objects.append(body)
+        return len(objects)
+
+    font_id = add_object(f"<< /Type /Font /Subtype /Type1 /BaseFont /{font} /Encoding /WinAnsiEncoding >>".encode())
+    pages_id = add_object(None) # Filled in once the page ids are known
+    page_ids = []
+    for lines in pages:
+        operators = [f"BT /F1 {font_size} Tf {font_size + 2} TL 40 800 Td"]
+        for line in lines:
+            operators.append(f"{_pdf_string(line)} Tj T*")
+        operators.append("ET")
+        stream = "\n".join(operators).encode('latin-1')
+        contents_id = add_object(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add_object(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 612 842] /CropBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {contents_id} 0 R >>".encode()
+        ))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+    catalog_id = add_object(f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode())
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for object_id, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % object_id + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_offset)
+    return bytes(output)
+
+
+def build_docx(pages):
+    """Returns the bytes of a DOCX with one paragraph per text line and a page break between pages."""
+    document = Document()
+    for page_index, lines in enumerate(pages):
+        if page_index:
+            document.add_page_break()
+        for line in lines:
+            document.add_paragraph(line)
+    docx_buffer = io.BytesIO()
+    document.save(docx_buffer)
+    return docx_buffer.getvalue()
+
+
+# Words that never match a rule, for filling synthetic pages
+FILLER_WORDS = tuple(f"filler{n}" for n in range(2000)) + (
+    "the", "report", "office", "revenue", "quarter", "people", "person", "with", "of", "and", "to", "in",
+)
+
+
+def synthetic_keywords(direct_rules, vicinity_rules, rng):
+    """
+    A keywords.json mapping with `direct_rules` direct keywords (a third of
+    them two-word phrases) and `vicinity_rules` check_vicinity rules. About
+    half of the rules have fail_if_found set.
+    """
+    words_to_check = {}
+    for n in range(direct_rules):
+        keyword = f"keyword{n} phrase{n}" if n % 3 == 0 else f"keyword{n}"
+        words_to_check[keyword] = {"fail_if_found": rng.random() < 0.5}
+    for n in range(vicinity_rules):
+        words_to_check[f"trigger{n}"] = {
+            "fail_if_found": rng.random() < 0.5,
+            "check_vicinity": {
+                "terms": [f"term{n}a", f"term{n}b", "people"],
+                "window": rng.randint(2, 8),
+                "report_as_concept": f"trigger{n} concept",
+            },
+        }
+    return words_to_check
+
+
+def synthetic_pages(page_count, words_to_check, keyword_density, rng, lines_per_page=50, words_per_line=12):
+    """
+    Pages of text lines for build_pdf/build_docx. Each word slot is, with
+    probability keyword_density, a hit for a random rule of words_to_check
+    (a direct keyword, or a vicinity trigger next to one of its terms);
+    otherwise a filler word.
+    """
+    rules = list(words_to_check.items())
+    pages = []
+    for _ in range(page_count):
+        lines = []
+        for _ in range(lines_per_page):
+            words = []
+            for _ in range(words_per_line):
+                if rules and rng.random() < keyword_density:
+                    keyword, properties = rng.choice(rules)
+                    vicinity_config = properties.get("check_vicinity")
+                    if vicinity_config:
+                        words.append(f"{keyword} {rng.choice(vicinity_config['terms'])}")
+                    else:
+                        words.append(keyword)
+                else:
+                    words.append(rng.choice(FILLER_WORDS))
+            lines.append(" ".join(words))
+        pages.append(lines)
+    return pages
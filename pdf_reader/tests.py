@@ -1,3 +1,1337 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+import pdfplumber
+import pypdfium2 as pdfium
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from docx import Document
+from docx.enum.section import WD_SECTION
+
+from . import checking, extraction, page_store, views
+from .docx_text import iter_docx_chunks
+from .extraction import PageSelection
+from .management.commands import scan_documents
+from .management.commands.benchmark_vicinity import linear_vicinity_scan
+from .matching import KeywordMatcher, TokenStream, VicinityMatcher, WORD_TOKENIZER_REGEX
+from .models import CheckJobFile, ExtractedDocument
+from .result_cache import FileResultCacheBackend, InMemoryResultCacheBackend, get_result_cache
+from .synthetic import STANDARD_FONTS, build_pdf
+from .uploads import BoundedMemoryUploadHandler
+from .views import CheckDocumentView
+
+CHECK_DOCUMENT_URL = '/api/v1/check-document/'
+ASYNC_CHECK_DOCUMENT_URL = '/api/v1/check-document/async/'
+
+# Fixture corpus for the extractor parity tests: name -> pages of text lines
+PDF_FIXTURES = {
+    'clean.pdf': [
+        ["Quarterly report for the regional office.", "Revenue grew in every segment."],
+        ["No findings to report on this page."],
+    ],
+    'direct_keywords.pdf': [
+        ["Our advocacy team met with the board.", "Programs for vaccines and contraception."],
+        ["Reducing barriers is a priority (see the anti-racism plan).", "ADVOCATES and Advocacy groups."],
+        ["Mid-page, at risk groups were biased toward the center."],
+    ],
+    'vicinity_rules.pdf': [
+        ["Support for people who breastfeed at work.", "A person may chestfeed in private rooms."],
+        ["The uterus is an organ.", "Breastfeed ... then people", "people with a uterus"],
+    ],
+    'many_pages.pdf': [
+        [f"Page {n} line {line}: all-inclusive allyship and bias training." for line in range(30)]
+        for n in range(12)
+    ],
+    'blank_page_between.pdf': [
+        ["Contraception first."],
+        [],
+        ["Vaccines last."],
+    ],
+}
+
+
+_scan_document = scan_documents.scan_document
+
+
+def _scan_or_crash(name, source, *task_options):
+    # Stands in for scan_document in scan_documents' pool: the process that gets crash.pdf dies
+    if os.path.basename(name) == 'crash.pdf':
+        os._exit(1)
+    return _scan_document(name, source, *task_options)
+
+
+def _hits(file_result):
+    return [(hit['page'], hit['word'], hit['original_match']) for hit in file_result['found_instances']]
+
+
+class DocumentCheckTestMixin:
+    """
+    For tests that post documents to the check endpoints. Every test runs
+    with check_settings: by default without the result cache and the page
+    text store, so that each request checks its files from scratch.
+    """
+    check_settings = {'RESULT_CACHE': {'BACKEND': ''}, 'PAGE_TEXT_STORE_ENABLED': False}
+    # Form fields of every check_document() request, unless it overrides them
+    default_fields = {'extractor': 'fast'}
+
+    def setUp(self):
+        super().setUp()
+        check_settings = override_settings(**self.check_settings)
+        check_settings.enable()
+        self.addCleanup(check_settings.disable)
+
+    def fixture_files(self, names=None, font='Helvetica'):
+        """Uploads of the PDF_FIXTURES called names (default: all of them)."""
+        return [
+            SimpleUploadedFile(name, build_pdf(PDF_FIXTURES[name], font=font), content_type='application/pdf')
+            for name in (names or PDF_FIXTURES)
+        ]
+
+    def post_documents(self, files=None, url=CHECK_DOCUMENT_URL, **fields):
+        """Posts files (default: every fixture) and returns the response, which must be a 200."""
+        files = self.fixture_files() if files is None else files
+        response = self.client.post(url, {'files': files, **self.default_fields, **fields})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def check_document(self, files=None, **fields):
+        return self.post_documents(files, **fields).json()
+
+
+class ExtractorParityTests(DocumentCheckTestMixin, SimpleTestCase):
+    """The 'fast' (pdfium) and 'layout' (pdfplumber) extractors must report the same keyword hits."""
+    # Every request names its extractor, or leaves it to PDF_EXTRACTION_MODE
+    default_fields = {}
+
+    def assert_same_hits(self, layout_results, fast_results):
+        self.assertEqual(len(layout_results), len(fast_results))
+        for layout_result, fast_result in zip(layout_results, fast_results):
+            with self.subTest(filename=layout_result['filename']):
+                self.assertEqual(layout_result['status'], fast_result['status'])
+                self.assertEqual(layout_result['fail_summary'], fast_result['fail_summary'])
+                self.assertEqual(_hits(layout_result), _hits(fast_result))
+
+    def test_fixture_corpus_same_hits_in_both_modes(self):
+        for font in STANDARD_FONTS:
+            with self.subTest(font=font):
+                layout_results = self.check_document(self.fixture_files(font=font), extractor='layout')
+                fast_results = self.check_document(self.fixture_files(font=font), extractor='fast')
+                self.assert_same_hits(layout_results, fast_results)
+
+    def test_fixture_corpus_finds_keywords(self):
+        results = {r['filename']: r for r in self.check_document(self.fixture_files(), extractor='fast')}
+        self.assertEqual(results['clean.pdf']['status'], 'pass')
+        self.assertEqual(results['direct_keywords.pdf']['status'], 'fail')
+        self.assertIn((3, 'at risk', 'at risk'), _hits(results['direct_keywords.pdf']))
+        self.assertIn(
+            (1, 'breastfeed people/person', 'people ... breastfeed'), _hits(results['vicinity_rules.pdf'])
+        )
+        self.assertEqual(
+            [hit[0] for hit in _hits(results['blank_page_between.pdf'])], [1, 3]
+        )
+
+    @override_settings(PDF_EXTRACTION_MODE='fast')
+    def test_mode_defaults_to_settings(self):
+        fast_results = self.check_document(self.fixture_files(font='Courier'))
+        layout_results = self.check_document(self.fixture_files(font='Courier'), extractor='layout')
+        self.assert_same_hits(layout_results, fast_results)
+
+    @override_settings(PDF_EXTRACTION_WORKERS=2, PDF_EXTRACTION_BATCH_PAGES=5, PDF_EXTRACTION_PARALLEL_MIN_PAGES=2)
+    def test_process_pool_keeps_page_order(self):
+        pooled_results = self.check_document(self.fixture_files(), extractor='fast')
+        with self.settings(PDF_EXTRACTION_WORKERS=1):
+            in_process_results = self.check_document(self.fixture_files(), extractor='fast')
+        self.assertEqual(pooled_results, in_process_results)
+
+    @override_settings(PDF_EXTRACTION_WORKERS=2, PDF_EXTRACTION_BATCH_PAGES=5, PDF_EXTRACTION_PARALLEL_MIN_PAGES=2)
+    def test_pool_whose_processes_died_is_replaced(self):
+        expected = self.check_document(self.fixture_files(), extractor='fast')
+        dead_executor = extraction.get_extraction_executor()
+        # Like an OOM kill of the idle pool processes
+        for process in list(dead_executor._processes.values()):
+            process.kill()
+            process.join()
+        self.assertEqual(self.check_document(self.fixture_files(), extractor='fast'), expected)
+        self.assertIsNot(extraction.get_extraction_executor(), dead_executor)
+        self.assertEqual(self.check_document(self.fixture_files(), extractor='fast'), expected)
+
+    def test_unknown_extractor_is_rejected(self):
+        response = self.client.post(CHECK_DOCUMENT_URL, {'files': self.fixture_files(), 'extractor': 'ocr'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('extractor', response.json())
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    """KeywordMatcher must find exactly what a per-keyword re.finditer scan finds."""
+
+    KEYWORDS = [
+        "equity", "health equity", "Health Equity Initiative", "anti-racism", "anti", "women's health",
+        "at-risk", "at risk", "it", "its", "kin", "sex", "sexual health", "stem", "STEM fields",
+        "\u00e9quit\u00e9", "-based care", "i.e. gender",
+    ]
+    # Words around the keywords, including the characters that re.IGNORECASE folds to ASCII letters
+    WORDS = [
+        "equity", "Equity", "EQUITY", "health", "Health", "initiative", "anti", "Anti-Racism", "racism", "women's",
+        "Women", "s", "at", "risk", "At-Risk", "-", "it", "It", "ITs", "\u0130t", "\u0131t", "\u0130TS", "kin", "\u212aIN",
+        "\u212ain's", "sex", "\u017fex", "SE\u017f", "\u017fexual", "sexual", "stem", "STEM", "fields", "\u00e9quit\u00e9",
+        "\u00c9QUIT\u00c9", "based", "care", "i.e.", "gender", "kinship", "items", "equitable", "'", ",", ".", "(", ")", "\n",
+    ]
+
+    def reference_hits(self, text):
+        hits = {}
+        for keyword in self.KEYWORDS:
+            for match in re.finditer(r'\b' + re.escape(keyword) + r'\b', text, re.IGNORECASE):
+                hits.setdefault(keyword, []).append((match.start(), match.end()))
+        return hits
+
+    def test_find_all_matches_per_keyword_regex(self):
+        rng = random.Random(0)
+        words_to_check = {keyword: {"fail_if_found": True} for keyword in self.KEYWORDS}
+        # Vicinity rules are not direct keywords and must not be matched here
+        words_to_check["breastfeed"] = {"check_vicinity": {"terms": ["people"], "window": 3}}
+        matcher = KeywordMatcher(words_to_check)
+        texts = [
+            "Health equity, health Equity Initiative and equity.", "\u0130t's \u0131t ITS \u212ain \u017fex", "anti-anti-racism",
+            "women's health, Women's Health", "at-risk at risk At Risk", "STEM fields stem", "i.e. gender", "",
+        ]
+        for _text in range(500):
+            separator = rng.choice([" ", "", "  ", "-"])
+            texts.append(separator.join(rng.choice(self.WORDS) for _word in range(rng.randint(1, 40))))
+        for text in texts:
+            with self.subTest(text=text):
+                expected = self.reference_hits(text)
+                self.assertEqual(dict(matcher.find_all(text)), expected)
+                first_hit = matcher.find_first(text)
+                if not expected:
+                    self.assertIsNone(first_hit)
+                    continue
+                keyword, start, end = first_hit
+                self.assertIn((start, end), expected[keyword])
+                self.assertEqual(start, min(hit_start for hits in expected.values() for hit_start, _end in hits))
+
+    def test_keywords_are_compiled_once_per_rule_set(self):
+        # Every check reuses the matcher the RuleSet compiled from keywords.json
+        rule_set = checking.get_rule_set()
+        with mock.patch('pdf_reader.matching.KeywordMatcher') as keyword_matcher:
+            for name, pages in PDF_FIXTURES.items():
+                upload = SimpleUploadedFile(name, build_pdf(pages))
+                file_result = checking.check_document_file(upload, 'fast', None, page_store=False)
+                self.assertEqual(file_result['rules_version'], rule_set.version)
+                self.assertNotEqual(file_result['status'], 'error')
+        keyword_matcher.assert_not_called()
+        self.assertIs(checking.get_rule_set(), rule_set)
+
+
+class TokenStreamTests(SimpleTestCase):
+    """TokenStream must hold exactly the tokens and offsets of WORD_TOKENIZER_REGEX.finditer."""
+
+    TEXTS = [
+        "", "   ", "... --- ...", "Health equity", "women's health, at-risk groups (anti-racism).",
+        "\u00c9quit\u00e9 \u0130TS \u212aIN \ufb01nance_2024", "trailing word", "line one\nline two\ttab",
+        # Offsets past 65535 still fit the array('I')
+        "filler " * 10000 + "breastfeed people",
+    ]
+
+    def test_offsets_and_tokens_round_trip(self):
+        for text in self.TEXTS:
+            with self.subTest(text=text[:40]):
+                tokens = TokenStream(text)
+                matches = list(WORD_TOKENIZER_REGEX.finditer(text))
+                self.assertEqual(bool(tokens), bool(matches))
+                self.assertEqual(len(tokens), len(matches))
+                self.assertEqual(list(tokens.starts), [match.start() for match in matches])
+                self.assertEqual(list(tokens.ends), [match.end() for match in matches])
+                for position, match in enumerate(matches):
+                    self.assertEqual(tokens.token_text(position), match.group(0))
+                    self.assertEqual(tokens.token_lower(position), match.group(0).lower())
+                    self.assertEqual(text[tokens.starts[position]:tokens.ends[position]], match.group(0))
+
+    def test_position_at(self):
+        for text in self.TEXTS:
+            with self.subTest(text=text[:40]):
+                tokens = TokenStream(text)
+                token_starts = {
+                    match.start(): position for position, match in enumerate(WORD_TOKENIZER_REGEX.finditer(text))
+                }
+                for char_index in range(len(text) + 2):
+                    self.assertEqual(tokens.position_at(char_index), token_starts.get(char_index))
+
+    def test_truth_value_does_not_tokenize(self):
+        self.assertFalse(TokenStream("... , ;"))
+        tokens = TokenStream("Quarterly report")
+        self.assertTrue(tokens)
+        self.assertIsNone(tokens._starts)
+        self.assertEqual(len(tokens), 2)
+        self.assertIsNotNone(tokens._starts)
+
+
+class VicinityMatcherTests(SimpleTestCase):
+    """VicinityMatcher must return exactly the hits of the linear per-rule window scan."""
+
+    WORDS_TO_CHECK = {
+        "breastfeed": {"fail_if_found": True, "check_vicinity": {"terms": ["people", "person"], "window": 3}},
+        # A trigger that is also one of its own proximity terms
+        "pregnant": {"fail_if_found": True, "check_vicinity": {"terms": ["pregnant", "people"], "window": 2}},
+        # Overlapping rules: shared terms, and a trigger that is another rule's term
+        "people": {"fail_if_found": True, "check_vicinity": {"terms": ["birthing", "pregnant"], "window": 1}},
+        "birthing": {"fail_if_found": True, "check_vicinity": {"terms": ["people", "person"], "window": 4}},
+        "chest-feed": {"fail_if_found": True, "check_vicinity": {"terms": ["parent's", "people"], "window": 2}},
+        "equity": {"fail_if_found": True},
+    }
+    WORDS = [
+        "breastfeed", "Breastfeed", "people", "People", "person", "pregnant", "PREGNANT", "birthing", "chest-feed",
+        "Chest-Feed", "chest", "feed", "parent's", "parent", "equity", "filler", "other", "words",
+    ]
+
+    def assert_same_hits(self, matcher, text):
+        page_word_objects = [
+            {'text': m.group(0), 'lower': m.group(0).lower(), 'start': m.start(), 'end': m.end()}
+            for m in WORD_TOKENIZER_REGEX.finditer(text)
+        ]
+        expected = linear_vicinity_scan(self.WORDS_TO_CHECK, page_word_objects)
+        positions_by_word = matcher.index_positions(TokenStream(text))
+        self.assertEqual(dict(matcher.find_all(positions_by_word)), expected)
+        first_hit = matcher.find_first(positions_by_word)
+        if not expected:
+            self.assertIsNone(first_hit)
+            return
+        keyword, trigger_position, proximity_position = first_hit
+        self.assertIn((trigger_position, proximity_position), expected[keyword])
+        self.assertEqual(
+            min(trigger_position, proximity_position),
+            min(min(hit) for hits in expected.values() for hit in hits),
+        )
+
+    def test_window_edges(self):
+        matcher = VicinityMatcher(self.WORDS_TO_CHECK)
+        texts = [
+            # Term exactly `window` tokens away, and one token too far, on either side
+            "breastfeed a b people", "breastfeed a b c people", "people a b breastfeed", "people a b c breastfeed",
+            # Triggers at the very start and end of the page
+            "breastfeed people", "people breastfeed", "breastfeed", "people", "",
+            "person x people breastfeed x y z", "chest-feed x parent's", "chest feed parent's", "chest-feed x y parent's",
+        ]
+        for text in texts:
+            with self.subTest(text=text):
+                self.assert_same_hits(matcher, text)
+
+    def test_trigger_that_is_its_own_term(self):
+        matcher = VicinityMatcher(self.WORDS_TO_CHECK)
+        for text in ["pregnant", "pregnant pregnant", "pregnant a b pregnant", "pregnant a pregnant people", "x pregnant x"]:
+            with self.subTest(text=text):
+                self.assert_same_hits(matcher, text)
+
+    def test_matches_linear_scan_on_random_pages(self):
+        rng = random.Random(0)
+        matcher = VicinityMatcher(self.WORDS_TO_CHECK)
+        for _text in range(500):
+            separator = rng.choice([" ", ", ", "\n"])
+            text = separator.join(rng.choice(self.WORDS) for _word in range(rng.randint(0, 40)))
+            with self.subTest(text=text):
+                self.assert_same_hits(matcher, text)
+
+
+class VerdictModeTests(DocumentCheckTestMixin, SimpleTestCase):
+
+    def test_verdict_agrees_with_full_check(self):
+        for full_result, verdict_result in zip(self.check_document(), self.check_document(mode='verdict')):
+            with self.subTest(filename=full_result['filename']):
+                self.assertEqual(verdict_result['status'], full_result['status'])
+                self.assertNotIn('found_instances', verdict_result)
+                if full_result['status'] == 'pass':
+                    self.assertIsNone(verdict_result['first_hit'])
+                    continue
+                first_hit = verdict_result['first_hit']
+                self.assertNotIn('phrase', first_hit)
+                self.assertIn((first_hit['page'], first_hit['word'], first_hit['original_match']), _hits(full_result))
+                self.assertEqual(first_hit['page'], min(hit['page'] for hit in full_result['found_instances']))
+
+    def test_extraction_stops_at_the_first_failing_page(self):
+        pages_extracted = []
+
+        def counting_iter_page_texts(*args):
+            for page in checking_iter_page_texts(*args):
+                pages_extracted.append(page[2])
+                yield page
+
+        checking_iter_page_texts = checking.iter_page_texts
+        upload = SimpleUploadedFile('many_pages.pdf', build_pdf(PDF_FIXTURES['many_pages.pdf']))
+        with mock.patch('pdf_reader.checking.iter_page_texts', counting_iter_page_texts):
+            response = self.client.post(CHECK_DOCUMENT_URL, {'files': [upload], 'mode': 'verdict'})
+        self.assertEqual(response.json()[0]['status'], 'fail')
+        self.assertEqual(pages_extracted, [1])
+
+    def test_verdict_uses_the_same_pipeline_as_full_checks(self):
+        # Page scope, streaming and DOCX locations come from the shared pipeline
+        [scoped_result] = self.client.post(CHECK_DOCUMENT_URL, {
+            'files': [SimpleUploadedFile('many_pages.pdf', build_pdf(PDF_FIXTURES['many_pages.pdf']))],
+            'mode': 'verdict', 'pages': '2-3',
+        }).json()
+        self.assertEqual(scoped_result['first_hit']['page'], 2)
+        self.assertEqual(scoped_result['page_scope']['pages_checked'], 1)
+        streamed = self.client.post(
+            CHECK_DOCUMENT_URL + '?stream=pages', {'files': self.fixture_files(), 'mode': 'verdict'}
+        )
+        lines = [json.loads(line) for line in b"".join(streamed.streaming_content).decode().splitlines()]
+        self.assertEqual({line['type'] for line in lines}, {'file'})
+        self.assertEqual([line['status'] for line in lines], [result['status'] for result in self.check_document()])
+
+    def test_max_hits_is_rejected(self):
+        response = self.client.post(CHECK_DOCUMENT_URL, {'files': self.fixture_files(), 'mode': 'verdict', 'max_hits': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('max_hits', response.json())
+
+
+class CompactResultTests(DocumentCheckTestMixin, SimpleTestCase):
+
+    def test_compact_groups_every_hit_of_the_full_check(self):
+        for full_result, compact_result in zip(
+            self.check_document(self.fixture_files()), self.check_document(self.fixture_files(), mode='compact')
+        ):
+            with self.subTest(filename=full_result['filename']):
+                self.assertEqual(compact_result['status'], full_result['status'])
+                self.assertEqual(compact_result['fail_summary'], full_result['fail_summary'])
+                self.assertNotIn('found_instances', compact_result)
+                full_counts = {}
+                for hit in full_result['found_instances']:
+                    full_counts[(hit['word'], hit['page'])] = full_counts.get((hit['word'], hit['page']), 0) + 1
+                self.assertEqual(
+                    {(group['word'], group['page']): group['count'] for group in compact_result['hits']}, full_counts
+                )
+                for group in compact_result['hits']:
+                    contexts = [compact_result['contexts'][index] for index in group['contexts']]
+                    for match in group['matches']:
+                        # A vicinity match is "trigger ... term"
+                        self.assertTrue(any(
+                            all(part in context for part in match.split(" ... ")) for context in contexts
+                        ), (match, contexts))
+                # Every context phrase is listed once
+                self.assertEqual(len(set(compact_result['contexts'])), len(compact_result['contexts']))
+
+    def test_overlapping_context_windows_are_merged(self):
+        upload = SimpleUploadedFile('overlap.pdf', build_pdf([["Vaccines, more vaccines and contraception."]]))
+        compact_result = self.check_document([upload], mode='compact')[0]
+        self.assertEqual(compact_result['contexts'], ["Vaccines, more vaccines and contraception."])
+        self.assertEqual(
+            [(group['word'], group['count'], group['matches'], group['contexts']) for group in compact_result['hits']],
+            [('contraception', 1, ['contraception'], [0]), ('vaccines', 2, ['Vaccines', 'vaccines'], [0])],
+        )
+
+    def test_gzip_when_accepted(self):
+        plain = self.client.post(CHECK_DOCUMENT_URL, {'files': self.fixture_files(), 'extractor': 'fast'})
+        compressed = self.client.post(
+            CHECK_DOCUMENT_URL, {'files': self.fixture_files(), 'extractor': 'fast'}, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(compressed.content)), plain.json())
+        # Streamed lines are sent as they are ready, not held back by gzip
+        streamed = self.client.post(
+            CHECK_DOCUMENT_URL + '?stream=files', {'files': self.fixture_files()}, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertNotIn('Content-Encoding', streamed)
+
+    def test_msgpack_when_accepted(self):
+        plain = self.client.post(CHECK_DOCUMENT_URL, {'files': self.fixture_files(), 'mode': 'compact'})
+        for url in (CHECK_DOCUMENT_URL, ASYNC_CHECK_DOCUMENT_URL):
+            with self.subTest(url=url):
+                packed = self.client.post(
+                    url, {'files': self.fixture_files(), 'mode': 'compact'}, HTTP_ACCEPT='application/msgpack'
+                )
+                self.assertEqual(packed['Content-Type'], 'application/msgpack')
+                self.assertEqual(msgpack.unpackb(packed.content), plain.json())
+
+    def test_unknown_media_type_is_not_acceptable(self):
+        for url in (CHECK_DOCUMENT_URL, ASYNC_CHECK_DOCUMENT_URL):
+            with self.subTest(url=url):
+                response = self.client.post(url, {'files': self.fixture_files()}, HTTP_ACCEPT='application/cbor')
+                self.assertEqual(response.status_code, 406)
+                # A client that also takes JSON gets JSON
+                response = self.client.post(
+                    url, {'files': self.fixture_files()}, HTTP_ACCEPT='application/cbor, application/json'
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class RuleSetTests(DocumentCheckTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        keywords_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(keywords_dir.cleanup)
+        self.keywords_path = os.path.join(keywords_dir.name, 'keywords.json')
+        self.write_keywords({"quarterly": {"fail_if_found": True}})
+        keywords_settings = override_settings(
+            KEYWORDS_FILE=self.keywords_path, KEYWORDS_RELOAD_MARKER=os.path.join(keywords_dir.name, 'keywords.reload')
+        )
+        keywords_settings.enable()
+        self.addCleanup(keywords_settings.disable)
+
+    def write_keywords(self, content, mtime_offset=0):
+        with open(self.keywords_path, 'w') as keywords_file:
+            keywords_file.write(content if isinstance(content, str) else json.dumps(content))
+        # Filesystem timestamps can be coarse; make each edit visibly newer
+        stat = os.stat(self.keywords_path)
+        os.utime(self.keywords_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset * 10**9))
+
+    def check_clean_pdf(self):
+        response = self.post_documents(self.fixture_files(['clean.pdf']))
+        [file_result] = response.json()
+        self.assertEqual(response['X-Rules-Version'], file_result['rules_version'])
+        return file_result
+
+    def test_edited_keywords_file_is_picked_up_without_restart(self):
+        first = self.check_clean_pdf()
+        self.assertEqual([hit['word'] for hit in first['found_instances']], ['quarterly'])
+
+        self.write_keywords({"revenue": {"fail_if_found": True}}, mtime_offset=5)
+        second = self.check_clean_pdf()
+        self.assertEqual([hit['word'] for hit in second['found_instances']], ['revenue'])
+        self.assertNotEqual(second['rules_version'], first['rules_version'])
+
+    def test_broken_keywords_file_keeps_the_current_rules(self):
+        version = self.check_clean_pdf()['rules_version']
+        self.write_keywords('{"revenue": ', mtime_offset=5)
+        self.assertEqual(self.check_clean_pdf()['rules_version'], version)
+
+    def test_reload_endpoint_is_for_staff(self):
+        version = self.client.get('/api/v1/rules/').json()['version']
+        self.write_keywords({"revenue": {"fail_if_found": True}}, mtime_offset=5)
+        auto_reload_off = override_settings(KEYWORDS_AUTO_RELOAD=False)
+        auto_reload_off.enable()
+        self.addCleanup(auto_reload_off.disable)
+        self.assertEqual(self.check_clean_pdf()['rules_version'], version)
+
+        self.assertEqual(self.client.post('/api/v1/rules/').status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.post('/api/v1/rules/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['version'], version)
+        self.assertEqual(self.check_clean_pdf()['rules_version'], response.json()['version'])
+
+    def test_reload_reaches_other_processes(self):
+        version = self.check_clean_pdf()['rules_version']
+        # Replaced with a file of the same size and mtime, which the mtime check alone cannot see
+        stat = os.stat(self.keywords_path)
+        self.write_keywords({"marketing": {"fail_if_found": True}})
+        os.utime(self.keywords_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(os.stat(self.keywords_path).st_size, stat.st_size)
+        self.assertEqual(self.check_clean_pdf()['rules_version'], version)
+        # What another worker process compiled before the reload
+        other_process_rules = (checking._rule_set, checking._rule_set_file_state)
+
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        new_version = self.client.post('/api/v1/rules/').json()['version']
+        self.assertNotEqual(new_version, version)
+        # The reload is signalled through the marker file, not by touching keywords.json
+        self.assertEqual(os.stat(self.keywords_path).st_mtime_ns, stat.st_mtime_ns)
+        for auto_reload in (True, False):
+            with self.subTest(auto_reload=auto_reload), override_settings(KEYWORDS_AUTO_RELOAD=auto_reload), \
+                    mock.patch.multiple(
+                        checking, _rule_set=other_process_rules[0], _rule_set_file_state=other_process_rules[1]
+                    ):
+                self.assertEqual(self.check_clean_pdf()['rules_version'], new_version)
+
+    def test_rules_version_on_error_and_job_responses(self):
+        version = self.client.get('/api/v1/rules/').json()['version']
+        for url in (CHECK_DOCUMENT_URL, ASYNC_CHECK_DOCUMENT_URL, '/api/v1/jobs/'):
+            with self.subTest(url=url):
+                response = self.client.post(url, {'files': [], 'mode': 'bogus'})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response['X-Rules-Version'], version)
+
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        # The job is only submitted, not run
+        files = self.fixture_files(['clean.pdf'])
+        with override_settings(CHECK_JOB_SPOOL_DIR=spool_dir.name), self.captureOnCommitCallbacks(execute=False):
+            response = self.client.post('/api/v1/jobs/', {'files': files, 'extractor': 'fast'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['X-Rules-Version'], version)
+        self.assertEqual(self.client.get(response.json()['status_url'])['X-Rules-Version'], version)
+
+    def test_rules_source_is_for_staff(self):
+        self.assertNotIn('source', self.client.get('/api/v1/rules/').json())
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertEqual(self.client.get('/api/v1/rules/').json()['source'], self.keywords_path)
+
+
+class UploadMemoryTests(DocumentCheckTestMixin, SimpleTestCase):
+
+    def large_docx(self, padding_bytes):
+        # A short document padded with an unreferenced part, so the upload is large but quick to check
+        document = Document()
+        document.add_paragraph("Quarterly report. Vaccines are out of scope.")
+        docx_buffer = io.BytesIO()
+        document.save(docx_buffer)
+        with zipfile.ZipFile(docx_buffer, 'a') as docx_zip:
+            docx_zip.writestr('word/media/padding.bin', os.urandom(padding_bytes), compress_type=zipfile.ZIP_STORED)
+        return docx_buffer.getvalue()
+
+    def peak_memory(self, request):
+        # Only what the view allocates: the request body was built before tracing starts
+        tracemalloc.start()
+        try:
+            response = CheckDocumentView.as_view()(request)
+            response.render()
+            return response, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    @override_settings(CHECK_UPLOAD_MEMORY_BUDGET=1024 * 1024)
+    def test_peak_memory_of_a_25_file_batch_stays_within_budget(self):
+        docx_bytes = self.large_docx(1536 * 1024)
+        uploads = [SimpleUploadedFile(f'report_{n}.docx', docx_bytes) for n in range(25)]
+        request = RequestFactory().post(CHECK_DOCUMENT_URL, {'files': uploads})
+        total_upload_bytes = 25 * len(docx_bytes)
+
+        response, peak_bytes = self.peak_memory(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data], ['fail'] * 25)
+        # The budget plus one document being parsed, not the whole batch
+        self.assertLess(peak_bytes, total_upload_bytes / 4)
+
+    def test_files_over_the_budget_are_opened_from_disk(self):
+        docx_bytes = self.large_docx(256 * 1024)
+        uploads = [SimpleUploadedFile(f'report_{n}.docx', docx_bytes) for n in range(3)]
+        request = RequestFactory().post(CHECK_DOCUMENT_URL, {'files': uploads})
+        with self.settings(CHECK_UPLOAD_MEMORY_BUDGET=len(docx_bytes) + 1024):
+            request.upload_handlers = [BoundedMemoryUploadHandler(request)]
+            uploaded_files = request.FILES.getlist('files')
+        self.assertEqual(
+            [hasattr(uploaded_file, 'temporary_file_path') for uploaded_file in uploaded_files], [False, True, True]
+        )
+        self.assertEqual([uploaded_file.read() for uploaded_file in uploaded_files], [docx_bytes] * 3)
+
+
+class StreamingResponseTests(DocumentCheckTestMixin, SimpleTestCase):
+    FIXTURE_NAMES = ('clean.pdf', 'direct_keywords.pdf')
+
+    def stream(self, path=CHECK_DOCUMENT_URL, mode='full', **headers):
+        response = self.client.post(
+            path, {'files': self.fixture_files(self.FIXTURE_NAMES), 'extractor': 'fast', 'mode': mode}, headers=headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_ndjson_accept_streams_one_line_per_file(self):
+        lines = self.stream(Accept='application/x-ndjson')
+        direct = self.check_document(self.fixture_files(self.FIXTURE_NAMES))
+        self.assertEqual(lines, [{"type": "file", **file_result} for file_result in direct])
+
+    def test_page_lines_add_up_to_the_file_result(self):
+        lines = self.stream(CHECK_DOCUMENT_URL + '?stream=pages')
+        direct = self.check_document(self.fixture_files(self.FIXTURE_NAMES))
+        self.assertEqual([line['type'] for line in lines], ['page', 'page', 'file', 'page', 'page', 'page', 'file'])
+        file_lines = [line for line in lines if line['type'] == 'file']
+        for file_line, file_result in zip(file_lines, direct):
+            page_hits = [
+                hit for line in lines
+                if line['type'] == 'page' and line['filename'] == file_result['filename']
+                for hit in line['found_instances']
+            ]
+            self.assertEqual(page_hits, file_result['found_instances'])
+            self.assertNotIn('found_instances', file_line)
+            self.assertEqual(file_line['status'], file_result['status'])
+
+    def test_compact_page_lines_are_grouped(self):
+        lines = self.stream(CHECK_DOCUMENT_URL + '?stream=pages', mode='compact')
+        full_lines = self.stream(CHECK_DOCUMENT_URL + '?stream=pages')
+        for line, full_line in zip(lines, full_lines):
+            with self.subTest(filename=line['filename'], page=line.get('page')):
+                self.assertEqual(line['type'], full_line['type'])
+                if line['type'] == 'file':
+                    self.assertIn('hits', line)
+                    continue
+                self.assertNotIn('found_instances', line)
+                self.assertEqual(
+                    sum(group['count'] for group in line['hits']), len(full_line['found_instances'])
+                )
+                self.assertEqual(len(set(line['contexts'])), len(line['contexts']))
+                for group in line['hits']:
+                    self.assertEqual(group['page'], line['page'])
+                    for match in group['matches']:
+                        self.assertTrue(any(match in line['contexts'][index] for index in group['contexts']))
+
+    @override_settings(RESULT_CACHE={'BACKEND': 'memory', 'MAX_ENTRIES': 10, 'MAX_BYTES': 1024 * 1024})
+    def test_cached_compact_page_lines(self):
+        lines = self.stream(CHECK_DOCUMENT_URL + '?stream=pages', mode='compact')
+        cached_lines = self.stream(CHECK_DOCUMENT_URL + '?stream=pages', mode='compact')
+        # A cached result only has lines for the pages with hits
+        self.assertEqual(cached_lines, [line for line in lines if line['type'] == 'file' or line['hits']])
+
+    def test_unknown_stream_mode_is_rejected(self):
+        response = self.client.post(CHECK_DOCUMENT_URL + '?stream=bytes', {'files': self.fixture_files(self.FIXTURE_NAMES)})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('stream', response.json())
+
+
+class DocxReaderTests(DocumentCheckTestMixin, SimpleTestCase):
+
+    def sectioned_docx(self):
+        document = Document()
+        document.sections[0].header.paragraphs[0].text = "Advocacy newsletter"
+        document.sections[0].footer.paragraphs[0].text = "Printed on recycled paper"
+        document.add_paragraph("Programs for vaccines.")
+        table = document.add_table(rows=2, cols=2)
+        table.cell(0, 0).text = "Budget"
+        table.cell(1, 1).text = "Reducing barriers first"
+        document.add_page_break()
+        document.add_paragraph("Support for contraception.")
+        document.add_section(WD_SECTION.NEW_PAGE)
+        document.sections[1].footer.is_linked_to_previous = False
+        document.sections[1].footer.paragraphs[0].text = "Appendix on vaccines"
+        docx_buffer = io.BytesIO()
+        document.save(docx_buffer)
+        return docx_buffer.getvalue()
+
+    def test_tables_headers_and_footers_are_checked(self):
+        upload = SimpleUploadedFile('newsletter.docx', self.sectioned_docx())
+        file_result = self.client.post(CHECK_DOCUMENT_URL, {'files': [upload]}).json()[0]
+        self.assertEqual(file_result['status'], 'fail')
+        self.assertEqual(
+            [(hit['page'], hit['location'], hit['original_match']) for hit in file_result['found_instances']],
+            [
+                (1, "Paragraph 1", "vaccines"),
+                (1, "Table 1, row 2, cell 2", "barriers"),
+                (2, "Paragraph 3", "contraception"),
+                # Headers and footers come after the body of their section, with its first page
+                (1, "Section 1 header", "Advocacy"),
+                (3, "Section 2 footer", "vaccines"),
+            ],
+        )
+
+    def test_page_selection(self):
+        for pages, expected_hits in (
+            ('1', [(1, "Paragraph 1", "vaccines"), (1, "Table 1, row 2, cell 2", "barriers"),
+                   (1, "Section 1 header", "Advocacy")]),
+            ('last-1', [(3, "Section 2 footer", "vaccines")]),
+        ):
+            with self.subTest(pages=pages):
+                upload = SimpleUploadedFile('newsletter.docx', self.sectioned_docx())
+                file_result = self.client.post(CHECK_DOCUMENT_URL, {'files': [upload], 'pages': pages}).json()[0]
+                self.assertEqual(
+                    [(hit['page'], hit['location'], hit['original_match']) for hit in file_result['found_instances']],
+                    expected_hits,
+                )
+                # Pages, not the paragraphs and cells on them
+                self.assertEqual(file_result['page_scope']['pages_checked'], 1)
+
+    def test_paragraph_text_matches_python_docx(self):
+        docx_bytes = self.sectioned_docx()
+        body_paragraphs = [
+            text for location, text, _page in iter_docx_chunks(io.BytesIO(docx_bytes)) if location.startswith("Paragraph")
+        ]
+        self.assertEqual(
+            body_paragraphs, [paragraph.text for paragraph in Document(io.BytesIO(docx_bytes)).paragraphs if paragraph.text]
+        )
+
+    def test_absolute_relationship_targets(self):
+        docx_bytes = self.sectioned_docx()
+        absolute_buffer = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(docx_bytes)) as docx_zip, zipfile.ZipFile(absolute_buffer, 'w') as absolute_zip:
+            for item in docx_zip.infolist():
+                part = docx_zip.read(item.filename)
+                if item.filename == 'word/_rels/document.xml.rels':
+                    part = re.sub(rb'Target="(?!/|https?:)', b'Target="/word/', part)
+                absolute_zip.writestr(item, part)
+        self.assertIn(b'Target="/word/header1.xml"', zipfile.ZipFile(absolute_buffer).read('word/_rels/document.xml.rels'))
+        self.assertEqual(
+            list(iter_docx_chunks(io.BytesIO(absolute_buffer.getvalue()))), list(iter_docx_chunks(io.BytesIO(docx_bytes)))
+        )
+
+    def test_broken_docx_is_an_error(self):
+        upload = SimpleUploadedFile('broken.docx', b'PK not really a zip archive')
+        file_result = self.client.post(CHECK_DOCUMENT_URL, {'files': [upload]}).json()[0]
+        self.assertEqual(file_result['status'], 'error')
+        self.assertTrue(file_result['error_message'].startswith("Could not read DOCX content"))
+
+
+class PageScopeTests(DocumentCheckTestMixin, SimpleTestCase):
+
+    def check_many_pages(self, **fields):
+        [file_result] = self.check_document(self.fixture_files(['many_pages.pdf']), **fields)
+        return file_result
+
+    def test_page_selection(self):
+        self.assertEqual(PageSelection('2-3, last-2,40-').page_numbers(10), [2, 3, 9, 10])
+        self.assertEqual(PageSelection('first-3,2').page_numbers(2), [1, 2])
+        for spec in ('', '0', '5-2', 'last-0', 'middle-3', '1-2-3'):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                PageSelection(spec)
+
+    def test_selected_pages_keep_their_page_numbers(self):
+        full_result = self.check_many_pages()
+        scoped_result = self.check_many_pages(pages='first-2,last-1')
+        self.assertEqual(
+            scoped_result['found_instances'],
+            [hit for hit in full_result['found_instances'] if hit['page'] in (1, 2, 12)],
+        )
+        self.assertEqual(
+            scoped_result['page_scope'],
+            {"pages": "first-2,last-1", "max_hits": None, "pages_checked": 3, "stopped_at_page": None},
+        )
+        self.assertNotIn('page_scope', full_result)
+
+    @override_settings(PDF_EXTRACTION_WORKERS=2, PDF_EXTRACTION_BATCH_PAGES=2, PDF_EXTRACTION_PARALLEL_MIN_PAGES=2)
+    def test_selected_pages_on_the_process_pool(self):
+        pooled_result = self.check_many_pages(pages='3-5,last-2')
+        with self.settings(PDF_EXTRACTION_WORKERS=1):
+            self.assertEqual(pooled_result, self.check_many_pages(pages='3-5,last-2'))
+        self.assertEqual(sorted({hit['page'] for hit in pooled_result['found_instances']}), [3, 4, 5, 11, 12])
+
+    def test_max_hits_stops_extraction(self):
+        pages_extracted = []
+
+        def counting_iter_pdf_pages(*args):
+            for page in extraction_iter_pdf_pages(*args):
+                pages_extracted.append(page[0])
+                yield page
+
+        extraction_iter_pdf_pages = extraction.iter_pdf_pages
+        hits_per_page = len([hit for hit in self.check_many_pages()['found_instances'] if hit['page'] == 1])
+        with mock.patch('pdf_reader.extraction.iter_pdf_pages', counting_iter_pdf_pages):
+            result = self.check_many_pages(max_hits=hits_per_page + 1)
+        self.assertEqual(pages_extracted, [1, 2])
+        self.assertEqual({hit['page'] for hit in result['found_instances']}, {1, 2})
+        self.assertEqual(result['page_scope']['stopped_at_page'], 2)
+
+    @override_settings(PDF_EXTRACTION_WORKERS=1)
+    def test_only_selected_pages_are_parsed(self):
+        pages_parsed = []
+        page_class = pdfplumber.pdf.Page
+
+        def counting_page(pdf, page_obj, page_number, **kwargs):
+            pages_parsed.append(page_number)
+            return page_class(pdf, page_obj, page_number=page_number, **kwargs)
+
+        with mock.patch('pdfplumber.pdf.Page', counting_page):
+            result = self.check_many_pages(pages='2', extractor='layout')
+        # pdfplumber builds the pages again to close them, but never the ones that weren't selected
+        self.assertEqual(set(pages_parsed), {2})
+        self.assertEqual(result['page_scope']['pages_checked'], 1)
+
+    def test_selection_past_the_last_page_is_reported(self):
+        result = self.check_many_pages(pages='50-')
+        self.assertEqual(result['status'], 'error')
+        self.assertEqual(result['error_message'], "No page of this 12-page PDF is in the page selection 50-.")
+
+    def test_invalid_pages_are_rejected(self):
+        upload = SimpleUploadedFile('clean.pdf', build_pdf(PDF_FIXTURES['clean.pdf']))
+        response = self.client.post(CHECK_DOCUMENT_URL, {'files': [upload], 'pages': '1-20,last'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pages', response.json())
+
+
+class ResultCacheTests(DocumentCheckTestMixin, SimpleTestCase):
+    # A fresh cache (and fresh counters) for every test
+    check_settings = {
+        'RESULT_CACHE': {'BACKEND': 'memory', 'MAX_ENTRIES': 10, 'MAX_BYTES': 1024 * 1024},
+        'PAGE_TEXT_STORE_ENABLED': False,
+    }
+
+    def upload(self, name='report.pdf'):
+        pdf_bytes = build_pdf(PDF_FIXTURES['direct_keywords.pdf'])
+        return SimpleUploadedFile(name, pdf_bytes, content_type='application/pdf')
+
+    def test_resubmitted_file_is_not_reopened(self):
+        [first] = self.check_document([self.upload()])
+        with mock.patch('pdf_reader.checking.iter_page_texts') as iter_page_texts:
+            [second] = self.check_document([self.upload('renamed.pdf')])
+        iter_page_texts.assert_not_called()
+        self.assertEqual(second, {**first, 'filename': 'renamed.pdf'})
+        self.assertEqual(get_result_cache().stats(), {'hits': 1, 'misses': 1})
+
+    def test_keywords_change_misses_the_cache(self):
+        self.check_document([self.upload()])
+        with tempfile.TemporaryDirectory() as directory:
+            keywords_path = os.path.join(directory, 'keywords.json')
+            with open(keywords_path, 'w') as keywords_file:
+                json.dump({"advocacy": {"fail_if_found": True}}, keywords_file)
+            with self.settings(KEYWORDS_FILE=keywords_path):
+                self.check_document([self.upload()])
+        self.assertEqual(get_result_cache().stats(), {'hits': 0, 'misses': 2})
+
+    def test_failing_backend_does_not_fail_the_request(self):
+        with mock.patch.object(InMemoryResultCacheBackend, 'set', side_effect=OSError("No space left on device")):
+            results = self.check_document([self.upload(), self.upload('clean.pdf')])
+        self.assertEqual([result['status'] for result in results], ['fail', 'fail'])
+        with mock.patch.object(InMemoryResultCacheBackend, 'get', side_effect=ConnectionError("cache server is down")):
+            self.assertEqual(self.check_document([self.upload()]), results[:1])
+        self.assertEqual(get_result_cache().stats(), {'hits': 0, 'misses': 3})
+        # The write of the last check went through
+        self.assertEqual(self.check_document([self.upload()]), results[:1])
+        self.assertEqual(get_result_cache().stats(), {'hits': 1, 'misses': 3})
+
+    def test_unreadable_upload_is_an_error_of_that_file(self):
+        def failing_file_content_hash(uploaded_file):
+            if uploaded_file.name == 'broken.pdf':
+                raise OSError("Input/output error")
+            return checking_file_content_hash(uploaded_file)
+
+        checking_file_content_hash = checking.file_content_hash
+        with mock.patch('pdf_reader.checking.file_content_hash', failing_file_content_hash):
+            results = self.check_document([self.upload('broken.pdf'), self.upload()])
+        self.assertEqual([result['status'] for result in results], ['error', 'fail'])
+        self.assertIn("Input/output error", results[0]['error_message'])
+
+    def test_memory_backend_evicts_least_recently_used(self):
+        backend = InMemoryResultCacheBackend(max_entries=2, max_bytes=100)
+        backend.set('a', b'1')
+        backend.set('b', b'2')
+        backend.get('a')
+        backend.set('c', b'3')
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('a'), b'1')
+        # Size-bounded too: making room for 99 bytes evicts 'c', the least recently used
+        backend.set('big', b'x' * 99)
+        self.assertIsNone(backend.get('c'))
+        self.assertEqual(backend.get('a'), b'1')
+
+    def test_file_backend_is_bounded(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = FileResultCacheBackend(max_entries=2, max_bytes=100, location=location)
+            for key in ('a', 'b', 'c'):
+                backend.set(key, key.encode())
+            self.assertEqual(sum(backend.get(key) is not None for key in ('a', 'b', 'c')), 2)
+            self.assertEqual(backend.get('c'), b'c')
+
+
+class PageTextStoreTests(DocumentCheckTestMixin, TestCase):
+    check_settings = {'RESULT_CACHE': {'BACKEND': ''}, 'PAGE_TEXT_STORE_ENABLED': True}
+    NEW_KEYWORDS = {"quarterly": {"fail_if_found": True}, "advocacy": {"fail_if_found": False}}
+
+    def check_report(self, extractor='fast'):
+        pdf_bytes = build_pdf(PDF_FIXTURES['clean.pdf'] + PDF_FIXTURES['direct_keywords.pdf'])
+        upload = SimpleUploadedFile('report.pdf', pdf_bytes, content_type='application/pdf')
+        [file_result] = self.check_document([upload], extractor=extractor)
+        return file_result
+
+    def test_keywords_change_only_reruns_matching(self):
+        self.assertEqual(self.check_report()['status'], 'fail')
+        self.assertEqual(ExtractedDocument.objects.count(), 1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            keywords_path = os.path.join(directory, 'keywords.json')
+            with open(keywords_path, 'w') as keywords_file:
+                json.dump(self.NEW_KEYWORDS, keywords_file)
+            with self.settings(KEYWORDS_FILE=keywords_path), \
+                    mock.patch('pdf_reader.checking.iter_page_texts') as iter_page_texts:
+                result = self.check_report()
+        iter_page_texts.assert_not_called()
+        self.assertEqual(result['fail_summary'], [{'keyword': 'quarterly', 'count': 1, 'pages': [1]}])
+        self.assertEqual({hit['word'] for hit in result['found_instances']}, {'quarterly', 'advocacy'})
+
+    def test_extractor_modes_are_stored_separately(self):
+        self.check_report('fast')
+        self.check_report('layout')
+        self.assertEqual(
+            sorted(ExtractedDocument.objects.values_list('extractor_mode', flat=True)), ['fast', 'layout']
+        )
+
+    @override_settings(PAGE_TEXT_STORE_MAX_DOCUMENTS=2)
+    def test_oldest_documents_are_pruned(self):
+        for number in range(3):
+            page_texts = [("1", f"document {number}", 1)]
+            page_store.save_page_texts(f"hash{number}", '.pdf', 'fast', f"{number}.pdf", page_texts)
+        self.assertEqual(sorted(ExtractedDocument.objects.values_list('filename', flat=True)), ['1.pdf', '2.pdf'])
+
+        # Storing a document again makes it the most recent one
+        page_store.save_page_texts("hash1", '.pdf', 'fast', "1.pdf", [("1", "document 1", 1)])
+        page_store.save_page_texts("hash3", '.pdf', 'fast', "3.pdf", [("1", "document 3", 1)])
+        self.assertEqual(sorted(ExtractedDocument.objects.values_list('filename', flat=True)), ['1.pdf', '3.pdf'])
+        self.assertEqual(page_store.load_page_texts("hash1", '.pdf', 'fast'), [("1", "document 1", 1)])
+        self.assertIsNone(page_store.load_page_texts("hash2", '.pdf', 'fast'))
+
+    def test_recheck_documents_command(self):
+        self.check_report()
+        with tempfile.TemporaryDirectory() as directory:
+            keywords_path = os.path.join(directory, 'keywords.json')
+            with open(keywords_path, 'w') as keywords_file:
+                json.dump(self.NEW_KEYWORDS, keywords_file)
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command('recheck_documents', keywords=keywords_path, summary_only=True, stdout=stdout, stderr=stderr)
+        [line] = stdout.getvalue().splitlines()
+        self.assertEqual(json.loads(line)['fail_summary'], [{'keyword': 'quarterly', 'count': 1, 'pages': [1]}])
+        self.assertNotIn('found_instances', json.loads(line))
+        self.assertIn('1 fail', stderr.getvalue())
+
+
+class CheckJobTests(DocumentCheckTestMixin, TestCase):
+    FIXTURE_NAMES = ('clean.pdf', 'direct_keywords.pdf', 'vicinity_rules.pdf')
+
+    def setUp(self):
+        super().setUp()
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        job_settings = override_settings(CHECK_JOB_WORKERS=0, CHECK_JOB_SPOOL_DIR=spool_dir.name)
+        job_settings.enable()
+        self.addCleanup(job_settings.disable)
+
+    def submit(self, execute, **fields):
+        files = self.fixture_files(self.FIXTURE_NAMES)
+        with self.captureOnCommitCallbacks(execute=execute):
+            response = self.client.post('/api/v1/jobs/', {'files': files, 'extractor': 'fast', **fields})
+        self.assertEqual(response.status_code, 202, response.content)
+        return response.json()
+
+    def test_job_results_match_check_document(self):
+        submitted = self.submit(execute=True)
+        job = self.client.get(submitted['status_url']).json()
+        self.assertEqual((job['status'], job['files_total'], job['files_done']), ('done', 3, 3))
+        self.assertIsNotNone(job['finished_at'])
+
+        direct = self.check_document(self.fixture_files(self.FIXTURE_NAMES))
+        self.assertEqual([job_file['result'] for job_file in job['files']], direct)
+
+    def test_job_with_page_scope(self):
+        job = self.client.get(self.submit(execute=True, pages='2-', max_hits=1)['status_url']).json()
+        self.assertEqual((job['pages'], job['max_hits']), ('2-', 1))
+        direct = self.check_document(self.fixture_files(self.FIXTURE_NAMES), pages='2-', max_hits=1)
+        self.assertEqual([job_file['result'] for job_file in job['files']], direct)
+        self.assertEqual(direct[1]['page_scope']['stopped_at_page'], 2)
+
+    def test_partial_results_are_reported_per_file(self):
+        from .jobs import run_check_job_file
+
+        job_id = self.submit(execute=False)['job_id']
+        job = self.client.get(f'/api/v1/jobs/{job_id}/').json()
+        self.assertEqual(job['status'], 'queued')
+        self.assertEqual([job_file['state'] for job_file in job['files']], ['pending'] * 3)
+
+        run_check_job_file(CheckJobFile.objects.get(job_id=job_id, position=1).id)
+        job = self.client.get(f'/api/v1/jobs/{job_id}/').json()
+        self.assertEqual((job['status'], job['files_done']), ('running', 1))
+        self.assertEqual(job['files'][1]['result']['status'], 'fail')
+        self.assertIsNone(job['files'][0]['result'])
+
+    def test_error_results_have_the_shape_of_the_job_mode(self):
+        with mock.patch('pdf_reader.jobs.check_document_file', side_effect=MemoryError("out of memory")):
+            job = self.client.get(self.submit(execute=True, mode='compact')['status_url']).json()
+        for job_file in job['files']:
+            self.assertEqual(job_file['result']['status'], 'error')
+            self.assertEqual((job_file['result']['hits'], job_file['result']['contexts']), ([], []))
+            self.assertNotIn('found_instances', job_file['result'])
+
+        job_id = self.submit(execute=False, mode='verdict')['job_id']
+        call_command('recover_check_jobs', stderr=io.StringIO())
+        job = self.client.get(f'/api/v1/jobs/{job_id}/').json()
+        for job_file in job['files']:
+            self.assertEqual(job_file['result']['status'], 'error')
+            self.assertIsNone(job_file['result']['first_hit'])
+            self.assertNotIn('found_instances', job_file['result'])
+
+    def test_unknown_job(self):
+        response = self.client.get('/api/v1/jobs/00000000-0000-0000-0000-000000000000/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_interrupted_jobs_are_recovered(self):
+        from django.conf import settings
+
+        # A worker restart leaves one job never started and one stopped half-way
+        never_started = self.submit(execute=False)['job_id']
+        stopped = self.submit(execute=False)['job_id']
+        CheckJobFile.objects.filter(job_id=stopped, position=0).update(state=CheckJobFile.RUNNING)
+        orphan_dir = os.path.join(settings.CHECK_JOB_SPOOL_DIR, 'no-such-job')
+        os.makedirs(orphan_dir)
+
+        call_command('recover_check_jobs', stderr=io.StringIO())
+        for job_id in (never_started, stopped):
+            job = self.client.get(f'/api/v1/jobs/{job_id}/').json()
+            self.assertEqual((job['status'], job['files_done']), ('done', 3))
+            self.assertIsNotNone(job['finished_at'])
+            self.assertEqual({job_file['result']['status'] for job_file in job['files']}, {'error'})
+            self.assertFalse(os.path.exists(os.path.join(settings.CHECK_JOB_SPOOL_DIR, job_id)))
+        self.assertFalse(os.path.exists(orphan_dir))
+
+    def test_interrupted_jobs_can_be_rechecked(self):
+        job_id = self.submit(execute=False)['job_id']
+        call_command('recover_check_jobs', recheck=True, stderr=io.StringIO())
+        job = self.client.get(f'/api/v1/jobs/{job_id}/').json()
+        self.assertEqual(job['status'], 'done')
+        direct = self.check_document(self.fixture_files(self.FIXTURE_NAMES))
+        self.assertEqual([job_file['result'] for job_file in job['files']], direct)
+
+
+class ScanDocumentsTests(DocumentCheckTestMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        temp_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_directory.cleanup)
+        self.directory = temp_directory.name
+        self.documents = {
+            'direct_keywords.pdf': build_pdf(PDF_FIXTURES['direct_keywords.pdf']),
+            os.path.join('sub', 'clean.pdf'): build_pdf(PDF_FIXTURES['clean.pdf']),
+            os.path.join('sub', 'vicinity_rules.pdf'): build_pdf(PDF_FIXTURES['vicinity_rules.pdf']),
+        }
+        self.corpus = os.path.join(self.directory, 'corpus')
+        for name, document_bytes in self.documents.items():
+            os.makedirs(os.path.dirname(os.path.join(self.corpus, name)), exist_ok=True)
+            with open(os.path.join(self.corpus, name), 'wb') as document_file:
+                document_file.write(document_bytes)
+        with open(os.path.join(self.corpus, 'notes.txt'), 'w') as notes_file:
+            notes_file.write("Not a document")
+
+    def scan(self, input_path, output_name, **options):
+        output_path = os.path.join(self.directory, output_name)
+        call_command('scan_documents', input_path, output=output_path, extractor='fast', stderr=io.StringIO(), **options)
+        with open(output_path) as output_file:
+            return output_file.read()
+
+    def test_scan_matches_check_document(self):
+        uploads = [SimpleUploadedFile(name, document_bytes) for name, document_bytes in self.documents.items()]
+        api_results = self.client.post(CHECK_DOCUMENT_URL, {'files': uploads, 'extractor': 'fast'}).json()
+        scanned = [json.loads(line) for line in self.scan(self.corpus, 'scan.ndjson', workers=0).splitlines()]
+        # The scan names documents by their path in the directory; an upload only has the base name
+        for file_result in scanned:
+            file_result['filename'] = os.path.basename(file_result['filename'])
+        self.assertEqual(
+            sorted(scanned, key=lambda file_result: file_result['filename']),
+            sorted(api_results, key=lambda file_result: file_result['filename']),
+        )
+
+    def test_zip_archive_to_csv(self):
+        archive_path = os.path.join(self.directory, 'corpus.zip')
+        with zipfile.ZipFile(archive_path, 'w') as archive:
+            for name, document_bytes in self.documents.items():
+                archive.writestr(name.replace(os.sep, '/'), document_bytes)
+        rows = list(csv.DictReader(io.StringIO(self.scan(archive_path, 'scan.csv', workers=0))))
+        self.assertEqual(
+            {row['filename']: row['status'] for row in rows},
+            {'direct_keywords.pdf': 'fail', 'sub/clean.pdf': 'pass', 'sub/vicinity_rules.pdf': 'fail'},
+        )
+
+    def test_resume_skips_finished_documents(self):
+        finished = json.dumps({"filename": 'direct_keywords.pdf', "status": "fail"})
+        with open(os.path.join(self.directory, 'scan.ndjson'), 'w') as output_file:
+            # An interrupted scan: one finished line and one cut off half-way
+            output_file.write(finished + "\n" + '{"filename": "sub/cle')
+        lines = self.scan(self.corpus, 'scan.ndjson', workers=0, resume=True).splitlines()
+        self.assertEqual(lines[0], finished)
+        self.assertEqual(
+            sorted(json.loads(line)['filename'] for line in lines[1:]),
+            [os.path.join('sub', 'clean.pdf'), os.path.join('sub', 'vicinity_rules.pdf')],
+        )
+
+    def test_resume_writes_the_csv_header_once(self):
+        # Interrupted before the first document was written: only the header is there
+        with open(os.path.join(self.directory, 'scan.csv'), 'w', newline='') as output_file:
+            csv.DictWriter(output_file, fieldnames=scan_documents.CSV_COLUMNS).writeheader()
+        lines = self.scan(self.corpus, 'scan.csv', workers=0, resume=True).splitlines()
+        self.assertEqual(lines.count(lines[0]), 1)
+        self.assertEqual(len(lines), 1 + len(self.documents))
+
+    @override_settings(PAGE_TEXT_STORE_ENABLED=True)
+    def test_scan_skips_the_page_store(self):
+        with mock.patch.object(checking, 'file_content_hash') as content_hash, \
+                mock.patch.object(checking, 'save_page_texts') as save_pages:
+            self.scan(self.corpus, 'scan.ndjson', workers=0)
+        content_hash.assert_not_called()
+        save_pages.assert_not_called()
+
+    def test_crashed_worker_only_fails_its_document(self):
+        with open(os.path.join(self.corpus, 'crash.pdf'), 'wb') as document_file:
+            document_file.write(self.documents['direct_keywords.pdf'])
+        with mock.patch.object(scan_documents, 'scan_document', _scan_or_crash):
+            rows = list(csv.DictReader(io.StringIO(self.scan(self.corpus, 'scan.csv', workers=2))))
+        self.assertEqual(
+            {row['filename']: row['status'] for row in rows},
+            {
+                'crash.pdf': 'error', 'direct_keywords.pdf': 'fail',
+                os.path.join('sub', 'clean.pdf'): 'pass', os.path.join('sub', 'vicinity_rules.pdf'): 'fail',
+            },
+        )
+        [crashed] = [row for row in rows if row['filename'] == 'crash.pdf']
+        self.assertIn("stopped unexpectedly", crashed['error_message'])
+
+
+class BenchmarkPipelineTests(SimpleTestCase):
+
+    def test_benchmark_pipeline_writes_comparable_json(self):
+        with tempfile.TemporaryDirectory() as directory:
+            report_path = os.path.join(directory, 'benchmark.json')
+            call_command(
+                'benchmark_pipeline', pages='2', densities='0.05', extractors='fast', repeat=1,
+                direct_rules=20, vicinity_rules=5, output=report_path, stderr=io.StringIO(),
+            )
+            with open(report_path) as report_file:
+                report = json.load(report_file)
+        self.assertEqual(report['rules'], 25)
+        self.assertEqual([case['name'] for case in report['cases']], ['pdf-2p-d0.05-fast', 'docx-2p-d0.05'])
+        for case in report['cases']:
+            with self.subTest(case=case['name']):
+                self.assertIn(case['status'], ('pass', 'fail'))
+                self.assertGreater(case['found_instances'], 0)
+                for field in ('extraction_s', 'matching_s', 'serialization_s', 'pages_per_s', 'peak_memory_bytes'):
+                    self.assertGreater(case[field], 0)
+
+    def test_benchmark_vicinity_agrees_with_the_linear_scan(self):
+        stdout = io.StringIO()
+        call_command('benchmark_vicinity', pages=20, words_per_page=200, extra_rules=20, stdout=stdout)
+        summary, _linear, _indexed, speedup = stdout.getvalue().splitlines()
+        self.assertRegex(summary, r'^20 pages, \d+ vicinity rules, [1-9]\d* hits$')
+        self.assertTrue(speedup.startswith('speedup: '))
+
+        with mock.patch('pdf_reader.management.commands.benchmark_vicinity.linear_vicinity_scan', return_value={}), \
+                self.assertRaises(CommandError):
+            call_command('benchmark_vicinity', pages=20, words_per_page=200, extra_rules=20, stdout=io.StringIO())
+
+    def test_benchmark_encoding_compares_response_sizes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            report_path = os.path.join(directory, 'encoding.json')
+            call_command(
+                'benchmark_encoding', pages='2', densities='0.05', document_keywords='0', repeat=1,
+                output=report_path, stderr=io.StringIO(),
+            )
+            with open(report_path) as report_file:
+                report = json.load(report_file)
+        cases = {(case['shape'], case['encoding']): case for case in report['cases']}
+        self.assertEqual(cases[('full', 'json')]['size_ratio'], 1)
+        self.assertLess(cases[('full', 'json+gzip')]['bytes'], cases[('full', 'json')]['bytes'])
+        self.assertLess(cases[('compact', 'json')]['bytes'], cases[('full', 'json')]['bytes'])
+
+
+class TimingAndMetricsTests(DocumentCheckTestMixin, SimpleTestCase):
+    # A fresh result cache, so its counters only count this test's requests
+    check_settings = {
+        'RESULT_CACHE': {'BACKEND': 'memory', 'MAX_ENTRIES': 10, 'MAX_BYTES': 1024 * 1024},
+        'PAGE_TEXT_STORE_ENABLED': False,
+    }
+
+    def post_report(self, **fields):
+        return self.post_documents(self.fixture_files(['direct_keywords.pdf']), **fields)
+
+    def test_timings_are_optional(self):
+        response = self.post_report(timings='true')
+        timings = response.json()[0]['timings']
+        for stage in ('hash_ms', 'cache_ms', 'extraction_ms', 'direct_match_ms', 'vicinity_match_ms', 'report_ms'):
+            self.assertIn(stage, timings)
+        server_timing = response['Server-Timing']
+        for stage in ('upload', 'extraction', 'render', 'total'):
+            self.assertIn(f'{stage};dur=', server_timing)
+
+        # Answered from the result cache this time, without timings
+        response = self.post_report()
+        self.assertNotIn('timings', response.json()[0])
+        self.assertNotIn('extraction;dur=', response['Server-Timing'])
+
+    def test_metrics_endpoint(self):
+        self.post_report()
+        self.post_report()
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        metrics_text = response.content.decode()
+        self.assertIn('# TYPE pdf_check_stage_seconds histogram', metrics_text)
+        self.assertIn('pdf_check_stage_seconds_bucket{stage="extraction",le="+Inf"}', metrics_text)
+        self.assertIn('pdf_check_pages_total{file_kind=".pdf"}', metrics_text)
+        self.assertIn('pdf_check_request_seconds_count{mode="full"}', metrics_text)
+        self.assertIn('pdf_result_cache_hits_total 1', metrics_text)
+        self.assertIn('pdf_result_cache_misses_total 1', metrics_text)
+
+
+@override_settings(CHECK_ASYNC_WORKERS=2)
+class AsyncCheckDocumentTests(DocumentCheckTestMixin, SimpleTestCase):
+
+    async def test_same_results_as_the_sync_endpoint(self):
+        response = await AsyncClient().post(ASYNC_CHECK_DOCUMENT_URL, {'files': self.fixture_files(), 'extractor': 'fast'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Rules-Version', response)
+        sync_response = await AsyncClient().post(CHECK_DOCUMENT_URL, {'files': self.fixture_files(), 'extractor': 'fast'})
+        self.assertEqual(response.json(), sync_response.json())
+
+        response = await AsyncClient().post(ASYNC_CHECK_DOCUMENT_URL, {'extractor': 'fast'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('files', response.json())
+
+    async def test_files_of_a_request_are_checked_concurrently(self):
+        both_files_started = threading.Barrier(2, timeout=10)
+        check_document_file = checking.check_document_file
+
+        def check_when_both_started(*args):
+            # Only returns if the other file is being checked at the same time
+            both_files_started.wait()
+            return check_document_file(*args)
+
+        uploads = self.fixture_files(['clean.pdf', 'direct_keywords.pdf'])
+        with mock.patch.object(checking, 'check_document_file', check_when_both_started):
+            response = await AsyncClient().post(ASYNC_CHECK_DOCUMENT_URL, {'files': uploads, 'extractor': 'fast'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([file_result['filename'] for file_result in response.json()], ['clean.pdf', 'direct_keywords.pdf'])
+
+    async def test_rule_set_is_not_loaded_on_the_event_loop(self):
+        loop_threads = []
+        views_get_rule_set = views.get_rule_set
+
+        def recording_get_rule_set():
+            try:
+                asyncio.get_running_loop()
+                loop_threads.append(True)
+            except RuntimeError:
+                loop_threads.append(False)
+            return views_get_rule_set()
+
+        uploads = self.fixture_files(['clean.pdf'])
+        with mock.patch.object(views, 'get_rule_set', recording_get_rule_set):
+            response = await AsyncClient().post(ASYNC_CHECK_DOCUMENT_URL, {'files': uploads, 'extractor': 'fast'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loop_threads, [False])
+
+    async def test_ndjson_only_client_gets_406(self):
+        # Only /check-document/ streams NDJSON
+        response = await AsyncClient().post(
+            ASYNC_CHECK_DOCUMENT_URL, {'files': self.fixture_files(['clean.pdf']), 'extractor': 'fast'},
+            headers={'Accept': 'application/x-ndjson'},
+        )
+        self.assertEqual(response.status_code, 406)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    async def test_concurrent_fast_checks_never_enter_pdfium_together(self):
+        # PDFium crashes the process when two threads call into it at once (see extraction._pdfium_lock)
+        threads_in_pdfium = []
+        most_threads_in_pdfium = 0
+        counter_lock = threading.Lock()
+        get_textpage = pdfium.PdfPage.get_textpage
+
+        def counting_get_textpage(page, *args, **kwargs):
+            nonlocal most_threads_in_pdfium
+            with counter_lock:
+                threads_in_pdfium.append(threading.get_ident())
+                most_threads_in_pdfium = max(most_threads_in_pdfium, len(threads_in_pdfium))
+            try:
+                time.sleep(0.001) # Gives another thread the chance to come in
+                return get_textpage(page, *args, **kwargs)
+            finally:
+                with counter_lock:
+                    threads_in_pdfium.remove(threading.get_ident())
+
+        expected = (await AsyncClient().post(CHECK_DOCUMENT_URL, {'files': self.fixture_files(), 'extractor': 'fast'})).json()
+        with override_settings(CHECK_ASYNC_WORKERS=4), \
+                mock.patch.object(pdfium.PdfPage, 'get_textpage', counting_get_textpage):
+            responses = await asyncio.gather(*(
+                AsyncClient().post(ASYNC_CHECK_DOCUMENT_URL, {'files': self.fixture_files(), 'extractor': 'fast'})
+                for _request in range(3)
+            ))
+        for response in responses:
+            self.assertEqual(response.json(), expected)
+        self.assertEqual(most_threads_in_pdfium, 1)
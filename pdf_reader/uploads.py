@@ -0,0 +1,81 @@
+# backend/pdf_reader/uploads.py
+import io
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class BoundedMemoryUploadHandler(FileUploadHandler):
+    """
+    Keeps uploaded files in memory only while all files of the request
+    together fit in settings.CHECK_UPLOAD_MEMORY_BUDGET bytes (and each one
+    in FILE_UPLOAD_MAX_MEMORY_SIZE). A file that would go over is moved to a
+    temporary file as soon as it does and continues there, so it can later
+    be opened by path instead of being copied again.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.memory_budget = settings.CHECK_UPLOAD_MEMORY_BUDGET
+        self.memory_used = 0 # Bytes currently held in memory by this request's files
+        self.memory_file = None
+        self.file = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.memory_file = io.BytesIO()
+        self.file = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.file is None:
+            file_size = start + len(raw_data)
+            if (self.memory_used + len(raw_data) <= self.memory_budget
+                    and file_size <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE):
+                self.memory_file.write(raw_data)
+                self.memory_used += len(raw_data)
+                return None
+            # Over the budget: move what was received so far to disk
+            self.file = TemporaryUploadedFile(
+                self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+            )
+            self.file.write(self.memory_file.getbuffer())
+            self.memory_used -= self.memory_file.tell()
+            self.memory_file = None
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.file is not None:
+            self.file.seek(0)
+            self.file.size = file_size
+            return self.file
+        self.memory_file.seek(0)
+        return InMemoryUploadedFile(
+            file=self.memory_file,
+            field_name=self.field_name,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        if self.file is not None:
+            temp_location = self.file.temporary_file_path()
+            try:
+                self.file.close()
+                os.remove(temp_location)
+            except FileNotFoundError:
+                pass
+
+
+class BoundedMemoryUploadMixin:
+    """For APIViews that accept document uploads: parses them with BoundedMemoryUploadHandler."""
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Must happen before anything reads request.POST or request.FILES
+        request.upload_handlers = [BoundedMemoryUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
@@ -1,7 +1,11 @@
 # backend/pdf_reader/urls.py
 from django.urls import path
-from .views import CheckDocumentView
+from .views import AsyncCheckDocumentView, CheckDocumentView, CheckJobDetailView, CheckJobListView, RuleSetView
 
 urlpatterns = [
     path('check-document/', CheckDocumentView.as_view(), name='check-document'),
+    path('check-document/async/', AsyncCheckDocumentView.as_view(), name='check-document-async'),
+    path('jobs/', CheckJobListView.as_view(), name='check-jobs'),
+    path('jobs/<uuid:job_id>/', CheckJobDetailView.as_view(), name='check-job-detail'),
+    path('rules/', RuleSetView.as_view(), name='rule-set'),
 ]
\ No newline at end of file
@@ -3,214 +3,333 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.permissions import IsAdminUser
 from .serializers import MultiFileUploadSerializer
-import pdfplumber
-from docx import Document
-import io
-import re
-import json
-import os
+from .checking import (
+    check_document_file, check_document_file_async, describe_rule_set, get_rule_set,
+    iter_document_check, reload_rule_set,
+)
+from .jobs import describe_check_job, submit_check_job
+from .metrics import REQUEST_SECONDS, StageTimer, render_metrics
+from .models import CheckJob
+from .renderers import MessagePackRenderer, NDJSONRenderer
+from .result_cache import get_result_cache
+from .uploads import BoundedMemoryUploadHandler, BoundedMemoryUploadMixin
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from collections import defaultdict
-import traceback
-
-def load_keywords():
-    file_path = os.path.join(settings.BASE_DIR, 'pdf_reader', 'keywords.json')
-    try:
-        with open(file_path, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"ERROR: keywords.json not found at {file_path}")
-        return {}
-    except json.JSONDecodeError:
-        print(f"ERROR: Could not decode keywords.json at {file_path}")
-        return {}
-
-WORDS_TO_CHECK = load_keywords()
-# Pre-compile a regex for tokenizing words on a page for vicinity checks
-WORD_TOKENIZER_REGEX = re.compile(r"[\w'-]+")
-
-
-class CheckDocumentView(APIView):
+from django.http import HttpResponse, StreamingHttpResponse
+from django.http.multipartparser import MultiPartParserError
+from django.middleware.gzip import GZipMiddleware
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+import asyncio
+import json
+import time
+
+# ?stream= values: one line per file, or a line per checked page plus one per file
+STREAM_MODES = ('files', 'pages')
+
+
+def _gzip_response(request, response):
+    # Compresses a rendered response if the client accepts gzip (GZipMiddleware's rules, for these views only)
+    if not settings.CHECK_RESPONSE_GZIP or response.streaming:
+        return response
+    return GZipMiddleware(lambda _request: response).process_response(request, response)
+
+
+def iter_ndjson_results(uploaded_files, extractor_mode, result_cache, per_page, check_mode='full', rule_set=None,
+                        include_timings=False, pages=None, max_hits=None):
+    """
+    One JSON line per file as soon as it is checked ({"type": "file", ...result}).
+    With per_page, each checked page first gets its own line
+    ({"type": "page", "filename", "page", "found_instances"}) and the file
+    line leaves out the found_instances already sent. The page lines of
+    compact checks have the page's "hits" and "contexts" instead, and their
+    file lines keep the grouping of the whole file. Verdict checks only have
+    file lines.
+    """
+    # A verdict check's only hit is its result's first_hit
+    per_page = per_page and check_mode != 'verdict'
+    for uploaded_file in uploaded_files:
+        file_timer = StageTimer()
+        for event in iter_document_check(
+            uploaded_file, extractor_mode, result_cache, rule_set, file_timer, pages, max_hits, check_mode
+        ):
+            if event[0] == "page":
+                if per_page:
+                    _event_type, page_num, page_hits = event
+                    if check_mode != 'compact':
+                        page_hits = {"found_instances": page_hits}
+                    yield json.dumps({
+                        "type": "page", "filename": uploaded_file.name, "page": page_num, **page_hits
+                    }) + "\n"
+                continue
+            file_result = event[1]
+            if per_page:
+                file_result = {key: value for key, value in file_result.items() if key != "found_instances"}
+            if include_timings:
+                file_result["timings"] = file_timer.as_milliseconds()
+            yield json.dumps({"type": "file", **file_result}) + "\n"
+
+
+class RulesVersionMixin:
+    """
+    Fetches the rule set once per request (self.rule_set) and reports its
+    version in the X-Rules-Version header of every response, errors included.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # One rule set for the whole request, even if keywords.json is reloaded meanwhile
+        self.rule_set = get_rule_set()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        rule_set = getattr(self, 'rule_set', None)
+        if rule_set is not None:
+            response['X-Rules-Version'] = rule_set.version
+        return response
+
+
+class CheckDocumentView(RulesVersionMixin, BoundedMemoryUploadMixin, APIView):
     parser_classes = (MultiPartParser, FormParser)
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer, MessagePackRenderer]
 
     def post(self, request, *args, **kwargs):
-        serializer = MultiFileUploadSerializer(data=request.data)
-        if not serializer.is_valid():
+        # Per-stage times of the whole request, for the Server-Timing header and /metrics
+        self.request_started = time.perf_counter()
+        self.request_timer = StageTimer()
+        self.check_mode = 'full'
+
+        # Streamed NDJSON with ?stream=files|pages, or Accept: application/x-ndjson (same as files)
+        stream_mode = request.query_params.get('stream')
+        if stream_mode is None and isinstance(request.accepted_renderer, NDJSONRenderer):
+            stream_mode = 'files'
+        if stream_mode is not None and stream_mode not in STREAM_MODES:
+            return Response(
+                {"stream": [f"Must be one of: {', '.join(STREAM_MODES)}."]}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with self.request_timer.stage('upload'):
+            serializer = MultiFileUploadSerializer(data=request.data)
+            upload_is_valid = serializer.is_valid()
+        if not upload_is_valid:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         uploaded_files = serializer.validated_data['files']
-        results_for_all_files = []
-        CONTEXT_WINDOW_CHARS = 60 # Characters before and after match for context phrase
+        extractor_mode = serializer.validated_data.get('extractor') or settings.PDF_EXTRACTION_MODE
+        check_mode = self.check_mode = serializer.validated_data.get('mode', 'full')
+        include_timings = serializer.validated_data.get('timings', False)
+        pages = serializer.validated_data.get('pages')
+        max_hits = serializer.validated_data.get('max_hits')
+        result_cache = get_result_cache()
+        rule_set = self.rule_set
+
+        if stream_mode is not None:
+            response = StreamingHttpResponse(
+                iter_ndjson_results(
+                    uploaded_files, extractor_mode, result_cache, per_page=(stream_mode == 'pages'),
+                    check_mode=check_mode, rule_set=rule_set, include_timings=include_timings,
+                    pages=pages, max_hits=max_hits,
+                ),
+                content_type=NDJSONRenderer.media_type,
+            )
+        else:
+            results_for_all_files = []
+            for uploaded_file in uploaded_files:
+                file_timer = StageTimer()
+                file_result = check_document_file(
+                    uploaded_file, extractor_mode, result_cache, check_mode, rule_set, file_timer, pages, max_hits
+                )
+                if include_timings:
+                    file_result["timings"] = file_timer.as_milliseconds()
+                self.request_timer.merge(file_timer)
+                results_for_all_files.append(file_result)
+            response = Response(results_for_all_files, status=status.HTTP_200_OK)
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        request_timer = getattr(self, 'request_timer', None)
+        if request_timer is None:
+            return response
+        if isinstance(response, Response):
+            # Rendered here instead of by the handler, so that rendering is timed too
+            with request_timer.stage('render'):
+                response.render()
+            with request_timer.stage('compress'):
+                response = _gzip_response(request, response)
+            total_seconds = time.perf_counter() - self.request_started
+            REQUEST_SECONDS.observe(total_seconds, mode=self.check_mode)
+            response['Server-Timing'] = f"{request_timer.server_timing()}, total;dur={total_seconds * 1000:.1f}"
+        else:
+            # A streamed response sends its headers before any file is checked
+            response['Server-Timing'] = request_timer.server_timing()
+        return response
+
+
+def _parse_upload(request):
+    # Runs on a worker thread: the ASGI handler has received the body already, but parsing it
+    # (and writing files over the memory budget to disk) would block the event loop
+    request.upload_handlers = [BoundedMemoryUploadHandler(request)]
+    upload_data = request.POST.copy()
+    upload_data.update(request.FILES)
+    serializer = MultiFileUploadSerializer(data=upload_data)
+    serializer.is_valid()
+    return serializer
+
+
+def _json_response(data, status_code=status.HTTP_200_OK):
+    # Rendered like the APIViews' Response, so both endpoints answer with the same bytes
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def _negotiate_renderer(request):
+    # The Accept header and ?format= are negotiated against CheckDocumentView's renderers, less NDJSON:
+    # this view doesn't stream, so a client that only takes NDJSON gets a 406. Raises NotAcceptable.
+    renderers = [
+        renderer_class() for renderer_class in CheckDocumentView.renderer_classes
+        if renderer_class is not NDJSONRenderer
+    ]
+    renderer, _media_type = DefaultContentNegotiation().select_renderer(Request(request), renderers)
+    return renderer
+
+
+def _results_response(renderer, results_for_all_files):
+    # MessagePack when it was negotiated; JSON for everything else (e.g. the browsable API's text/html)
+    if isinstance(renderer, MessagePackRenderer):
+        return HttpResponse(renderer.render(results_for_all_files), content_type=MessagePackRenderer.media_type)
+    return _json_response(results_for_all_files)
 
-        for uploaded_file in uploaded_files:
-            file_name_original = uploaded_file.name
-            file_name_lower = file_name_original.lower()
-            current_file_result = {
-                "filename": file_name_original, "status": "pass",
-                "fail_summary": [], "found_instances": [], "error_message": None
-            }
 
-            keyword_tracking_for_file = defaultdict(lambda: {'count': 0, 'pages': set(), 'fail_if_found': False})
-            for kw, props in WORDS_TO_CHECK.items(): # Initialize all, including trigger words by their name
-                keyword_tracking_for_file[kw]['fail_if_found'] = props.get('fail_if_found', False)
-                # If vicinity config exists, it will also get its fail_if_found from its own entry.
+class AsyncCheckDocumentView(View):
+    """
+    /check-document/ for ASGI servers: the same form fields and results (JSON,
+    or MessagePack for Accept: application/msgpack; no NDJSON streaming), but
+    the request never holds a thread while it waits. The files of a request
+    are checked concurrently on the check pool shared by all requests (see
+    checking.get_check_executor): that overlaps their I/O, but their CPU work
+    shares one core unless a PDF is large enough for the extraction pool.
+    """
 
-            document_failed_due_to_keyword_for_file = False
-            all_found_instances_for_file_accumulated = []
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Like APIView, the API doesn't use CSRF tokens
+        return csrf_exempt(super().as_view(**initkwargs))
 
+    async def post(self, request, *args, **kwargs):
+        # Checks keywords.json's mtime and can compile it again: not on the event loop
+        rule_set = await sync_to_async(get_rule_set, thread_sensitive=False)()
+        response = await self._check(request, rule_set)
+        response['X-Rules-Version'] = rule_set.version
+        return response
+
+    async def _check(self, request, rule_set):
+        request_started = time.perf_counter()
+        request_timer = StageTimer()
+        try:
+            renderer = _negotiate_renderer(request)
+        except NotAcceptable as e:
+            return _json_response({"detail": e.detail}, e.status_code)
+
+        with request_timer.stage('upload'):
             try:
-                page_texts_to_process = []
-                if file_name_lower.endswith('.pdf'):
-                    uploaded_file.seek(0)
-                    with pdfplumber.open(uploaded_file) as pdf:
-                        if not pdf.pages:
-                            current_file_result.update({"status": "error", "error_message": "PDF has no pages or could not be read."})
-                            results_for_all_files.append(current_file_result)
-                            continue
-                        for page_num, page_obj in enumerate(pdf.pages):
-                            page_text = page_obj.extract_text()
-                            if page_text:
-                                page_texts_to_process.append((f"Page {page_num + 1}", page_text, page_num + 1))
-                elif file_name_lower.endswith('.docx'):
-                    uploaded_file.seek(0)
-                    try:
-                        doc = Document(io.BytesIO(uploaded_file.read()))
-                        full_doc_text_list = [para.text for para in doc.paragraphs if para.text]
-                        combined_text = "\n".join(full_doc_text_list)
-                        if combined_text:
-                            page_texts_to_process.append(("Document", combined_text, 1))
-                    except Exception as docx_err:
-                        current_file_result.update({"status": "error", "error_message": f"Could not read DOCX content: {str(docx_err)}"})
-                        results_for_all_files.append(current_file_result)
-                        continue
-                else:
-                    current_file_result.update({"status": "error", "error_message": "Unsupported file type."})
-                    results_for_all_files.append(current_file_result)
-                    continue
-
-                if not page_texts_to_process and current_file_result["status"] == "pass":
-                    pass # Will naturally pass with no found_instances
-
-                for _page_label, text_content, current_page_num_for_tracking in page_texts_to_process:
-                    # Tokenize the current page's text_content for vicinity checks
-                    page_word_objects = []
-                    for match_obj in WORD_TOKENIZER_REGEX.finditer(text_content):
-                        page_word_objects.append({
-                            'text': match_obj.group(0),
-                            'lower': match_obj.group(0).lower(),
-                            'start': match_obj.start(),
-                            'end': match_obj.end()
-                        })
-                    
-                    if not page_word_objects: continue
-
-                    for keyword_from_json, properties in WORDS_TO_CHECK.items():
-                        vicinity_config = properties.get("check_vicinity")
-
-                        if vicinity_config:
-                            # --- Logic for Trigger Keywords with Vicinity Check ---
-                            trigger_keyword_lower = keyword_from_json.lower()
-                            proximity_terms_lower = [term.lower() for term in vicinity_config["terms"]]
-                            window = vicinity_config["window"]
-                            report_as = vicinity_config.get("report_as_concept", keyword_from_json)
-
-                            for idx, word_obj in enumerate(page_word_objects):
-                                if word_obj['lower'] == trigger_keyword_lower:
-                                    # Found an instance of the trigger word
-                                    scan_start_idx = max(0, idx - window)
-                                    # +1 to include the word at end of window, +1 because word_obj is one word
-                                    scan_end_idx = min(len(page_word_objects), idx + 1 + window) 
-                                    
-                                    found_prox_match_details = None
-                                    for k in range(scan_start_idx, scan_end_idx):
-                                        if k == idx: continue # Skip the trigger word itself
-                                        if page_word_objects[k]['lower'] in proximity_terms_lower:
-                                            found_prox_match_details = page_word_objects[k]
-                                            break
-                                    
-                                    if found_prox_match_details:
-                                        # Conceptual match found!
-                                        keyword_to_report = report_as # Use the concept name for tracking if available
-                                        
-                                        # Update tracking using the main trigger keyword_from_json or report_as
-                                        # For simplicity in keyword_tracking_for_file, let's use keyword_from_json
-                                        # The fail_summary will then show "breastfeed" (for example)
-                                        keyword_tracking_for_file[keyword_from_json]['count'] += 1
-                                        keyword_tracking_for_file[keyword_from_json]['pages'].add(current_page_num_for_tracking)
-
-                                        if properties.get("fail_if_found", False):
-                                            document_failed_due_to_keyword_for_file = True
-                                        
-                                        # Construct original_match string
-                                        # Order them by appearance in text
-                                        first_word_obj = word_obj if word_obj['start'] < found_prox_match_details['start'] else found_prox_match_details
-                                        second_word_obj = found_prox_match_details if word_obj['start'] < found_prox_match_details['start'] else word_obj
-                                        original_match_text = f"{first_word_obj['text']} ... {second_word_obj['text']}"
-                                        
-                                        # Determine character span of the conceptual match for context
-                                        match_span_start_char = min(word_obj['start'], found_prox_match_details['start'])
-                                        match_span_end_char = max(word_obj['end'], found_prox_match_details['end'])
-
-                                        context_start = max(0, match_span_start_char - CONTEXT_WINDOW_CHARS)
-                                        context_end = min(len(text_content), match_span_end_char + CONTEXT_WINDOW_CHARS)
-                                        context_phrase = text_content[context_start:context_end]
-                                        if context_start > 0: context_phrase = "... " + context_phrase
-                                        if context_end < len(text_content): context_phrase += " ..."
-
-                                        all_found_instances_for_file_accumulated.append({
-                                            "page": current_page_num_for_tracking,
-                                            "word": keyword_to_report, # "breastfeed people/person" or just "breastfeed"
-                                            "phrase": context_phrase.strip(),
-                                            "original_match": original_match_text
-                                        })
-                        else:
-                            # --- Logic for Direct Keyword/Phrase Matching (No Vicinity Check) ---
-                            pattern = r'\b' + re.escape(keyword_from_json) + r'\b'
-                            try:
-                                for match in re.finditer(pattern, text_content, re.IGNORECASE):
-                                    original_match_text = match.group(0)
-                                    
-                                    keyword_tracking_for_file[keyword_from_json]['count'] += 1
-                                    keyword_tracking_for_file[keyword_from_json]['pages'].add(current_page_num_for_tracking)
-
-                                    if properties.get("fail_if_found", False):
-                                        document_failed_due_to_keyword_for_file = True
-
-                                    start_char_index = match.start()
-                                    end_char_index = match.end()
-                                    context_start = max(0, start_char_index - CONTEXT_WINDOW_CHARS)
-                                    context_end = min(len(text_content), end_char_index + CONTEXT_WINDOW_CHARS)
-                                    context_phrase = text_content[context_start:context_end]
-                                    if context_start > 0: context_phrase = "... " + context_phrase
-                                    if context_end < len(text_content): context_phrase += " ..."
-                                    
-                                    all_found_instances_for_file_accumulated.append({
-                                        "page": current_page_num_for_tracking,
-                                        "word": keyword_from_json,
-                                        "phrase": context_phrase.strip(),
-                                        "original_match": original_match_text
-                                    })
-                            except re.error: # Should not happen with re.escape but good practice
-                                pass 
-                
-                current_file_result["found_instances"] = all_found_instances_for_file_accumulated
-                if document_failed_due_to_keyword_for_file:
-                    current_file_result["status"] = "fail"
-                    fail_summary_list = []
-                    for kw, data in keyword_tracking_for_file.items():
-                        if data['fail_if_found'] and data['count'] > 0:
-                            fail_summary_list.append({
-                                "keyword": kw, # This will be the main trigger keyword (e.g., "breastfeed")
-                                "count": data['count'],
-                                "pages": sorted(list(data['pages']))
-                            })
-                    current_file_result["fail_summary"] = fail_summary_list
-            
-            except Exception as e:
-                print(f"  Overall error processing file {file_name_original}: {e}")
-                print(traceback.format_exc())
-                current_file_result.update({"status": "error", "error_message": f"An unexpected error: {str(e)}"})
-            
-            results_for_all_files.append(current_file_result)
-        return Response(results_for_all_files, status=status.HTTP_200_OK)
\ No newline at end of file
+                serializer = await sync_to_async(_parse_upload, thread_sensitive=False)(request)
+            except MultiPartParserError as e:
+                return _json_response({"detail": f"Multipart form parse error - {e}"}, status.HTTP_400_BAD_REQUEST)
+        if serializer.errors:
+            return _json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        uploaded_files = serializer.validated_data['files']
+        extractor_mode = serializer.validated_data.get('extractor') or settings.PDF_EXTRACTION_MODE
+        check_mode = serializer.validated_data.get('mode', 'full')
+        include_timings = serializer.validated_data.get('timings', False)
+        pages = serializer.validated_data.get('pages')
+        max_hits = serializer.validated_data.get('max_hits')
+        result_cache = get_result_cache()
+
+        file_timers = [StageTimer() for _uploaded_file in uploaded_files]
+        results_for_all_files = await asyncio.gather(*(
+            check_document_file_async(
+                uploaded_file, extractor_mode, result_cache, check_mode, rule_set, file_timer, pages, max_hits
+            )
+            for uploaded_file, file_timer in zip(uploaded_files, file_timers)
+        ))
+        for file_result, file_timer in zip(results_for_all_files, file_timers):
+            if include_timings:
+                file_result["timings"] = file_timer.as_milliseconds()
+            request_timer.merge(file_timer)
+
+        with request_timer.stage('render'):
+            response = _results_response(renderer, results_for_all_files)
+        with request_timer.stage('compress'):
+            response = _gzip_response(request, response)
+        total_seconds = time.perf_counter() - request_started
+        REQUEST_SECONDS.observe(total_seconds, mode=check_mode)
+        response['Server-Timing'] = f"{request_timer.server_timing()}, total;dur={total_seconds * 1000:.1f}"
+        return response
+
+
+class CheckJobListView(RulesVersionMixin, BoundedMemoryUploadMixin, APIView):
+    """
+    Accepts a batch like /check-document/ but returns a job id at once; the
+    files are checked in the background, with the rule set current when each
+    file's turn comes (X-Rules-Version is the one at submission).
+    """
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, *args, **kwargs):
+        serializer = MultiFileUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        extractor_mode = serializer.validated_data.get('extractor') or settings.PDF_EXTRACTION_MODE
+        check_mode = serializer.validated_data.get('mode', 'full')
+        job = submit_check_job(
+            serializer.validated_data['files'], extractor_mode, check_mode,
+            serializer.validated_data.get('pages'), serializer.validated_data.get('max_hits'),
+        )
+        status_url = request.build_absolute_uri(reverse('check-job-detail', kwargs={'job_id': job.id}))
+        return Response({"job_id": str(job.id), "status_url": status_url}, status=status.HTTP_202_ACCEPTED)
+
+
+class CheckJobDetailView(RulesVersionMixin, APIView):
+    """Per-file progress of a job, with the results of the files finished so far."""
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_object_or_404(CheckJob, id=job_id)
+        return Response(describe_check_job(job), status=status.HTTP_200_OK)
+
+
+class RuleSetView(APIView):
+    """
+    The keyword rule set in use (GET); staff users can reload it from
+    KEYWORDS_FILE right away (POST). Other worker processes follow on their
+    next request (see checking.reload_rule_set). Only staff users see the
+    path the rules were read from.
+    """
+
+    def get_permissions(self):
+        if self.request.method == 'POST':
+            return [IsAdminUser()]
+        return super().get_permissions()
+
+    def get(self, request, *args, **kwargs):
+        return Response(
+            describe_rule_set(get_rule_set(), include_source=request.user.is_staff), status=status.HTTP_200_OK
+        )
+
+    def post(self, request, *args, **kwargs):
+        return Response(describe_rule_set(reload_rule_set(), include_source=True), status=status.HTTP_200_OK)
+
+
+def metrics(request):
+    """Stage timings, throughput and result cache counters of this worker process, in Prometheus' text format."""
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
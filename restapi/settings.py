@@ -102,6 +102,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3', # This will be in /home/zvallarino/backend-pdf/db.sqlite3
+        # Background job threads write results while requests read job status: take write locks
+        # up front (no "database is locked" on lock upgrade), wait for them, and let readers use WAL.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL;',
+        },
     }
 }
 
@@ -151,6 +158,86 @@ STATIC_ROOT = BASE_DIR / 'staticfiles_production'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Keyword rules
+# KEYWORDS_FILE is compiled into a RuleSet (see pdf_reader/checking.py) whose content hash is reported
+# as "rules_version" in every result. With KEYWORDS_AUTO_RELOAD the file is compiled again when its
+# mtime changes; otherwise staff users reload it with POST /api/v1/rules/. That reload replaces
+# KEYWORDS_RELOAD_MARKER (keywords.json itself is left alone), and every worker process compiles
+# the rules again once it sees the marker change, with or without KEYWORDS_AUTO_RELOAD.
+KEYWORDS_FILE = os.environ.get('KEYWORDS_FILE', BASE_DIR / 'pdf_reader' / 'keywords.json')
+KEYWORDS_AUTO_RELOAD = os.environ.get('KEYWORDS_AUTO_RELOAD', 'True') == 'True'
+KEYWORDS_RELOAD_MARKER = os.environ.get('KEYWORDS_RELOAD_MARKER', BASE_DIR / 'keywords.reload')
+
+
+# PDF text extraction
+# PDF_EXTRACTION_MODE picks the default extractor (see pdf_reader/extraction.py): 'layout' uses
+# pdfplumber's layout-aware extract_text(), 'fast' uses pypdfium2's native text extraction.
+# A request can override it with the 'extractor' form field.
+PDF_EXTRACTION_MODE = os.environ.get('PDF_EXTRACTION_MODE', 'layout')
+# Pages of large PDFs are extracted in parallel batches on a process pool shared by the worker.
+# Documents with fewer than PDF_EXTRACTION_PARALLEL_MIN_PAGES pages (or PDF_EXTRACTION_WORKERS <= 1)
+# are extracted in-process, where the pool's start-up and hand-off costs would outweigh the gain.
+PDF_EXTRACTION_WORKERS = int(os.environ.get('PDF_EXTRACTION_WORKERS', os.cpu_count() or 1))
+PDF_EXTRACTION_BATCH_PAGES = int(os.environ.get('PDF_EXTRACTION_BATCH_PAGES', 20))
+PDF_EXTRACTION_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_EXTRACTION_PARALLEL_MIN_PAGES', 40))
+
+
+# Uploads to /check-document/ and /jobs/
+# Files stay in memory while all files of a request together fit in CHECK_UPLOAD_MEMORY_BUDGET bytes
+# (and each one in FILE_UPLOAD_MAX_MEMORY_SIZE); the rest are spooled to temporary files in
+# FILE_UPLOAD_TEMP_DIR and opened by path. See pdf_reader/uploads.py
+CHECK_UPLOAD_MEMORY_BUDGET = int(os.environ.get('CHECK_UPLOAD_MEMORY_BUDGET', 8 * 1024 * 1024))
+
+
+# Async check-document endpoint (/api/v1/check-document/async/, for ASGI servers)
+# Files are checked on a thread pool shared by every request of the worker; CHECK_ASYNC_WORKERS is the
+# most files checked at once across all requests, the rest wait for a free thread. Uploads are read
+# by the event loop, so slow clients don't hold a thread while their body arrives.
+# The threads share one CPU: pdfplumber and matching hold the GIL and 'fast' extraction takes turns on
+# PDFium's lock, so extra threads only overlap I/O (result cache, page store, spooled uploads) and the
+# waits on the extraction process pool, which is what spreads PDFs of PDF_EXTRACTION_PARALLEL_MIN_PAGES
+# pages or more over the CPUs. Smaller documents never check faster in parallel here; run more worker
+# processes for that. More threads than a few only add memory, as each one holds a document.
+CHECK_ASYNC_WORKERS = int(os.environ.get('CHECK_ASYNC_WORKERS', 4))
+
+# Check results are gzip-compressed for clients that send Accept-Encoding: gzip (streamed NDJSON
+# never is: gzip would hold lines back until its buffer fills). Turn off if a proxy compresses already.
+CHECK_RESPONSE_GZIP = os.environ.get('CHECK_RESPONSE_GZIP', 'True') == 'True'
+
+
+# Page text store
+# Extracted page text is saved per document hash and extractor mode in the default database
+# (pdf_reader.ExtractedDocument), so a keywords.json change only re-runs matching.
+# Only the PAGE_TEXT_STORE_MAX_DOCUMENTS most recently stored documents are kept (0: no limit).
+# See also: manage.py recheck_documents
+PAGE_TEXT_STORE_ENABLED = os.environ.get('PAGE_TEXT_STORE_ENABLED', 'True') == 'True'
+PAGE_TEXT_STORE_MAX_DOCUMENTS = int(os.environ.get('PAGE_TEXT_STORE_MAX_DOCUMENTS', 1000))
+
+
+# Background check jobs (/api/v1/jobs/)
+# Uploads are spooled to CHECK_JOB_SPOOL_DIR and checked on a thread pool of CHECK_JOB_WORKERS
+# threads in each web worker; progress and results are kept in the default database.
+# With CHECK_JOB_WORKERS = 0 files are checked inline when the job is submitted.
+# Jobs queued or running when the workers stop are finished by manage.py recover_check_jobs (run it
+# before starting the web workers).
+CHECK_JOB_WORKERS = int(os.environ.get('CHECK_JOB_WORKERS', 2))
+CHECK_JOB_SPOOL_DIR = os.environ.get('CHECK_JOB_SPOOL_DIR', BASE_DIR / 'job_spool')
+
+
+# Result cache
+# Per-file check results keyed by the SHA-256 of the uploaded bytes and the keywords.json version.
+# BACKEND is 'memory' (per-process LRU), 'file' (LOCATION directory shared by all workers),
+# 'django' (the CACHE_ALIAS entry of CACHES, with its own eviction) or '' to disable the cache.
+RESULT_CACHE = {
+    'BACKEND': os.environ.get('RESULT_CACHE_BACKEND', 'memory'),
+    'MAX_ENTRIES': int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 1000)),
+    'MAX_BYTES': int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    'LOCATION': os.environ.get('RESULT_CACHE_LOCATION', BASE_DIR / 'result_cache'),
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': None,
+}
+
+
 # CORS settings
 # Read CORS_ALLOWED_ORIGINS from environment variable (should be a comma-separated string)
 cors_origins_env = os.environ.get('CORS_ALLOWED_ORIGINS')
@@ -16,9 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include # Make sure include is imported
+from pdf_reader.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include('pdf_reader.urls')), # Add this line
     # The 'api/v1/' prefix is a common convention for API versioning
+    path('metrics', metrics, name='metrics'), # Prometheus scrape endpoint
 ]
\ No newline at end of file